@@ -3,17 +3,25 @@
 from __future__ import annotations
 
 from datetime import datetime
-from typing import List
+from typing import Iterator, List, NamedTuple, Optional
 
 import pydantic
 from alienvault.models import Pulse
-from OTXv2 import OTXv2
+from OTXv2 import SUBSCRIBED, OTXv2
 
 __all__ = [
     "AlienVaultClient",
+    "PulsePage",
 ]
 
 
+class PulsePage(NamedTuple):
+    """A page of subscribed pulses."""
+
+    pulses: List[Pulse]
+    next_page_url: Optional[str]
+
+
 class AlienVaultClient:
     """AlienVault client."""
 
@@ -27,18 +35,28 @@ class AlienVaultClient:
 
         self.otx = OTXv2(api_key, server=server)
 
-    def get_pulses_subscribed(
+    def iter_pulses_subscribed_pages(
         self,
         modified_since: datetime,
         limit: int = 20,
-    ) -> List[Pulse]:
+        page_url: Optional[str] = None,
+    ) -> Iterator[PulsePage]:
         """
-        Get any subscribed pulses.
+        Iterate over the subscribed pulses page by page.
         :param modified_since: Filter by results modified since this date.
-        :param limit: Return limit.
-        :return: A list of pulses.
+        :param limit: Page size.
+        :param page_url: Page URL to resume from, as returned in a previous page.
+        :return: An iterator of validated pulse pages.
         """
-        pulse_data = self.otx.getsince(timestamp=modified_since, limit=limit)
-        pulses = pydantic.parse_obj_as(List[Pulse], pulse_data)
-
-        return pulses
+        next_page_url = page_url
+        if next_page_url is None:
+            next_page_url = self.otx.create_url(
+                SUBSCRIBED, limit=limit, modified_since=modified_since.isoformat()
+            )
+
+        while next_page_url:
+            page_data = self.otx.get(next_page_url)
+            pulses = pydantic.parse_obj_as(List[Pulse], page_data["results"])
+            next_page_url = page_data.get("next")
+
+            yield PulsePage(pulses=pulses, next_page_url=next_page_url)
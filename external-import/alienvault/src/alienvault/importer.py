@@ -2,11 +2,11 @@
 
 import re
 from datetime import datetime
-from typing import Any, Dict, List, Mapping, NamedTuple, Optional, Set
+from typing import Any, Dict, Iterator, List, Mapping, NamedTuple, Optional, Set
 
 import stix2
 from alienvault.builder import PulseBundleBuilder, PulseBundleBuilderConfig
-from alienvault.client import AlienVaultClient
+from alienvault.client import AlienVaultClient, PulsePage
 from alienvault.models import Pulse
 from alienvault.utils import iso_datetime_str_to_datetime
 from pycti.connector.opencti_connector_helper import OpenCTIConnectorHelper
@@ -38,13 +38,13 @@ class PulseImporter:
     """AlienVault pulse importer."""
 
     _LATEST_PULSE_TIMESTAMP = "latest_pulse_timestamp"
+    _PULSE_PAGE_URL = "pulse_page_url"
+    _PENDING_PULSE_TIMESTAMP = "pending_pulse_timestamp"
 
     _GUESS_NOT_A_MALWARE = "GUESS_NOT_A_MALWARE"
 
     _GUESS_CVE_PATTERN = r"(CVE-\d{4}-\d{4,7})"
 
-    _STATE_UPDATE_INTERVAL_COUNT = 20
-
     def __init__(
         self,
         config: PulseImporterConfig,
@@ -96,64 +96,57 @@ class PulseImporter:
 
         latest_pulse_datetime = self._get_latest_pulse_datetime_from_state(state)
 
-        self._info("Fetching subscribed pulses...")
-        pulses = self._fetch_subscribed_pulses(latest_pulse_datetime)
-        pulse_count = len(pulses)
-
-        self._info("{0} pulse(s) since {1}...", pulse_count, latest_pulse_datetime)
-
-        if self.filter_indicators:
-            total_remaining = 0
-            total_filtered = 0
-            for i, pulse in enumerate(pulses, start=1):
-                before_count = len(pulse.indicators)
-                pulse.indicators = [
-                    ind
-                    for ind in pulse.indicators
-                    if ind.created >= latest_pulse_datetime
-                ]
-                after_count = len(pulse.indicators)
-                total_remaining += after_count
-                total_filtered += before_count - after_count
-                self._info(
-                    "({3}/{4}) Filtered {0} indicators past {1} from {2}",
-                    total_filtered,
-                    latest_pulse_datetime,
-                    pulse.name,
-                    i,
-                    pulse_count,
-                )
-            if total_filtered > 0:
-                self._info(
-                    "Filtered {0} total indicators past {1} ({2} remaining)",
-                    total_filtered,
-                    latest_pulse_datetime,
-                    total_remaining,
-                )
-            else:
-                self._info("No indicators to filter")
+        # Pulses are not guaranteed to be ordered by modification date, the
+        # watermark is only moved forward once every page has been processed.
+        # In the meantime the next page URL and the latest modification date
+        # seen so far are stored after each page to resume an interrupted run.
+        page_url = state.get(self._PULSE_PAGE_URL)
+        latest_pulse_modified_datetime = latest_pulse_datetime
+
+        pending_pulse_timestamp = state.get(self._PENDING_PULSE_TIMESTAMP)
+        if page_url is not None and pending_pulse_timestamp is not None:
+            self._info("Resuming pulse import from page: {0}", page_url)
+            latest_pulse_modified_datetime = max(
+                latest_pulse_modified_datetime,
+                iso_datetime_str_to_datetime(pending_pulse_timestamp),
+            )
+        else:
+            page_url = None
 
+        self._info("Fetching subscribed pulses since {0}...", latest_pulse_datetime)
+
+        pulse_count = 0
         failed = 0
-        new_state = state.copy()
-        latest_pulse_modified_datetime = latest_pulse_datetime
 
-        for count, pulse in enumerate(pulses, start=1):
-            result = self._process_pulse(pulse)
-            if not result:
-                failed += 1
+        for page in self._fetch_subscribed_pulse_pages(latest_pulse_datetime, page_url):
+            pulses = self._sort_pulses(page.pulses)
+
+            if self.filter_indicators:
+                self._filter_indicators(pulses, latest_pulse_datetime)
+
+            for pulse in pulses:
+                pulse_count += 1
 
-            pulse_modified_datetime = pulse.modified
-            if pulse_modified_datetime > latest_pulse_modified_datetime:
-                latest_pulse_modified_datetime = pulse_modified_datetime
+                result = self._process_pulse(pulse)
+                if not result:
+                    failed += 1
 
-            if count % self._STATE_UPDATE_INTERVAL_COUNT == 0:  # noqa: S001
-                self._info(
-                    "Store state: {0}: {1}", count, latest_pulse_modified_datetime
-                )
-                new_state.update(
-                    self._create_pulse_state(latest_pulse_modified_datetime)
-                )
-                self._set_state(new_state)
+                pulse_modified_datetime = pulse.modified
+                if pulse_modified_datetime > latest_pulse_modified_datetime:
+                    latest_pulse_modified_datetime = pulse_modified_datetime
+
+            self._info(
+                "Store state: {0}: {1}", pulse_count, latest_pulse_modified_datetime
+            )
+            self._set_state(
+                {
+                    **state,
+                    self._PULSE_PAGE_URL: page.next_page_url,
+                    self._PENDING_PULSE_TIMESTAMP: (
+                        latest_pulse_modified_datetime.isoformat()
+                    ),
+                }
+            )
 
         imported = pulse_count - failed
 
@@ -167,8 +160,34 @@ class PulseImporter:
 
         return self._create_pulse_state(latest_pulse_modified_datetime)
 
+    def _filter_indicators(
+        self, pulses: List[Pulse], latest_pulse_datetime: datetime
+    ) -> None:
+        total_remaining = 0
+        total_filtered = 0
+        for pulse in pulses:
+            before_count = len(pulse.indicators)
+            pulse.indicators = [
+                ind for ind in pulse.indicators if ind.created >= latest_pulse_datetime
+            ]
+            after_count = len(pulse.indicators)
+            total_remaining += after_count
+            total_filtered += before_count - after_count
+
+        if total_filtered > 0:
+            self._info(
+                "Filtered {0} indicators past {1} ({2} remaining)",
+                total_filtered,
+                latest_pulse_datetime,
+                total_remaining,
+            )
+
     def _create_pulse_state(self, latest_pulse_timestamp: datetime) -> Dict[str, Any]:
-        return {self._LATEST_PULSE_TIMESTAMP: latest_pulse_timestamp.isoformat()}
+        return {
+            self._LATEST_PULSE_TIMESTAMP: latest_pulse_timestamp.isoformat(),
+            self._PULSE_PAGE_URL: None,
+            self._PENDING_PULSE_TIMESTAMP: None,
+        }
 
     def _get_latest_pulse_datetime_from_state(self, state: Dict[str, Any]) -> datetime:
         latest_modified_timestamp = state.get(
@@ -187,9 +206,12 @@ class PulseImporter:
         fmt_msg = msg.format(*args)
         self.helper.log_error(fmt_msg)
 
-    def _fetch_subscribed_pulses(self, modified_since: datetime) -> List[Pulse]:
-        pulses = self.client.get_pulses_subscribed(modified_since)
-        return self._sort_pulses(pulses)
+    def _fetch_subscribed_pulse_pages(
+        self, modified_since: datetime, page_url: Optional[str]
+    ) -> Iterator[PulsePage]:
+        return self.client.iter_pulses_subscribed_pages(
+            modified_since, page_url=page_url
+        )
 
     @staticmethod
     def _sort_pulses(pulses: List[Pulse]) -> List[Pulse]:
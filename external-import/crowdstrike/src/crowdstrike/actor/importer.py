@@ -45,8 +45,6 @@ class ActorImporter(BaseImporter):
             self._LATEST_ACTOR_TIMESTAMP, self.default_latest_timestamp
         )
 
-        new_state = state.copy()
-
         latest_actor_created_timestamp = None
 
         for actors_batch in self._fetch_actors(fetch_timestamp):
@@ -60,8 +58,9 @@ class ActorImporter(BaseImporter):
                     latest_actor_created_datetime
                 )
 
-                new_state[self._LATEST_ACTOR_TIMESTAMP] = latest_actor_created_timestamp
-                self._set_state(new_state)
+                self._set_state(
+                    {self._LATEST_ACTOR_TIMESTAMP: latest_actor_created_timestamp}
+                )
 
         latest_actor_timestamp = latest_actor_created_timestamp or fetch_timestamp
 
@@ -3,6 +3,7 @@
 
 import os
 import sys
+import threading
 import time
 from typing import Any, Dict, List, Mapping, Optional
 
@@ -22,6 +23,8 @@ from crowdstrike.utils import (
     timestamp_to_datetime,
 )
 from crowdstrike.utils.constants import DEFAULT_TLP_MARKING_DEFINITION
+from crowdstrike.utils.rate_limiter import RateLimitedApi, RateLimiter
+from crowdstrike.utils.state_store import StateStore
 from crowdstrike_client.client import CrowdStrikeClient
 from pycti import OpenCTIConnectorHelper  # type: ignore
 from pycti.connector.opencti_connector_helper import get_config_variable  # type: ignore
@@ -36,6 +39,7 @@ class CrowdStrike:
     _CONFIG_CLIENT_ID = f"{_CONFIG_NAMESPACE}.client_id"
     _CONFIG_CLIENT_SECRET = f"{_CONFIG_NAMESPACE}.client_secret"
     _CONFIG_INTERVAL_SEC = f"{_CONFIG_NAMESPACE}.interval_sec"
+    _CONFIG_API_RATE_LIMIT = f"{_CONFIG_NAMESPACE}.api_rate_limit"
     _CONFIG_SCOPES = f"{_CONFIG_NAMESPACE}.scopes"
     _CONFIG_TLP = f"{_CONFIG_NAMESPACE}.tlp"
     _CONFIG_CREATE_OBSERVABLES = f"{_CONFIG_NAMESPACE}.create_observables"
@@ -72,10 +76,12 @@ class CrowdStrike:
     _DEFAULT_CREATE_INDICATORS = True
     _DEFAULT_REPORT_TYPE = "threat-report"
     _DEFAULT_INDICATOR_LOW_SCORE = 40
+    _DEFAULT_API_RATE_LIMIT = 6000
 
     _CONNECTOR_RUN_INTERVAL_SEC = 60
 
     _STATE_LAST_RUN = "last_run"
+    _STATE_IMPORTER_LAST_RUN = "{0}_last_run"
 
     def __init__(self) -> None:
         """Initialize CrowdStrike connector."""
@@ -95,6 +101,21 @@ class CrowdStrike:
         if scopes_str is not None:
             scopes = set(convert_comma_separated_str_to_list(scopes_str))
 
+        # Optional per scope interval, e.g. crowdstrike.indicator_interval_sec.
+        self.importer_intervals_sec: Dict[str, int] = {}
+        for scope in scopes:
+            importer_interval_sec = self._get_configuration(
+                config, self._get_importer_interval_config_name(scope), is_number=True
+            )
+            if importer_interval_sec is not None:
+                self.importer_intervals_sec[scope] = importer_interval_sec
+
+        api_rate_limit = self._get_configuration(
+            config, self._CONFIG_API_RATE_LIMIT, is_number=True
+        )
+        if api_rate_limit is None:
+            api_rate_limit = self._DEFAULT_API_RATE_LIMIT
+
         tlp = self._get_configuration(config, self._CONFIG_TLP)
         tlp_marking = self._convert_tlp_to_marking_definition(tlp)
 
@@ -187,28 +208,38 @@ class CrowdStrike:
         # Create OpenCTI connector helper.
         self.helper = OpenCTIConnectorHelper(config)
 
-        # Create CrowdStrike client and importers.
+        # Create connector state store shared by the importers.
+        self.state_store = StateStore(self.helper)
+
+        # Create CrowdStrike client and APIs sharing the Falcon API quota.
         client = CrowdStrikeClient(base_url, client_id, client_secret)
 
+        rate_limiter = RateLimiter(api_rate_limit, period_sec=60)
+
+        actors_api = RateLimitedApi(client.intel_api.actors, rate_limiter)
+        reports_api = RateLimitedApi(client.intel_api.reports, rate_limiter)
+        indicators_api = RateLimitedApi(client.intel_api.indicators, rate_limiter)
+        rules_api = RateLimitedApi(client.intel_api.rules, rate_limiter)
+
         # Create importers.
-        importers: List[BaseImporter] = []
+        importers: Dict[str, BaseImporter] = {}
 
         if self._CONFIG_SCOPE_ACTOR in scopes:
             actor_importer = ActorImporter(
                 self.helper,
-                client.intel_api.actors,
+                actors_api,
                 update_existing_data,
                 author,
                 actor_start_timestamp,
                 tlp_marking,
             )
 
-            importers.append(actor_importer)
+            importers[self._CONFIG_SCOPE_ACTOR] = actor_importer
 
         if self._CONFIG_SCOPE_REPORT in scopes:
             report_importer = ReportImporter(
                 self.helper,
-                client.intel_api.reports,
+                reports_api,
                 update_existing_data,
                 author,
                 report_start_timestamp,
@@ -219,13 +250,13 @@ class CrowdStrike:
                 report_guess_malware,
             )
 
-            importers.append(report_importer)
+            importers[self._CONFIG_SCOPE_REPORT] = report_importer
 
         if self._CONFIG_SCOPE_INDICATOR in scopes:
             indicator_importer_config = IndicatorImporterConfig(
                 helper=self.helper,
-                indicators_api=client.intel_api.indicators,
-                reports_api=client.intel_api.reports,
+                indicators_api=indicators_api,
+                reports_api=reports_api,
                 update_existing_data=update_existing_data,
                 author=author,
                 default_latest_timestamp=indicator_start_timestamp,
@@ -240,13 +271,13 @@ class CrowdStrike:
             )
 
             indicator_importer = IndicatorImporter(indicator_importer_config)
-            importers.append(indicator_importer)
+            importers[self._CONFIG_SCOPE_INDICATOR] = indicator_importer
 
         if self._CONFIG_SCOPE_YARA_MASTER in scopes:
             yara_master_importer = YaraMasterImporter(
                 self.helper,
-                client.intel_api.rules,
-                client.intel_api.reports,
+                rules_api,
+                reports_api,
                 author,
                 tlp_marking,
                 update_existing_data,
@@ -254,13 +285,13 @@ class CrowdStrike:
                 report_type,
             )
 
-            importers.append(yara_master_importer)
+            importers[self._CONFIG_SCOPE_YARA_MASTER] = yara_master_importer
 
         if self._CONFIG_SCOPE_SNORT_SURICATA_MASTER in scopes:
             snort_master_importer = SnortMasterImporter(
                 self.helper,
-                client.intel_api.rules,
-                client.intel_api.reports,
+                rules_api,
+                reports_api,
                 author,
                 tlp_marking,
                 update_existing_data,
@@ -268,7 +299,7 @@ class CrowdStrike:
                 report_type,
             )
 
-            importers.append(snort_master_importer)
+            importers[self._CONFIG_SCOPE_SNORT_SURICATA_MASTER] = snort_master_importer
 
         self.importers = importers
 
@@ -291,6 +322,10 @@ class CrowdStrike:
     def _get_environment_variable_name(yaml_path: List[str]) -> str:
         return "_".join(yaml_path).upper()
 
+    @classmethod
+    def _get_importer_interval_config_name(cls, scope: str) -> str:
+        return f"{cls._CONFIG_NAMESPACE}.{scope}_interval_sec"
+
     @classmethod
     def _get_configuration(
         cls, config: Dict[str, Any], config_name: str, is_number: bool = False
@@ -314,12 +349,6 @@ class CrowdStrike:
     def _convert_report_status_str_to_report_status_int(cls, report_status: str) -> int:
         return cls._CONFIG_REPORT_STATUS_MAPPING[report_status.lower()]
 
-    def _load_state(self) -> Dict[str, Any]:
-        current_state = self.helper.get_state()
-        if not current_state:
-            return {}
-        return current_state
-
     @staticmethod
     def _get_state_value(
         state: Optional[Mapping[str, Any]], key: str, default: Optional[Any] = None
@@ -335,13 +364,15 @@ class CrowdStrike:
         )
         time.sleep(sleep_delay)
 
-    def _is_scheduled(self, last_run: Optional[int], current_time: int) -> bool:
+    def _is_scheduled(
+        self, scope: str, last_run: Optional[int], current_time: int
+    ) -> bool:
         if last_run is None:
-            self._info("CrowdStrike connector clean run")
+            self._info("CrowdStrike {0} importer clean run", scope)
             return True
 
         time_diff = current_time - last_run
-        return time_diff >= self._get_interval()
+        return time_diff >= self._get_interval(scope)
 
     @staticmethod
     def _current_unix_timestamp() -> int:
@@ -355,72 +386,113 @@ class CrowdStrike:
             self._error("Scope(s) not configured.")
             return
 
-        while True:
-            self._info("Running CrowdStrike connector...")
-            run_interval = self._CONNECTOR_RUN_INTERVAL_SEC
-
-            try:
-                timestamp = self._current_unix_timestamp()
-                current_state = self._load_state()
+        if self.helper.connect_run_and_terminate:
+            self._run_importers_once()
+            self.helper.log_info("Connector stop")
+            self.helper.force_ping()
+            sys.exit(0)
+
+        # Every importer runs on its own thread with its own schedule, a long
+        # running importer (e.g. indicator backlog) does not delay the others.
+        threads = [
+            threading.Thread(
+                target=self._run_importer_loop,
+                args=(scope, importer),
+                name=f"crowdstrike-{scope}",
+                daemon=True,
+            )
+            for scope, importer in self.importers.items()
+        ]
+
+        for thread in threads:
+            thread.start()
+
+        try:
+            while any(thread.is_alive() for thread in threads):
+                for thread in threads:
+                    thread.join(timeout=self._CONNECTOR_RUN_INTERVAL_SEC)
+        except (KeyboardInterrupt, SystemExit):
+            self._info("CrowdStrike connector stopping...")
+            sys.exit(0)
+
+    def _run_importers_once(self) -> None:
+        threads = [
+            threading.Thread(
+                target=self._run_importer_safe,
+                args=(scope, importer),
+                name=f"crowdstrike-{scope}",
+            )
+            for scope, importer in self.importers.items()
+        ]
 
-                self.helper.log_info(f"Loaded state: {current_state}")
+        for thread in threads:
+            thread.start()
 
-                last_run = self._get_state_value(current_state, self._STATE_LAST_RUN)
-                if self._is_scheduled(last_run, timestamp):
-                    work_id = self._initiate_work(timestamp)
+        for thread in threads:
+            thread.join()
 
-                    new_state = current_state.copy()
+    def _run_importer_loop(self, scope: str, importer: BaseImporter) -> None:
+        while True:
+            run_interval = self._run_importer_safe(scope, importer)
+            self._sleep(delay_sec=run_interval)
 
-                    for importer in self.importers:
-                        importer_state = importer.start(work_id, new_state)
-                        new_state.update(importer_state)
+    def _run_importer_safe(self, scope: str, importer: BaseImporter) -> int:
+        try:
+            return self._run_importer(scope, importer)
+        except Exception as e:  # noqa: B902
+            self._error("CrowdStrike {0} importer internal error: {1}", scope, str(e))
+            return self._CONNECTOR_RUN_INTERVAL_SEC
 
-                        self._info("Storing updated new state: {0}", new_state)
-                        self.helper.set_state(new_state)
+    def _run_importer(self, scope: str, importer: BaseImporter) -> int:
+        self._info("Running CrowdStrike {0} importer...", scope)
+        run_interval = self._CONNECTOR_RUN_INTERVAL_SEC
 
-                    new_state[self._STATE_LAST_RUN] = self._current_unix_timestamp()
+        timestamp = self._current_unix_timestamp()
+        current_state = self.state_store.get()
 
-                    self._info("Storing new state: {0}", new_state)
-                    self.helper.set_state(new_state)
+        self._info("Loaded state: {0}", current_state)
 
-                    message = (
-                        f"State stored, next run in: {self._get_interval()} seconds"
-                    )
+        last_run_key = self._STATE_IMPORTER_LAST_RUN.format(scope)
 
-                    self._info(message)
+        # Fall back to the connector wide last run stored by previous versions.
+        last_run = self._get_state_value(
+            current_state,
+            last_run_key,
+            self._get_state_value(current_state, self._STATE_LAST_RUN),
+        )
 
-                    self._complete_work(work_id, message)
-                else:
-                    next_run = self._get_interval() - (timestamp - last_run)
-                    run_interval = min(run_interval, next_run)
+        if self._is_scheduled(scope, last_run, timestamp):
+            work_id = self._initiate_work(scope, timestamp)
 
-                    self._info(
-                        "Connector will not run, next run in: {0} seconds", next_run
-                    )
+            importer_state = importer.start(work_id, self.state_store)
+            importer_state[last_run_key] = self._current_unix_timestamp()
 
-                if self.helper.connect_run_and_terminate:
-                    self.helper.log_info("Connector stop")
-                    self.helper.force_ping()
-                    sys.exit(0)
+            self._info("Storing new {0} importer state: {1}", scope, importer_state)
+            self.state_store.merge(importer_state)
 
-                self._sleep(delay_sec=run_interval)
+            message = (
+                f"State stored, next {scope} run in: "
+                f"{self._get_interval(scope)} seconds"
+            )
 
-            except (KeyboardInterrupt, SystemExit):
-                self._info("CrowdStrike connector stopping...")
-                sys.exit(0)
+            self._info(message)
 
-            except Exception as e:  # noqa: B902
-                self._error("CrowdStrike connector internal error: {0}", str(e))
+            self._complete_work(work_id, message)
+        else:
+            next_run = self._get_interval(scope) - (timestamp - last_run)
+            run_interval = min(run_interval, next_run)
 
-                if self.helper.connect_run_and_terminate:
-                    self.helper.log_info("Connector stop")
-                    sys.exit(0)
+            self._info(
+                "CrowdStrike {0} importer will not run, next run in: {1} seconds",
+                scope,
+                next_run,
+            )
 
-                self._sleep()
+        return run_interval
 
-    def _initiate_work(self, timestamp: int) -> str:
+    def _initiate_work(self, scope: str, timestamp: int) -> str:
         datetime_str = timestamp_to_datetime(timestamp)
-        friendly_name = f"{self.helper.connect_name} @ {datetime_str}"
+        friendly_name = f"{self.helper.connect_name} {scope} @ {datetime_str}"
         work_id = self.helper.api.work.initiate_work(
             self.helper.connect_id, friendly_name
         )
@@ -432,8 +504,8 @@ class CrowdStrike:
     def _complete_work(self, work_id: str, message: str) -> None:
         self.helper.api.work.to_processed(work_id, message)
 
-    def _get_interval(self) -> int:
-        return int(self.interval_sec)
+    def _get_interval(self, scope: str) -> int:
+        return int(self.importer_intervals_sec.get(scope, self.interval_sec))
 
     def _info(self, msg: str, *args: Any) -> None:
         fmt_msg = msg.format(*args)
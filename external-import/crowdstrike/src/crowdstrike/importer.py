@@ -5,6 +5,7 @@ from abc import ABC, abstractmethod
 from typing import Any, Dict, Optional
 
 import stix2
+from crowdstrike.utils.state_store import StateStore
 from pycti import OpenCTIConnectorHelper  # type: ignore
 
 
@@ -25,21 +26,23 @@ class BaseImporter(ABC):
         self.update_existing_data = update_existing_data
 
         self.work_id: Optional[str] = None
+        self.state_store: Optional[StateStore] = None
 
-    def start(self, work_id: str, state: Dict[str, Any]) -> Dict[str, Any]:
+    def start(self, work_id: str, state_store: StateStore) -> Dict[str, Any]:
         """
         Start import.
 
         :param work_id: Work identifier for current import process.
         :type work_id: str
-        :param state: Current state of the importer.
-        :type state: Dict[str, Any]
+        :param state_store: Connector state store shared between importers.
+        :type state_store: StateStore
         :return: State after the import.
         :rtype: Dict[str, Any]
         """
         self.work_id = work_id
+        self.state_store = state_store
 
-        return self.run(state)
+        return self.run(state_store.get())
 
     @abstractmethod
     def run(self, state: Dict[str, Any]) -> Dict[str, Any]:
@@ -68,7 +71,9 @@ class BaseImporter(ABC):
         return self.helper.connect_confidence_level
 
     def _set_state(self, state: Dict[str, Any]) -> None:
-        self.helper.set_state(state)
+        if self.state_store is None:
+            raise RuntimeError("Importer state store not initialized")
+        self.state_store.merge(state)
 
     def _send_bundle(self, bundle: stix2.Bundle) -> None:
         serialized_bundle = bundle.serialize()
@@ -69,8 +69,6 @@ class ReportImporter(BaseImporter):
             self._LATEST_REPORT_TIMESTAMP, self.default_latest_timestamp
         )
 
-        new_state = state.copy()
-
         latest_report_created_timestamp = None
 
         for reports_batch in self._fetch_reports(fetch_timestamp):
@@ -84,10 +82,9 @@ class ReportImporter(BaseImporter):
                     latest_report_created_datetime
                 )
 
-                new_state[self._LATEST_REPORT_TIMESTAMP] = (
-                    latest_report_created_timestamp
+                self._set_state(
+                    {self._LATEST_REPORT_TIMESTAMP: latest_report_created_timestamp}
                 )
-                self._set_state(new_state)
 
         latest_report_timestamp = latest_report_created_timestamp or fetch_timestamp
 
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""OpenCTI CrowdStrike rate limiter module."""
+
+import functools
+import logging
+import threading
+import time
+from typing import Any, Callable
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    """Thread-safe token bucket rate limiter."""
+
+    def __init__(self, max_calls: int, period_sec: float = 60.0) -> None:
+        """Initialize rate limiter allowing max_calls per period_sec."""
+        if max_calls <= 0:
+            raise ValueError("Rate limit must be greater than zero")
+
+        self.capacity = float(max_calls)
+        self.fill_rate = max_calls / period_sec
+
+        self._tokens = self.capacity
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        elapsed = now - self._last_refill
+        self._tokens = min(self.capacity, self._tokens + elapsed * self.fill_rate)
+        self._last_refill = now
+
+    def acquire(self) -> None:
+        """Block until a token is available and consume it."""
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait_sec = (1 - self._tokens) / self.fill_rate
+
+            logger.debug("Rate limit reached, waiting %.2f seconds", wait_sec)
+            time.sleep(wait_sec)
+
+
+class RateLimitedApi:
+    """Proxy applying a shared rate limiter to every API method call."""
+
+    def __init__(self, api: Any, rate_limiter: RateLimiter) -> None:
+        """Initialize rate limited API proxy."""
+        self._api = api
+        self._rate_limiter = rate_limiter
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self._api, name)
+        if not callable(attr):
+            return attr
+        return self._limit(attr)
+
+    def _limit(self, func: Callable[..., Any]) -> Callable[..., Any]:
+        @functools.wraps(func)
+        def wrapper_limit(*args: Any, **kwargs: Any) -> Any:
+            self._rate_limiter.acquire()
+            return func(*args, **kwargs)
+
+        return wrapper_limit
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+"""OpenCTI CrowdStrike state store module."""
+
+import threading
+from typing import Any, Dict, Mapping
+
+from pycti import OpenCTIConnectorHelper  # type: ignore
+
+
+class StateStore:
+    """Thread-safe connector state store.
+
+    Importers running concurrently only write their own keys, the store merges
+    those partial updates into the latest connector state under a lock so no
+    update is lost.
+    """
+
+    def __init__(self, helper: OpenCTIConnectorHelper) -> None:
+        """Initialize CrowdStrike state store."""
+        self.helper = helper
+
+        self._lock = threading.Lock()
+
+    def get(self) -> Dict[str, Any]:
+        """Get a snapshot of the current state."""
+        with self._lock:
+            return self._load()
+
+    def merge(self, update: Mapping[str, Any]) -> Dict[str, Any]:
+        """Merge given keys into the current state and store it."""
+        with self._lock:
+            state = self._load()
+            state.update(update)
+            self.helper.set_state(state)
+            return state
+
+    def _load(self) -> Dict[str, Any]:
+        current_state = self.helper.get_state()
+        if not current_state:
+            return {}
+        return dict(current_state)
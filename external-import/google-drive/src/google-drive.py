@@ -1,8 +1,13 @@
+import collections
+import hashlib
 import io
 import os
 import sys
+import tempfile
+import threading
 import time
 from base64 import b64encode
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
 
@@ -14,6 +19,19 @@ from googleapiclient.discovery import build
 from googleapiclient.http import MediaIoBaseDownload
 from pycti import OpenCTIConnectorHelper, Report, get_config_variable
 
+FILE_FIELDS = "id, name, modifiedTime, createdTime, mimeType, sha256Checksum"
+
+# Files kept in memory up to this size, then spilled to disk
+SPOOL_MAX_SIZE = 16 * 1024 * 1024
+
+DOWNLOAD_CHUNK_SIZE = 4 * 1024 * 1024
+
+# Multiple of 3, the base64 of the chunks can be concatenated
+ENCODE_CHUNK_SIZE = 3 * 1024 * 1024
+
+# Content hashes of the imported files kept in the state
+MAX_FILE_HASHES = 10000
+
 
 class GoogleDrive:
     def __init__(self):
@@ -99,6 +117,13 @@ class GoogleDrive:
         self.google_drive_interval = get_config_variable(
             "GOOGLE_DRIVE_INTERVAL", ["google_drive", "interval"], config, True
         )
+        self.google_drive_download_workers = get_config_variable(
+            "GOOGLE_DRIVE_DOWNLOAD_WORKERS",
+            ["google_drive", "download_workers"],
+            config,
+            isNumber=True,
+            default=4,
+        )
         self.update_existing_data = get_config_variable(
             "CONNECTOR_UPDATE_EXISTING_DATA",
             ["connector", "update_existing_data"],
@@ -138,7 +163,164 @@ class GoogleDrive:
         except Exception as e:
             self.helper.log_error(f"Error while sending bundle: {e}")
 
-    def process_file(self, work_id, item, data):
+    def get_service(self):
+        # The Drive client is not thread safe, one client per thread
+        service = getattr(self.local, "service", None)
+        if service is None:
+            service = build(
+                "drive", "v3", credentials=self.credentials, cache_discovery=False
+            )
+            self.local.service = service
+        return service
+
+    def find_folder(self, service):
+        self.helper.log_info("Finding the root folder...")
+        folder_id = (
+            service.files()
+            .list(
+                q="mimeType = 'application/vnd.google-apps.folder' and name = '"
+                + self.google_drive_folder_name
+                + "'",
+                pageSize=10,
+                fields="nextPageToken, files(id, name)",
+                supportsAllDrives=True,
+                includeItemsFromAllDrives=True,
+            )
+            .execute()
+        )
+        folder_id_result = folder_id.get("files", [])
+        if len(folder_id_result) == 0:
+            raise ValueError("Folder not found")
+        return folder_id_result[0].get("id")
+
+    def list_folder_files(self, service, folder_id, last_file_processed):
+        if last_file_processed is not None:
+            q = (
+                "'"
+                + folder_id
+                + "' in parents and modifiedTime > '"
+                + last_file_processed
+                + "'"
+            )
+        else:
+            q = "'" + folder_id + "' in parents"
+        self.helper.log_info("Fetching files with query: " + q)
+        items = []
+        page_token = None
+        while True:
+            results = (
+                service.files()
+                .list(
+                    q=q,
+                    pageSize=1000,
+                    fields="nextPageToken, files(" + FILE_FIELDS + ")",
+                    orderBy="modifiedTime asc",
+                    pageToken=page_token,
+                    supportsAllDrives=True,
+                    includeItemsFromAllDrives=True,
+                )
+                .execute()
+            )
+            items.extend(results.get("files", []))
+            page_token = results.get("nextPageToken")
+            if page_token is None:
+                return items
+
+    def list_changed_files(self, service, folder_id, page_token):
+        """
+        List the files of the folder added or modified since the page token.
+
+        Returns the files and the page token of the next run.
+        """
+        self.helper.log_info("Fetching changes since page token " + page_token)
+        items = {}
+        while True:
+            results = (
+                service.changes()
+                .list(
+                    pageToken=page_token,
+                    pageSize=1000,
+                    fields="nextPageToken, newStartPageToken, changes(fileId, removed, file("
+                    + FILE_FIELDS
+                    + ", parents, trashed))",
+                    supportsAllDrives=True,
+                    includeItemsFromAllDrives=True,
+                )
+                .execute()
+            )
+            for change in results.get("changes", []):
+                item = change.get("file")
+                if (
+                    change.get("removed")
+                    or item is None
+                    or item.get("trashed")
+                    or folder_id not in item.get("parents", [])
+                ):
+                    continue
+                # Only the last change of a file matters
+                items.pop(item["id"], None)
+                items[item["id"]] = item
+            if "newStartPageToken" in results:
+                return (
+                    sorted(items.values(), key=lambda item: item["modifiedTime"]),
+                    results["newStartPageToken"],
+                )
+            page_token = results["nextPageToken"]
+
+    def download_file(self, item):
+        """
+        Download a file in a spooled temporary file, in a worker thread.
+
+        Returns the file and the SHA-256 of its content.
+        """
+        request = (
+            self.get_service()
+            .files()
+            .get_media(fileId=item["id"], supportsAllDrives=True)
+        )
+        file = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+        try:
+            downloader = MediaIoBaseDownload(
+                file, request, chunksize=DOWNLOAD_CHUNK_SIZE
+            )
+            done = False
+            while done is False:
+                status, done = downloader.next_chunk()
+            file.seek(0)
+            sha256 = hashlib.sha256()
+            for chunk in iter(lambda: file.read(DOWNLOAD_CHUNK_SIZE), b""):
+                sha256.update(chunk)
+            file.seek(0)
+        except Exception:
+            file.close()
+            raise
+        return file, sha256.hexdigest()
+
+    def iter_downloads(self, items):
+        """
+        Download the files on the thread pool, with a bounded number of
+        downloads in advance. Yields the items, files and hashes in order.
+        """
+        pending = collections.deque()
+        with ThreadPoolExecutor(max_workers=self.google_drive_download_workers) as pool:
+            for item in items:
+                pending.append((item, pool.submit(self.download_file, item)))
+                if len(pending) >= 2 * self.google_drive_download_workers:
+                    item, future = pending.popleft()
+                    yield (item,) + future.result()
+            while pending:
+                item, future = pending.popleft()
+                yield (item,) + future.result()
+
+    @staticmethod
+    def encode_file(file):
+        # Encoded chunk by chunk, the raw file is never fully in memory
+        encoded = io.StringIO()
+        for chunk in iter(lambda: file.read(ENCODE_CHUNK_SIZE), b""):
+            encoded.write(b64encode(chunk).decode("utf-8"))
+        return encoded.getvalue()
+
+    def process_file(self, work_id, item, file):
         title = Path(item["name"]).stem
         created = item["createdTime"]
         modified = item["modifiedTime"]
@@ -157,7 +339,7 @@ class GoogleDrive:
             x_opencti_files=[
                 {
                     "name": item["name"],
-                    "data": b64encode(data).decode("utf-8"),
+                    "data": self.encode_file(file),
                     "mime_type": item["mimeType"],
                 }
             ],
@@ -170,57 +352,45 @@ class GoogleDrive:
         )
 
     def process(self):
-        current_state = self.helper.get_state()
-        last_file_processed = None
-        if current_state is not None and "last_file_processed" in current_state:
-            last_file_processed = current_state["last_file_processed"]
+        current_state = self.helper.get_state() or {}
+        last_file_processed = current_state.get("last_file_processed")
+        page_token = current_state.get("page_token")
+        # Content hashes of the imported files, oldest first
+        file_hashes = dict.fromkeys(current_state.get("file_hashes", []))
+        if last_file_processed is not None:
             self.helper.log_info("Connector last run: " + last_file_processed)
         else:
             self.helper.log_info("Connector has never run")
 
         self.helper.log_info("Building credentials...")
-        credentials = service_account.Credentials.from_service_account_info(
+        self.credentials = service_account.Credentials.from_service_account_info(
             self.build_credentials(), scopes=["https://www.googleapis.com/auth/drive"]
         )
-        service = build("drive", "v3", credentials=credentials)
-        self.helper.log_info("Finding the root folder...")
-        folder_id = (
-            service.files()
-            .list(
-                q="mimeType = 'application/vnd.google-apps.folder' and name = '"
-                + self.google_drive_folder_name
-                + "'",
-                pageSize=10,
-                fields="nextPageToken, files(id, name)",
-            )
-            .execute()
-        )
-        folder_id_result = folder_id.get("files", [])
-        if len(folder_id_result) == 0:
-            raise ValueError("Folder not found")
-        id = folder_id_result[0].get("id")
-        if last_file_processed is not None:
-            q = (
-                "'"
-                + id
-                + "' in parents and modifiedTime > '"
-                + last_file_processed
-                + "'"
+        self.local = threading.local()
+        service = self.get_service()
+        folder_id = self.find_folder(service)
+        if page_token is None:
+            # Taken before listing the folder, so no change is missed
+            new_page_token = (
+                service.changes()
+                .getStartPageToken(supportsAllDrives=True)
+                .execute()["startPageToken"]
             )
+            items = self.list_folder_files(service, folder_id, last_file_processed)
         else:
-            q = "'" + id + "' in parents"
-        self.helper.log_info("Fetching files with query: " + q)
-        results = (
-            service.files()
-            .list(
-                q=q,
-                pageSize=1000,
-                fields="nextPageToken, files(id, name, modifiedTime, createdTime, mimeType)",
-                orderBy="modifiedTime asc",
+            items, new_page_token = self.list_changed_files(
+                service, folder_id, page_token
             )
-            .execute()
-        )
-        items = results.get("files", [])
+
+        def save_state():
+            self.helper.set_state(
+                {
+                    "last_file_processed": last_file_processed,
+                    "page_token": page_token,
+                    "file_hashes": list(file_hashes)[-MAX_FILE_HASHES:],
+                }
+            )
+
         if len(items) > 0:
             self.helper.log_info(
                 "Returned " + str(len(items)) + " files, processing..."
@@ -230,33 +400,44 @@ class GoogleDrive:
             work_id = self.helper.api.work.initiate_work(
                 self.helper.connect_id, friendly_name
             )
+            selected_items = []
             for item in items:
-                if item["mimeType"] in self.google_drive_types:
+                if item["mimeType"] not in self.google_drive_types:
                     self.helper.log_info(
-                        "Processing file (name="
+                        "Ignoring filtered type file (name="
                         + item["name"]
                         + ", type="
                         + item["mimeType"]
                     )
-                    request = service.files().get_media(fileId=item["id"])
-                    file = io.BytesIO()
-                    downloader = MediaIoBaseDownload(file, request)
-                    done = False
-                    while done is False:
-                        status, done = downloader.next_chunk()
-                    self.process_file(work_id, item, file.getvalue())
-                    self.helper.set_state({"last_file_processed": item["modifiedTime"]})
+                # Known content, not even downloaded
+                elif item.get("sha256Checksum") in file_hashes:
                     self.helper.log_info(
-                        "File processed, setting last_file_processed state to "
-                        + item["modifiedTime"]
+                        "Ignoring already imported file (name=" + item["name"] + ")"
                     )
                 else:
-                    self.helper.log_info(
-                        "Ignoring filtered type file (name="
-                        + item["name"]
-                        + ", type="
-                        + item["mimeType"]
-                    )
+                    selected_items.append(item)
+
+            for item, file, sha256 in self.iter_downloads(selected_items):
+                with file:
+                    if sha256 in file_hashes:
+                        self.helper.log_info(
+                            "Ignoring already imported file (name=" + item["name"] + ")"
+                        )
+                    else:
+                        self.helper.log_info(
+                            "Processing file (name="
+                            + item["name"]
+                            + ", type="
+                            + item["mimeType"]
+                        )
+                        self.process_file(work_id, item, file)
+                        file_hashes[sha256] = None
+                last_file_processed = item["modifiedTime"]
+                save_state()
+                self.helper.log_info(
+                    "File processed, setting last_file_processed state to "
+                    + item["modifiedTime"]
+                )
             message = (
                 "Connector successfully run ("
                 + str(len(items))
@@ -267,6 +448,10 @@ class GoogleDrive:
         else:
             self.helper.log_info("Returned 0 files")
 
+        # All the changes up to the new page token are processed
+        page_token = new_page_token
+        save_state()
+
     def run(self):
         get_run_and_terminate = getattr(self.helper, "get_run_and_terminate", None)
         if callable(get_run_and_terminate) and self.helper.get_run_and_terminate():
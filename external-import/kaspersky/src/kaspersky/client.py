@@ -3,11 +3,15 @@
 import logging
 import time
 from datetime import datetime
-from typing import Any, List, Mapping, NoReturn, Optional
+from typing import IO, Any, List, Mapping, NoReturn, Optional
 
 import requests
 from kaspersky.models import Publication
-from kaspersky.utils import datetime_to_timestamp, decode_base64_gzip_to_string
+from kaspersky.utils import (
+    datetime_to_timestamp,
+    decode_base64_gzip_to_file,
+    decode_base64_gzip_to_string,
+)
 from pycti import OpenCTIConnectorHelper
 from pydantic.tools import parse_obj_as
 from requests import RequestException, Response
@@ -276,19 +280,19 @@ class KasperskyClient:
     def _datetime_to_timestamp(datetime_value: datetime) -> int:
         return datetime_to_timestamp(datetime_value)
 
-    def get_master_ioc(self, report_group: str) -> str:
+    def get_master_ioc_file(self, report_group: str) -> IO[bytes]:
         """
-        Return Master IOC file.
+        Return Master IOC file decompressed into a temporary file.
 
         :param report_group: Report group.
                              See API documentation (fin, apt, all).
         :type report_group: str
-        :return: Master IOC file.
-        :rtype: str
+        :return: Master IOC file, positioned at its start.
+        :rtype: IO[bytes]
         """
         response = self._get_master_ioc(report_group)
         master_ioc_data = response[self._RESPONSE_FIELD_MASTER_IOC]
-        return self._decode_base64_and_decompress_gzip(master_ioc_data)
+        return decode_base64_gzip_to_file(master_ioc_data)
 
     def _get_master_ioc(self, report_group: str) -> Mapping[str, Any]:
         log.info("Getting Master IOC for '%s' report group.", report_group)
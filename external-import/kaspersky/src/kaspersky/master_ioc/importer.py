@@ -1,18 +1,19 @@
 """Kaspersky Master IOC importer module."""
 
-import itertools
+import io
 from datetime import datetime
-from typing import Any, List, Mapping, Optional, Set, Tuple
+from typing import IO, Any, Iterable, Iterator, List, Mapping, Optional, Set, Tuple
 
 from kaspersky.client import KasperskyClient
 from kaspersky.importer import BaseImporter
 from kaspersky.master_ioc.builder import IndicatorGroupBundleBuilder
-from kaspersky.models import OpenIOCCSV, OpenIOCCSVIndicator
+from kaspersky.models import OpenIOCCSVIndicator
 from kaspersky.utils import (
-    convert_openioc_csv_to_openioc_csv_model,
     datetime_to_timestamp,
     datetime_utc_now,
+    group_by_key,
     is_current_weekday_before_datetime,
+    iter_openioc_csv_indicators,
     timestamp_to_datetime,
 )
 from pycti import OpenCTIConnectorHelper
@@ -25,6 +26,10 @@ class MasterIOCImporter(BaseImporter):
 
     _LATEST_MASTER_IOC_TIMESTAMP = "latest_master_ioc_timestamp"
 
+    # Indicators sorted in memory at once when grouping them by publication,
+    # bigger Master IOC files are sorted in runs spilled to temporary files.
+    _GROUPING_RUN_SIZE = 50000
+
     def __init__(
         self,
         helper: OpenCTIConnectorHelper,
@@ -79,39 +84,31 @@ class MasterIOCImporter(BaseImporter):
                 self._info("It is not time to fetch the Master IOC yet.")
                 return self._create_state(latest_master_ioc_datetime)
 
-        openioc_csv = self._fetch_master_ioc()
-
-        indicators = openioc_csv.indicators
-        indicator_count = len(indicators)
-
-        self._info(
-            "Master IOC with {0} indicators...",
-            indicator_count,
-        )
-
-        indicators = self._filter_indicators(indicators, latest_master_ioc_datetime)
-        indicator_count = len(indicators)
+        indicator_counter = _Counter()
+        filtered_counter = _Counter()
+        group_count = 0
+        failed_count = 0
 
-        self._info(
-            "{0} indicators after filtering...",
-            indicator_count,
-        )
+        with self._fetch_master_ioc() as master_ioc_file:
+            indicators = indicator_counter.count(
+                iter_openioc_csv_indicators(master_ioc_file)
+            )
+            indicators = filtered_counter.count(
+                self._filter_indicators(indicators, latest_master_ioc_datetime)
+            )
 
-        grouped_indicators = self._group_indicators_by_publication(indicators)
-        group_count = len(grouped_indicators)
+            for indicator_group in self._group_indicators_by_publication(indicators):
+                group_count += 1
+                result = self._process_indicator_group(indicator_group)
+                if not result:
+                    failed_count += 1
 
         self._info(
-            "{0} indicator groups...",
-            group_count,
+            "Master IOC with {0} indicators, {1} indicators after filtering...",
+            indicator_counter.value,
+            filtered_counter.value,
         )
 
-        failed_count = 0
-
-        for indicator_group in grouped_indicators:
-            result = self._process_indicator_group(indicator_group)
-            if not result:
-                failed_count += 1
-
         success_count = group_count - failed_count
 
         self._info(
@@ -131,16 +128,16 @@ class MasterIOCImporter(BaseImporter):
             cls._LATEST_MASTER_IOC_TIMESTAMP: datetime_to_timestamp(latest_datetime)
         }
 
-    def _fetch_master_ioc(self) -> OpenIOCCSV:
+    def _fetch_master_ioc(self) -> IO[str]:
         report_group = "apt"
-        master_ioc = self.client.get_master_ioc(report_group)
-        return convert_openioc_csv_to_openioc_csv_model(master_ioc)
+        master_ioc_file = self.client.get_master_ioc_file(report_group)
+        return io.TextIOWrapper(master_ioc_file, encoding="utf-8", newline="")
 
     def _filter_indicators(
         self,
-        indicators: List[OpenIOCCSVIndicator],
+        indicators: Iterable[OpenIOCCSVIndicator],
         latest_master_ioc_datetime: Optional[datetime],
-    ) -> List[OpenIOCCSVIndicator]:
+    ) -> Iterable[OpenIOCCSVIndicator]:
         filtered_indicators = self._filter_already_processed(
             indicators, latest_master_ioc_datetime
         )
@@ -149,9 +146,9 @@ class MasterIOCImporter(BaseImporter):
 
     def _filter_already_processed(
         self,
-        indicators: List[OpenIOCCSVIndicator],
+        indicators: Iterable[OpenIOCCSVIndicator],
         latest_master_ioc_datetime: Optional[datetime],
-    ) -> List[OpenIOCCSVIndicator]:
+    ) -> Iterable[OpenIOCCSVIndicator]:
         if latest_master_ioc_datetime is None:
             return indicators
 
@@ -169,12 +166,12 @@ class MasterIOCImporter(BaseImporter):
             else:
                 return True
 
-        return list(filter(_processed_filter, indicators))
+        return filter(_processed_filter, indicators)
 
     def _filter_excluded_indicator_types(
         self,
-        indicators: List[OpenIOCCSVIndicator],
-    ) -> List[OpenIOCCSVIndicator]:
+        indicators: Iterable[OpenIOCCSVIndicator],
+    ) -> Iterable[OpenIOCCSVIndicator]:
         excluded_types = self.master_ioc_excluded_ioc_indicator_types
 
         def _exclude_indicator_types_filter(
@@ -191,20 +188,23 @@ class MasterIOCImporter(BaseImporter):
             else:
                 return True
 
-        return list(filter(_exclude_indicator_types_filter, indicators))
+        return filter(_exclude_indicator_types_filter, indicators)
 
-    @staticmethod
+    @classmethod
     def _group_indicators_by_publication(
-        indicators: List[OpenIOCCSVIndicator],
-    ) -> List[Tuple[str, List[OpenIOCCSVIndicator]]]:
+        cls,
+        indicators: Iterable[OpenIOCCSVIndicator],
+    ) -> Iterator[Tuple[str, List[OpenIOCCSVIndicator]]]:
         def _key_func(item: OpenIOCCSVIndicator) -> str:
             return item.publication
 
-        groups = []
-        sorted_indicators = sorted(indicators, key=_key_func)
-        for key, group in itertools.groupby(sorted_indicators, key=_key_func):
-            groups.append((key, list(group)))
-        return groups
+        return group_by_key(
+            indicators,
+            _key_func,
+            OpenIOCCSVIndicator.json,
+            OpenIOCCSVIndicator.parse_raw,
+            cls._GROUPING_RUN_SIZE,
+        )
 
     def _process_indicator_group(
         self, indicator_group: Tuple[str, List[OpenIOCCSVIndicator]]
@@ -258,3 +258,13 @@ class MasterIOCImporter(BaseImporter):
                 e,
             )
             return None
+
+
+class _Counter:
+    def __init__(self) -> None:
+        self.value = 0
+
+    def count(self, items: Iterable[Any]) -> Iterator[Any]:
+        for item in items:
+            self.value += 1
+            yield item
@@ -65,12 +65,6 @@ class OpenIOCCSVIndicator(Base):
     detection_date: datetime
 
 
-class OpenIOCCSV(Base):
-    """Kaspersky OpenIOC CSV model."""
-
-    indicators: List[OpenIOCCSVIndicator]
-
-
 class YaraRule(Base):
     """Kaspersky YARA rule model."""
 
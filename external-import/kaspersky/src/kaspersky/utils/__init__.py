@@ -5,15 +5,17 @@ from kaspersky.utils.common import (
     datetime_to_timestamp,
     datetime_utc_now,
     decode_base64_gzip_to_bytes,
+    decode_base64_gzip_to_file,
     decode_base64_gzip_to_string,
     is_current_weekday_before_datetime,
     timestamp_to_datetime,
 )
+from kaspersky.utils.grouping import group_by_key
 from kaspersky.utils.openioc import (
-    convert_openioc_csv_to_openioc_csv_model,
     convert_openioc_xml_to_openioc_model,
     get_observation_factory_by_openioc_indicator_type,
     get_observation_factory_by_openioc_search,
+    iter_openioc_csv_indicators,
 )
 from kaspersky.utils.stix2 import (
     DEFAULT_TLP_MARKING_DEFINITION,
@@ -43,7 +45,6 @@ __all__ = [
     "DEFAULT_TLP_MARKING_DEFINITION",
     "YaraRuleUpdater",
     "convert_comma_separated_str_to_list",
-    "convert_openioc_csv_to_openioc_csv_model",
     "convert_openioc_xml_to_openioc_model",
     "convert_yara_rules_to_yara_model",
     "create_country",
@@ -61,11 +62,14 @@ __all__ = [
     "datetime_to_timestamp",
     "datetime_utc_now",
     "decode_base64_gzip_to_bytes",
+    "decode_base64_gzip_to_file",
     "decode_base64_gzip_to_string",
     "get_observation_factory_by_openioc_indicator_type",
     "get_observation_factory_by_openioc_search",
     "get_tlp_string_marking_definition",
+    "group_by_key",
     "is_current_weekday_before_datetime",
+    "iter_openioc_csv_indicators",
     "timestamp_to_datetime",
     "Observation",
     "ObservationConfig",
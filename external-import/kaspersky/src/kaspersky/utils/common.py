@@ -4,9 +4,11 @@ import base64
 import calendar
 import gzip
 import ipaddress
+import shutil
+import tempfile
 from datetime import datetime, timezone
 from io import BytesIO
-from typing import List, Optional
+from typing import IO, List, Optional
 
 X_OPENCTI_LOCATION_TYPE = "x_opencti_location_type"
 X_OPENCTI_ALIASES = "x_opencti_aliases"
@@ -68,6 +70,16 @@ def decode_base64_gzip_to_string(base64_gzip_data: str) -> str:
     return data_bytes.decode("utf-8")
 
 
+def decode_base64_gzip_to_file(base64_gzip_data: str) -> IO[bytes]:
+    """Decode Base64 GZIP into a temporary file, positioned at its start."""
+    decompressed_file = tempfile.TemporaryFile()
+    with BytesIO(base64.b64decode(base64_gzip_data)) as compressed_file:
+        with gzip.GzipFile(fileobj=compressed_file, mode="rb") as gzip_file:
+            shutil.copyfileobj(gzip_file, decompressed_file)
+    decompressed_file.seek(0)
+    return decompressed_file
+
+
 def convert_comma_separated_str_to_list(input_str: str, trim: bool = True) -> List[str]:
     """Convert comma separated string to list of strings."""
     comma_separated_str = input_str.strip() if trim else input_str
@@ -0,0 +1,77 @@
+"""Kaspersky grouping utilities module."""
+
+import heapq
+import itertools
+import tempfile
+from typing import IO, Callable, Iterable, Iterator, List, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+def _write_run(items: List[T], serialize: Callable[[T], str]) -> IO[str]:
+    run_file = tempfile.TemporaryFile(mode="w+", encoding="utf-8")
+    for item in items:
+        run_file.write(serialize(item))
+        run_file.write("\n")
+    run_file.seek(0)
+    return run_file
+
+
+def _read_run(run_file: IO[str], deserialize: Callable[[str], T]) -> Iterator[T]:
+    for line in run_file:
+        yield deserialize(line)
+
+
+def group_by_key(
+    items: Iterable[T],
+    key: Callable[[T], str],
+    serialize: Callable[[T], str],
+    deserialize: Callable[[str], T],
+    run_size: int,
+) -> Iterator[Tuple[str, List[T]]]:
+    """
+    Group items by key, one group at a time.
+
+    The items are sorted by runs of at most run_size items, the runs are
+    spilled to temporary files as serialized lines and merged back, so only
+    one run and the current group are kept in memory.
+
+    :param items: Items to group.
+    :type items: Iterable[T]
+    :param key: Group key of an item.
+    :type key: Callable[[T], str]
+    :param serialize: Serialize an item to a single line.
+    :type serialize: Callable[[T], str]
+    :param deserialize: Deserialize an item from a line.
+    :type deserialize: Callable[[str], T]
+    :param run_size: Maximum number of items sorted in memory.
+    :type run_size: int
+    :return: Iterator of (key, items) tuples, ordered by key.
+    :rtype: Iterator[Tuple[str, List[T]]]
+    """
+    run_files = []
+    sorted_items: Iterator[T] = iter(())
+    try:
+        items_iter = iter(items)
+        while True:
+            run = sorted(itertools.islice(items_iter, run_size), key=key)
+            if not run:
+                break
+            if len(run) < run_size and not run_files:
+                # Everything fits in a single run, no need to spill it.
+                sorted_items = iter(run)
+                break
+            run_files.append(_write_run(run, serialize))
+            del run
+
+        if run_files:
+            sorted_items = heapq.merge(
+                *(_read_run(run_file, deserialize) for run_file in run_files),
+                key=key,
+            )
+
+        for group_key, group in itertools.groupby(sorted_items, key=key):
+            yield group_key, list(group)
+    finally:
+        for run_file in run_files:
+            run_file.close()
@@ -3,10 +3,9 @@
 import csv
 import logging
 from datetime import datetime, timezone
-from io import StringIO
-from typing import Any, List, Mapping, Optional
+from typing import Any, Iterator, List, Mapping, Optional, Sequence, TextIO
 
-from kaspersky.models import OpenIOC, OpenIOCCSV
+from kaspersky.models import OpenIOC, OpenIOCCSVIndicator
 from kaspersky.utils.stix2 import (
     OBSERVATION_FACTORY_DOMAIN_NAME,
     OBSERVATION_FACTORY_EMAIL_ADDRESS,
@@ -350,19 +349,8 @@ def convert_openioc_xml_to_openioc_model(openioc_xml: bytes) -> OpenIOC:
     return OpenIOC.parse_obj(openioc_data)
 
 
-def convert_openioc_csv_to_map(openioc_csv: str) -> Mapping[str, Any]:
-    """
-    Convert OpenIOC CSV into a map.
-
-    :param openioc_csv: OpenIOC CSV.
-    :type openioc_csv: str
-    :return: OpenIOC CSV as a map.
-    :rtype: Mapping[str, Any]
-    """
-    file_buffer = StringIO(openioc_csv)
-    csv_reader = csv.reader(file_buffer, delimiter=",", quotechar="'")
-
-    parsed_rows = []
+def _iter_csv_rows(openioc_csv: TextIO) -> Iterator[Sequence[str]]:
+    csv_reader = csv.reader(openioc_csv, delimiter=",", quotechar="'")
 
     # skip the header
     next(csv_reader, None)
@@ -370,39 +358,38 @@ def convert_openioc_csv_to_map(openioc_csv: str) -> Mapping[str, Any]:
     for row in csv_reader:
         if not row:
             continue
+        yield row
 
-        uid = row[_CSV_INDEX_UID]
-        publication = row[_CSV_INDEX_PUBLICATION]
-        indicator = row[_CSV_INDEX_INDICATOR]
-        detection_date = row[_CSV_INDEX_DETECTION_DATE]
-        indicator_type = row[_CSV_INDEX_INDICATOR_TYPE]
-
-        parsed_row = {
-            "id": uid,
-            "publication": publication,
-            "indicator": indicator,
-            "detection_date": datetime.strptime(
-                detection_date, _CSV_DETECTION_DATE_FORMAT
-            ),
-            "indicator_type": indicator_type,
-        }
 
-        parsed_rows.append(parsed_row)
+def _convert_csv_row(row: Sequence[str]) -> Mapping[str, Any]:
+    uid = row[_CSV_INDEX_UID]
+    publication = row[_CSV_INDEX_PUBLICATION]
+    indicator = row[_CSV_INDEX_INDICATOR]
+    detection_date = row[_CSV_INDEX_DETECTION_DATE]
+    indicator_type = row[_CSV_INDEX_INDICATOR_TYPE]
 
-    return {"indicators": parsed_rows}
+    return {
+        "id": uid,
+        "publication": publication,
+        "indicator": indicator,
+        "detection_date": datetime.strptime(detection_date, _CSV_DETECTION_DATE_FORMAT),
+        "indicator_type": indicator_type,
+    }
 
 
-def convert_openioc_csv_to_openioc_csv_model(openioc_csv: str) -> OpenIOCCSV:
+def iter_openioc_csv_indicators(
+    openioc_csv: TextIO,
+) -> Iterator[OpenIOCCSVIndicator]:
     """
-    Convert OpenIOC CSV into an OpenIOC CSV model.
+    Convert OpenIOC CSV into OpenIOC CSV indicator models, one row at a time.
 
-    :param openioc_csv: OpenIOC CSV.
-    :type openioc_csv: str
-    :return: OpenIOC CSV model.
-    :rtype: OpenIOCCSV
+    :param openioc_csv: OpenIOC CSV text file.
+    :type openioc_csv: TextIO
+    :return: Iterator of OpenIOC CSV indicator models.
+    :rtype: Iterator[OpenIOCCSVIndicator]
     """
-    openioc_data = convert_openioc_csv_to_map(openioc_csv)
-    return OpenIOCCSV.parse_obj(openioc_data)
+    for row in _iter_csv_rows(openioc_csv):
+        yield OpenIOCCSVIndicator.parse_obj(_convert_csv_row(row))
 
 
 def get_observation_factory_by_openioc_search(
@@ -2,6 +2,8 @@ import io
 import os
 import sys
 import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 
 import magic
 import pyzipper
@@ -9,6 +11,10 @@ import requests
 import stix2
 import yaml
 from pycti import OpenCTIConnectorHelper, get_config_variable
+from stix2.canonicalization.Canonicalize import canonicalize
+
+# Namespace of the deterministic ids of the STIX cyber observables
+SCO_NAMESPACE = uuid.UUID("00abedb4-aa42-466c-9c01-fed23315a9b7")
 
 
 class MalwareBazaarRecentAdditions:
@@ -66,33 +72,39 @@ class MalwareBazaarRecentAdditions:
         if self.include_reporters:
             self.include_reporters = self.include_reporters.split(",")
 
+        self.download_workers = get_config_variable(
+            "MALWAREBAZAAR_RECENT_ADDITIONS_DOWNLOAD_WORKERS",
+            ["malwarebazaar_recent_additions", "download_workers"],
+            config,
+            isNumber=True,
+            default=4,
+        )
+
         labels = get_config_variable(
             "MALWAREBAZAAR_RECENT_ADDITIONS_LABELS",
             ["malwarebazaar_recent_additions", "labels"],
             config,
         )
-        self.label_ids = []
+        # Label ids by value, kept for the process lifetime
+        self.label_ids = {}
+        self.labels = []
 
         # Create default labels
         if labels:
-            labels = labels.split(",")
-            for label in labels:
-                created_label = self.helper.api.label.read_or_create_unchecked(
-                    value=label, color=self.labels_color
-                )
-                if created_label is not None:
-                    self.label_ids.append(created_label["id"])
+            for label in labels.split(","):
+                if self.get_label_id(label) is not None:
+                    self.labels.append(label)
 
     def run(self):
         self.helper.log_info("Starting MalwareBazaar Recent Additions Connector")
         while True:
             try:
                 recent_additions_list = self.get_recent_additions()
+                samples = []
                 for recent_additions_dict in recent_additions_list:
                     self.helper.log_info(f"Processing: {recent_additions_dict}")
                     sha256 = recent_additions_dict["sha256_hash"]
                     reporter = recent_additions_dict["reporter"]
-                    file_name = recent_additions_dict["file_name"]
                     tags = (
                         recent_additions_dict["tags"]
                         if recent_additions_dict["tags"]
@@ -121,44 +133,32 @@ class MalwareBazaarRecentAdditions:
                         )
                         continue
 
-                    # Download the artifact and unzip with default "infected" password
-                    file_contents = self.download_unzip(sha256)
-
-                    # Upload the artifact to OpenCTI
-                    response = self.upload_artifact_opencti(
-                        file_name,
-                        file_contents,
-                        f"Uploaded to MalwareBazaar by Twitter user: {reporter}.",
-                    )
-
-                    # Create external reference to MalwareBazaar report
-                    external_reference = self.helper.api.external_reference.create(
-                        source_name="MalwareBazaar Recent Additions",
-                        url=f"https://bazaar.abuse.ch/sample/{sha256}/",
-                        description="MalwareBazaar Recent Additions",
-                    )
-                    self.helper.api.stix_cyber_observable.add_external_reference(
-                        id=response["id"],
-                        external_reference_id=external_reference["id"],
-                    )
+                    samples.append(recent_additions_dict)
 
-                    # Attach all default labels if any
-                    for label_id in self.label_ids:
-                        self.helper.api.stix_cyber_observable.add_label(
-                            id=response["id"], label_id=label_id
-                        )
+                # Download the artifacts concurrently and unzip them with the
+                # default "infected" password
+                with ThreadPoolExecutor(max_workers=self.download_workers) as pool:
+                    downloads = pool.map(self.try_download_unzip, samples)
 
-                    # Attach all tags as labels if any
-                    for tag in tags:
-                        label = self.helper.api.label.read_or_create_unchecked(
-                            value=tag,
-                            color=self.labels_color,
+                    # Upload each artifact to OpenCTI, its metadata is sent
+                    # afterwards in a single bundle referencing it by hash
+                    bundle_objects = []
+                    for sample, file_contents in zip(samples, downloads):
+                        if file_contents is None:
+                            continue
+                        response = self.upload_artifact_opencti(
+                            sample["file_name"],
+                            file_contents,
+                            f"Uploaded to MalwareBazaar by Twitter user: {sample['reporter']}.",
                         )
-                        if label is not None:
-                            self.helper.api.stix_cyber_observable.add_label(
-                                id=response["id"], label_id=label["id"]
+                        if response is not None:
+                            bundle_objects.append(
+                                self.create_artifact_stix(sample, response)
                             )
 
+                if bundle_objects:
+                    self.send_bundle(bundle_objects)
+
                 self.helper.log_info(
                     f"Re-checking for new additions in {self.cooldown_seconds} seconds..."
                 )
@@ -195,6 +195,96 @@ class MalwareBazaarRecentAdditions:
         recent_additions_list = resp.json()
         return recent_additions_list["data"]
 
+    def get_label_id(self, value):
+        """
+        Get the id of a label, creating it with the configured color.
+
+        value: a str representing the label value
+        returns: the label id or None if it could not be created
+        """
+        if value not in self.label_ids:
+            label = self.helper.api.label.read_or_create_unchecked(
+                value=value, color=self.labels_color
+            )
+            if label is None:
+                return None
+            self.label_ids[value] = label["id"]
+        return self.label_ids[value]
+
+    def try_download_unzip(self, sample):
+        """
+        Download and unzip a sample, logging the failures.
+
+        sample: a dict representing a recent addition
+        returns: a bytes object containing the contents of the file or None
+        """
+        try:
+            return self.download_unzip(sample["sha256_hash"])
+        except Exception as e:
+            self.helper.log_error(
+                f"Unable to download {sample['sha256_hash']}: {str(e)}"
+            )
+            return None
+
+    def create_artifact_stix(self, sample, response):
+        """
+        Create the STIX Artifact holding the metadata of an uploaded sample.
+
+        The Artifact has no payload, OpenCTI merges it with the uploaded one
+        sharing the same SHA-256. As STIX requires an Artifact to carry its
+        payload or an url to it, the object is built as a dict, with the id
+        the stix2 library computes from the hashes.
+
+        sample: a dict representing a recent addition
+        response: the response of the artifact upload
+        returns: a dict representing a STIX Artifact
+        """
+        sha256 = sample["sha256_hash"]
+        labels = list(self.labels)
+        for tag in sample["tags"] or []:
+            # The labels are created beforehand to get the configured color
+            if tag not in labels and self.get_label_id(tag) is not None:
+                labels.append(tag)
+
+        hashes = {"SHA-256": sha256}
+        artifact_id = uuid.uuid5(
+            SCO_NAMESPACE, canonicalize({"hashes": hashes}, utf8=False)
+        )
+        return {
+            "type": "artifact",
+            "spec_version": "2.1",
+            "id": f"artifact--{artifact_id}",
+            "hashes": hashes,
+            "mime_type": response.get("mime_type"),
+            "object_marking_refs": [stix2.TLP_WHITE.id],
+            "x_opencti_created_by_ref": self.identity["standard_id"],
+            "x_opencti_labels": labels,
+            "x_opencti_external_references": [
+                {
+                    "source_name": "MalwareBazaar Recent Additions",
+                    "url": f"https://bazaar.abuse.ch/sample/{sha256}/",
+                    "description": "MalwareBazaar Recent Additions",
+                }
+            ],
+        }
+
+    def send_bundle(self, bundle_objects):
+        """
+        Send the artifacts metadata of a polling batch in a single bundle.
+
+        bundle_objects: a list of STIX objects
+        """
+        now = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime())
+        friendly_name = f"MalwareBazaar Recent Additions run @ {now}"
+        work_id = self.helper.api.work.initiate_work(
+            self.helper.connect_id, friendly_name
+        )
+        bundle = self.helper.stix2_create_bundle(bundle_objects)
+        self.helper.send_stix2_bundle(bundle, update=True, work_id=work_id)
+        message = f"{len(bundle_objects)} artifacts sent"
+        self.helper.log_info(message)
+        self.helper.api.work.to_processed(work_id, message)
+
     def download_unzip(self, sha256):
         """
         Download and unzip a sample from MalwareBazaar.
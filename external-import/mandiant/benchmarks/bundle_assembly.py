@@ -0,0 +1,86 @@
+"""
+Benchmark of the bundle assembly of a collection window.
+
+Compares the previous assembly (list concatenation per item and a single
+deduplication at the end) with the indexed ObjectStore flushed in chunks,
+on a synthetic window of reports.
+
+Usage: python benchmarks/bundle_assembly.py [--reports 5000] [--chunk-size 5000]
+"""
+
+import argparse
+import os
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from connector.store import ObjectStore  # noqa: E402
+
+SHARED_OBJECTS = [
+    {"type": "marking-definition", "id": f"marking-definition--{uuid.uuid4()}"},
+    {"type": "identity", "id": f"identity--{uuid.uuid4()}", "name": "Mandiant"},
+] + [
+    {"type": "location", "id": f"location--{uuid.uuid4()}", "name": f"Country {i}"}
+    for i in range(50)
+]
+
+
+def generate_report_objects(index, objects_per_report):
+    objects = list(SHARED_OBJECTS[:2])
+    objects.append(SHARED_OBJECTS[2 + index % 50])
+    for _ in range(objects_per_report):
+        objects.append({"type": "indicator", "id": f"indicator--{uuid.uuid4()}"})
+    objects.append({"type": "report", "id": f"report--{uuid.uuid4()}"})
+    return objects
+
+
+def assemble_concatenation(reports):
+    bundles_objects = []
+    for objects in reports:
+        bundles_objects = bundles_objects + objects
+    return [list({obj["id"]: obj for obj in bundles_objects}.values())]
+
+
+def assemble_store(reports, chunk_size):
+    chunks = []
+    store = ObjectStore()
+    for objects in reports:
+        store.add_all(objects)
+        if len(store) >= chunk_size:
+            chunks.append(store.values())
+            store.clear()
+    if len(store) > 0:
+        chunks.append(store.values())
+    return chunks
+
+
+def measure(name, func, *args):
+    start = time.perf_counter()
+    chunks = func(*args)
+    elapsed = time.perf_counter() - start
+    objects = sum(len(chunk) for chunk in chunks)
+    print(f"{name:<16} {elapsed:8.3f}s  {len(chunks):5d} bundle(s)  {objects} objects")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--reports", type=int, default=5000)
+    parser.add_argument("--objects-per-report", type=int, default=40)
+    parser.add_argument("--chunk-size", type=int, default=5000)
+    args = parser.parse_args()
+
+    reports = [
+        generate_report_objects(i, args.objects_per_report) for i in range(args.reports)
+    ]
+    print(f"Synthetic window: {args.reports} reports")
+
+    before = measure("concatenation", assemble_concatenation, reports)
+    after = measure("object store", assemble_store, reports, args.chunk_size)
+    print(f"Speedup: {before / after:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,5 @@
+import threading
 import time
-from datetime import datetime, timedelta
 from typing import Dict, Iterable, List, Union
 from urllib.parse import urljoin
 
@@ -9,11 +9,66 @@ from pycti import OpenCTIConnectorHelper
 OFFSET_PAGINATION = 100
 
 
+class TokenBucket:
+    """
+    Thread-safe token bucket shared by all the workers querying the API.
+
+    The rate is adapted from the rate limit headers returned by the API,
+    and a 429 response pauses every worker until the limit is reset.
+    """
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(rate, 1))
+        self._tokens = self.capacity
+        self._last_refill = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self._last_refill
+        self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+        self._last_refill = now
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    wait = self._paused_until - now
+                else:
+                    self._refill(now)
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def pause(self, seconds: float) -> None:
+        with self._lock:
+            now = time.monotonic()
+            self._paused_until = max(self._paused_until, now + seconds)
+            self._tokens = 0
+            self._last_refill = self._paused_until
+
+    def update(self, remaining: int, reset_seconds: float) -> None:
+        """Spread the remaining requests of the window until its reset."""
+        if reset_seconds <= 0:
+            return
+        with self._lock:
+            if remaining <= 0:
+                self._paused_until = time.monotonic() + reset_seconds
+                self._tokens = 0
+                return
+            self.rate = remaining / reset_seconds
+            self._tokens = min(self._tokens, float(remaining))
+
+
 class MandiantAPI:
     api_url: str = "https://api.intelligence.mandiant.com"
     token_format: str = "Bearer {token}"
     max_retries: int = 3
-    last_query_time = None
+    default_retry_after: int = 30
     endpoints: Dict[str, str] = {
         "token": "/token",
         "reports": "v4/reports",
@@ -38,23 +93,54 @@ class MandiantAPI:
         "stix": "application/stix+json;version=2.1",
     }
 
-    def __init__(self, helper: OpenCTIConnectorHelper, key_id: str, key_secret: str):
+    def __init__(
+        self,
+        helper: OpenCTIConnectorHelper,
+        key_id: str,
+        key_secret: str,
+        rate_limit: float = 1,
+        workers: int = 1,
+    ):
         self.helper = helper
         self.auth = requests.auth.HTTPBasicAuth(key_id, key_secret)
+        self.rate_limiter = TokenBucket(rate_limit)
+        self.workers = workers
+
+        # Persistent session, sized for the workers sharing it
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=1, pool_maxsize=max(workers, 1)
+        )
+        self.session.mount("https://", adapter)
+        self.session.headers.update({"x-app-name": "opencti-connector"})
+
+        self._auth_lock = threading.Lock()
         self._authenticate()
 
-    def _set_last_query_time(self):
-        self.last_query_time = datetime.now()
+    def _update_rate_limit(self, response: requests.Response) -> None:
+        remaining = response.headers.get("x-ratelimit-remaining")
+        reset = response.headers.get("x-ratelimit-reset")
+        if remaining is None or reset is None:
+            return
 
-    def _wait_before_next_query(self):
-        if not self.last_query_time:
+        try:
+            remaining = int(remaining)
+            reset_seconds = float(reset)
+        except ValueError:
             return
 
-        while True:
-            if datetime.now() - self.last_query_time > timedelta(seconds=1):
-                break
+        # Reset is either a delay in seconds or a unix timestamp
+        if reset_seconds > time.time():
+            reset_seconds = reset_seconds - time.time()
 
-            time.sleep(0.1)
+        self.rate_limiter.update(remaining, reset_seconds)
+
+    def _retry_after(self, response: requests.Response) -> float:
+        retry_after = response.headers.get("retry-after")
+        try:
+            return float(retry_after)
+        except (TypeError, ValueError):
+            return self.default_retry_after
 
     def _get_endpoint(self, name: str, item_id: str = None, **kwargs) -> str:
         request = requests.models.PreparedRequest()
@@ -67,15 +153,20 @@ class MandiantAPI:
         request.prepare_url(endpoint, kwargs)
         return request.url
 
-    def _authenticate(self) -> None:
-        response = requests.post(
+    def _authenticate(self, expired_token: str = None) -> None:
+        with self._auth_lock:
+            # Another worker already refreshed the expired token
+            if expired_token is not None and expired_token != self.token:
+                return
+
+            self._request_token()
+
+    def _request_token(self) -> None:
+        response = self.session.post(
             url=self._get_endpoint("token"),
             auth=self.auth,
             data={"grant_type": "client_credentials"},
-            headers={
-                "accept": "application/json",
-                "x-app-name": "opencti-connector",
-            },
+            headers={"accept": "application/json"},
         )
 
         if response.status_code != 200:
@@ -91,32 +182,33 @@ class MandiantAPI:
             if self.max_retries == retries:
                 return None
 
+            token = self.token
             headers = {
                 "accept": accept,
-                "x-app-name": "opencti-connector",
-                "authorization": self.token_format.format(token=self.token),
+                "authorization": self.token_format.format(token=token),
             }
 
-            self._wait_before_next_query()
+            self.rate_limiter.acquire()
 
-            response = requests.get(url, headers=headers)
+            response = self.session.get(url, headers=headers)
 
-            self._set_last_query_time()
+            self._update_rate_limit(response)
 
             if 200 <= response.status_code < 300:
                 return response
 
             if response.status_code == 429:
+                retry_after = self._retry_after(response)
                 self.helper.connector_logger.warning(
-                    "Rate limit exceeded. Waiting 30 seconds ..."
+                    f"Rate limit exceeded. Waiting {retry_after} seconds ..."
                 )
-                time.sleep(30)
+                self.rate_limiter.pause(retry_after)
                 continue
 
             if response.status_code in [401, 403]:
                 self.helper.connector_logger.debug("Refreshing token ...")
                 retries += 1
-                self._authenticate()
+                self._authenticate(expired_token=token)
                 continue
 
             meta = {
@@ -9,7 +9,8 @@ import yaml
 from pycti import OpenCTIConnectorHelper, get_config_variable
 
 from .api import OFFSET_PAGINATION, MandiantAPI
-from .utils import Timestamp
+from .store import ObjectStore
+from .utils import Timestamp, bounded_map
 
 STATE_START = "start_epoch"
 STATE_OFFSET = "offset"
@@ -63,6 +64,27 @@ class Mandiant:
             config,
             default=False,
         )
+        self.mandiant_api_rate_limit = get_config_variable(
+            "MANDIANT_API_RATE_LIMIT",
+            ["mandiant", "api_rate_limit"],
+            config,
+            isNumber=True,
+            default=1,
+        )
+        self.mandiant_api_workers = get_config_variable(
+            "MANDIANT_API_WORKERS",
+            ["mandiant", "api_workers"],
+            config,
+            isNumber=True,
+            default=4,
+        )
+        self.mandiant_bundle_chunk_size = get_config_variable(
+            "MANDIANT_BUNDLE_CHUNK_SIZE",
+            ["mandiant", "bundle_chunk_size"],
+            config,
+            isNumber=True,
+            default=5000,
+        )
 
         self.mandiant_collections = []
 
@@ -446,6 +468,8 @@ class Mandiant:
             self.helper,
             self.mandiant_api_v4_key_id,
             self.mandiant_api_v4_key_secret,
+            rate_limit=self.mandiant_api_rate_limit,
+            workers=self.mandiant_api_workers,
         )
 
         if not self.helper.get_state():
@@ -643,24 +667,42 @@ class Mandiant:
                 f"The '{collection}' collection has not been correctly identified"
             )
 
-        data = collection_api(**parameters)
-        bundles_objects = []
-        for item in data:
-            bundle = module.process(self, item)
+        """
+        For collections paginated by epoch, the offset is the number of items
+        already sent for the current (closed) period, so an interrupted run
+        resumes after the last sent chunk instead of restarting the period.
+        """
+        skip = 0
+        if collection in collection_with_start_epoch and end is not None:
+            skip = offset
+        elif collection in collection_with_start_epoch:
+            offset = 0
+
+        data = collection_api(**parameters)[skip:]
+        store = ObjectStore()
+        sent_objects = 0
+
+        # Items details are fetched and processed by the API workers, the
+        # bundles are consumed in the items order to keep the offset exact
+        bundles = bounded_map(
+            lambda item: module.process(self, item),
+            data,
+            self.mandiant_api_workers,
+        )
+        for bundle in bundles:
             if bundle:
-                bundles_objects = bundles_objects + bundle["objects"]
+                store.add_all(bundle["objects"])
             offset += 1
 
-        if len(bundles_objects) > 0:
-            uniq_bundles_objects = list(
-                {obj["id"]: obj for obj in bundles_objects}.values()
-            )
-            bundle = stix2.Bundle(objects=uniq_bundles_objects, allow_custom=True)
-            self.helper.send_stix2_bundle(
-                bundle.serialize(),
-                update=self.update_existing_data,
-                work_id=work_id,
-            )
+            if len(store) >= self.mandiant_bundle_chunk_size:
+                sent_objects += self._send_chunk(work_id, collection, store)
+                state[collection][STATE_OFFSET] = offset
+                self.helper.set_state(state)
+
+        if len(store) > 0:
+            sent_objects += self._send_chunk(work_id, collection, store)
+
+        if sent_objects > 0:
             if collection in collection_with_offset:
                 state[collection][STATE_OFFSET] = offset
         else:
@@ -669,6 +711,7 @@ class Mandiant:
             )
 
         if collection in collection_with_start_epoch:
+            state[collection][STATE_OFFSET] = 0
             after_process_now = Timestamp.now()
             next_start = (
                 end if end is not None else before_process_now
@@ -682,3 +725,21 @@ class Mandiant:
             )
         state[collection][STATE_LAST_RUN] = before_process_now.iso_format
         self.helper.set_state(state)
+
+    def _send_chunk(self, work_id, collection, store):
+        objects = store.values()
+        store.clear()
+
+        self.helper.connector_logger.info(
+            "Sending bundle chunk",
+            {"collection": collection, "objects": len(objects)},
+        )
+
+        bundle = stix2.Bundle(objects=objects, allow_custom=True)
+        self.helper.send_stix2_bundle(
+            bundle.serialize(),
+            update=self.update_existing_data,
+            work_id=work_id,
+        )
+
+        return len(objects)
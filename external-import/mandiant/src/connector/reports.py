@@ -6,6 +6,7 @@ from pycti import Note
 
 from . import utils
 from .common import create_stix_relationship
+from .store import ObjectStore
 
 
 def process(connector, report):
@@ -83,6 +84,13 @@ class Report:
         self.report_type = connector.mandiant_report_types[report_type]
         self.report_link = report_link
         self.create_notes = connector.mandiant_create_notes
+        self.objects = ObjectStore()
+        self._index_objects()
+
+    def _index_objects(self):
+        self.objects.clear()
+        self.objects.add_all(self.bundle["objects"])
+        self.report = utils.retrieve(self.bundle, "type", "report")
 
     def generate(self):
         self.save_files()
@@ -97,7 +105,7 @@ class Report:
         return stix2.parse(self.bundle, allow_custom=True)
 
     def save_files(self):
-        report = utils.retrieve(self.bundle, "type", "report")
+        report = self.report
         report["x_opencti_files"] = list()
 
         # FIXME: did not manage to import with .json extension
@@ -150,7 +158,7 @@ class Report:
         #     )
 
     def update_vulnerability(self):
-        report = utils.retrieve(self.bundle, "type", "report")
+        report = self.report
 
         risk_rating = None
         if (
@@ -159,7 +167,7 @@ class Report:
         ):
             risk_rating = report["x_mandiant_com_medata"]["risk_rating"]
 
-        for vulnerability in utils.retrieve_all(self.bundle, "type", "vulnerability"):
+        for vulnerability in self.objects.get_all("vulnerability"):
             for score_item in vulnerability["x_mandiant_com_vulnerability_score"]:
                 if "cvss_version" in score_item.keys():
                     base_score = score_item["base_metrics"]["base_score"]
@@ -170,7 +178,7 @@ class Report:
                 vulnerability["x_opencti_base_severity"] = risk_rating
 
     def update_report(self):
-        report = utils.retrieve(self.bundle, "type", "report")
+        report = self.report
         report["confidence"] = self.confidence
         report["created_by_ref"] = self.identity["standard_id"]
         report["report_types"] = [self.report_type]
@@ -188,7 +196,7 @@ class Report:
 
     def create_note(self):
         # Report Analysis Note
-        report = utils.retrieve(self.bundle, "type", "report")
+        report = self.report
 
         if "x_mandiant_com_tracking_info" in report:
             del report["x_mandiant_com_tracking_info"]
@@ -270,15 +278,16 @@ class Report:
         )
 
         self.bundle["objects"].append(note)
+        self.objects.add(note)
 
     # TODO: dont know about this, it come from original code
     def update_identities(self):
-        for identity in utils.retrieve_all(self.bundle, "type", "identity"):
+        for identity in self.objects.get_all("identity"):
             if identity.get("identity_class") != "organization":
                 identity.update({"identity_class": "class"})
 
     def update_country(self):
-        for location in utils.retrieve_all(self.bundle, "type", "location"):
+        for location in self.objects.get_all("location"):
             location.update({"x_opencti_location_type": "Country"})
             if "country" not in location and "name" in location:
                 location.update({"country": location["name"]})
@@ -286,11 +295,11 @@ class Report:
                 location.update({"country": "Unknown"})
 
     def convert_threat_actor_to_intrusion_set(self):
-        for item in utils.retrieve_all(self.bundle, "type", "threat-actor"):
+        for item in self.objects.get_all("threat-actor"):
             item["type"] = "intrusion-set"
             item["id"] = item.get("id").replace("threat-actor", "intrusion-set")
 
-        for rel in utils.retrieve_all(self.bundle, "type", "relationship"):
+        for rel in self.objects.get_all("relationship"):
             rel["source_ref"] = rel.get("source_ref").replace(
                 "threat-actor", "intrusion-set"
             )
@@ -305,38 +314,35 @@ class Report:
             ):
                 rel["relationship_type"] = "originates-from"
 
-        report = utils.retrieve(self.bundle, "type", "report")
+        report = self.report
         report["object_refs"] = [
             reference.replace("threat-actor", "intrusion-set")
             for reference in report.get("object_refs", [])
         ]
 
-    def _get_objects_from_tags(self, section):
+        # Ids and types have changed, rebuild the index
+        self._index_objects()
+
+    def _get_objects_from_tags(self, section, objects_by_name):
         tags = self.details.get("tags", {}).get(section, [])
         for tag in tags:
-            for item in self.bundle.get("objects"):
-                if tag == item.get("name"):
-                    yield item
+            yield from objects_by_name.get(tag, [])
 
     def create_relationships(self):
         # Get related objects
-        identities = list(utils.retrieve_all(self.bundle, "type", "identity"))
-        malwares = list(utils.retrieve_all(self.bundle, "type", "malware"))
-        intrusion_sets = list(utils.retrieve_all(self.bundle, "type", "intrusion-set"))
-        vulnerabilities = list(utils.retrieve_all(self.bundle, "type", "vulnerability"))
-        softwares = list(utils.retrieve_all(self.bundle, "type", "software"))
-        course_actions = list(
-            utils.retrieve_all(self.bundle, "type", "course-of-action")
-        )
-        attack_patterns = list(
-            utils.retrieve_all(self.bundle, "type", "attack-pattern")
-        )
-        indicators = list(utils.retrieve_all(self.bundle, "type", "indicator"))
-        ipv4_addresses = list(utils.retrieve_all(self.bundle, "type", "ipv4-addr"))
-        ipv6_addresses = list(utils.retrieve_all(self.bundle, "type", "ipv6-addr"))
-        domain_names = list(utils.retrieve_all(self.bundle, "type", "domain-name"))
-        urls = list(utils.retrieve_all(self.bundle, "type", "url"))
-        files = list(utils.retrieve_all(self.bundle, "type", "file"))
+        identities = self.objects.get_all("identity")
+        malwares = self.objects.get_all("malware")
+        intrusion_sets = self.objects.get_all("intrusion-set")
+        vulnerabilities = self.objects.get_all("vulnerability")
+        softwares = self.objects.get_all("software")
+        course_actions = self.objects.get_all("course-of-action")
+        attack_patterns = self.objects.get_all("attack-pattern")
+        indicators = self.objects.get_all("indicator")
+        ipv4_addresses = self.objects.get_all("ipv4-addr")
+        ipv6_addresses = self.objects.get_all("ipv6-addr")
+        domain_names = self.objects.get_all("domain-name")
+        urls = self.objects.get_all("url")
+        files = self.objects.get_all("file")
 
         scos = ipv4_addresses + ipv6_addresses + domain_names + urls + files
 
@@ -345,10 +351,23 @@ class Report:
         ]
 
         # Get objects from tags
-        source_geographies = list(self._get_objects_from_tags("source_geographies"))
-        target_geographies = list(self._get_objects_from_tags("target_geographies"))
-        affected_industries = list(self._get_objects_from_tags("affected_industries"))
-        affected_systems = list(self._get_objects_from_tags("affected_systems"))
+        objects_by_name = {}
+        for item in self.bundle.get("objects"):
+            if item.get("name") is not None:
+                objects_by_name.setdefault(item["name"], []).append(item)
+
+        source_geographies = list(
+            self._get_objects_from_tags("source_geographies", objects_by_name)
+        )
+        target_geographies = list(
+            self._get_objects_from_tags("target_geographies", objects_by_name)
+        )
+        affected_industries = list(
+            self._get_objects_from_tags("affected_industries", objects_by_name)
+        )
+        affected_systems = list(
+            self._get_objects_from_tags("affected_systems", objects_by_name)
+        )
         # NOT NEEEDED malware_families = list(self._get_objects_from_tags("malware_families"))
         # NOT NEEEDED actors = list(self._get_objects_from_tags("actors"))
         # motivations = list(self._get_objects_from_tags("motivations"))
@@ -478,8 +497,7 @@ class Report:
                 relationships.append(relationship)
                 relationships_ids.append(relationship.id)
 
-        report = utils.retrieve(self.bundle, "type", "report")
-        report["object_refs"] += relationships_ids
+        self.report["object_refs"] += relationships_ids
         self.bundle["objects"] += relationships
 
 
@@ -0,0 +1,44 @@
+class ObjectStore:
+    """
+    Per-run STIX objects store indexed by id and by type.
+
+    Objects sharing the same id are deduplicated in place, the last added
+    object wins while keeping the position of the first one (same behaviour
+    as building a dict from the objects list).
+    """
+
+    def __init__(self):
+        self._objects = {}
+        self._objects_by_type = {}
+
+    def __len__(self):
+        return len(self._objects)
+
+    def __contains__(self, object_id):
+        return object_id in self._objects
+
+    def add(self, item):
+        item_id = item["id"]
+        previous = self._objects.get(item_id)
+        if previous is not None and previous["type"] != item["type"]:
+            self._objects_by_type[previous["type"]].pop(item_id, None)
+
+        self._objects[item_id] = item
+        self._objects_by_type.setdefault(item["type"], {})[item_id] = item
+
+    def add_all(self, items):
+        for item in items:
+            self.add(item)
+
+    def get(self, object_id, default=None):
+        return self._objects.get(object_id, default)
+
+    def get_all(self, object_type):
+        return list(self._objects_by_type.get(object_type, {}).values())
+
+    def values(self):
+        return list(self._objects.values())
+
+    def clear(self):
+        self._objects.clear()
+        self._objects_by_type.clear()
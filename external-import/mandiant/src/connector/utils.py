@@ -1,5 +1,7 @@
 import json
 import re
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 
 import stix2
@@ -108,6 +110,22 @@ def retrieve_all(bundle, key, value):
             yield item
 
 
+def bounded_map(func, items, max_workers):
+    """
+    Ordered map over a thread pool, at most 2 * max_workers items are pending
+    so results waiting to be consumed stay bounded.
+    """
+    max_pending = max(max_workers, 1) * 2
+    with ThreadPoolExecutor(max_workers=max(max_workers, 1)) as executor:
+        pending = deque()
+        for item in items:
+            pending.append(executor.submit(func, item))
+            if len(pending) >= max_pending:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
 ATTRIBUTION_SCOPES = {
     "confirmed": 100,
     "suspected": 75,
@@ -4,7 +4,10 @@
 import datetime
 import json
 import os
+import sqlite3
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 import yaml
@@ -36,6 +39,111 @@ def date_convert(name):
     return datetime.datetime.strptime(name, "%Y%m%dT%H%M%SZ")
 
 
+def date_format(date):
+    return date.strftime("%Y%m%dT%H%M%SZ")
+
+
+def reference_levels(objects):
+    # Depth of an object is 0 if it references nothing inside the objects,
+    # else 1 + the depth of its deepest referenced object. Objects of the
+    # same level are independent and can be created concurrently.
+    by_id = {data["id"]: data for data in objects}
+    depths = {}
+    for data in objects:
+        if data["id"] in depths:
+            continue
+        visiting = set()
+        stack = [data["id"]]
+        while len(stack) > 0:
+            current = stack[-1]
+            visiting.add(current)
+            refs = [
+                ref
+                for ref in ref_extractors([by_id[current]])
+                if ref in by_id and ref != current
+            ]
+            pending = [ref for ref in refs if ref not in depths and ref not in visiting]
+            if len(pending) > 0:
+                stack.extend(pending)
+                continue
+            stack.pop()
+            visiting.discard(current)
+            # References still being visited are cycles, ignore them
+            depths[current] = 1 + max(
+                (depths[ref] for ref in refs if ref in depths), default=-1
+            )
+    levels = {}
+    for data in objects:
+        levels.setdefault(depths[data["id"]], []).append(data)
+    return [levels[depth] for depth in sorted(levels)]
+
+
+def chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i : i + size]
+
+
+class BackupIndex:
+    """
+    Persistent entity id -> (directory, file) index of the backup.
+
+    Built in one pass over the backup tree and stored in SQLite next to the
+    backup, directories already indexed are skipped on the next start.
+    Directory names are sortable timestamps, so they are compared as strings.
+    """
+
+    def __init__(self, index_path):
+        self.connection = sqlite3.connect(index_path)
+        self.connection.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS entities (
+                id TEXT NOT NULL,
+                directory TEXT NOT NULL,
+                file TEXT NOT NULL,
+                PRIMARY KEY (id, directory)
+            );
+            CREATE TABLE IF NOT EXISTS directories (name TEXT PRIMARY KEY);
+            """
+        )
+
+    def update(self, path, helper):
+        indexed = {
+            row[0] for row in self.connection.execute("SELECT name FROM directories")
+        }
+        dirs = sorted(
+            (entry for entry in os.scandir(path) if entry.is_dir()),
+            key=lambda d: date_convert(d.name),
+        )
+        for position, entry in enumerate(dirs):
+            # The last directory can still be written by the backup
+            is_last = position == len(dirs) - 1
+            if entry.name in indexed and not is_last:
+                continue
+            rows = (
+                (file.name[: -len(".json")], entry.name, file.name)
+                for file in os.scandir(entry)
+                if file.is_file() and file.name.endswith(".json")
+            )
+            with self.connection:
+                self.connection.executemany(
+                    "INSERT OR REPLACE INTO entities VALUES (?, ?, ?)", rows
+                )
+                self.connection.execute(
+                    "INSERT OR IGNORE INTO directories VALUES (?)", (entry.name,)
+                )
+            helper.log_info("Indexed restore directory " + entry.name)
+
+    def find_from(self, id, dir_date):
+        return self.connection.execute(
+            "SELECT directory, file FROM entities "
+            "WHERE id = ? AND directory >= ? ORDER BY directory LIMIT 1",
+            (id, date_format(dir_date)),
+        ).fetchone()
+
+    def close(self):
+        self.connection.close()
+
+
 class RestoreFilesConnector:
     def __init__(self, conf_data):
         config_file_path = os.path.dirname(os.path.abspath(__file__)) + "/config.yml"
@@ -58,30 +166,51 @@ class RestoreFilesConnector:
         self.backup_path = get_config_variable(
             "BACKUP_PATH", ["backup", "path"], config
         )
+        self.chunk_size = get_config_variable(
+            "BACKUP_CHUNK_SIZE",
+            ["backup", "chunk_size"],
+            config,
+            isNumber=True,
+            default=5000,
+        )
+        self.workers = get_config_variable(
+            "BACKUP_WORKERS",
+            ["backup", "workers"],
+            config,
+            isNumber=True,
+            default=4,
+        )
+        self.index = None
+        self.executor = None
+        self.dirs_done = 0
 
     def find_element(self, dir_date, id):
-        name = id + ".json"
-        path = self.backup_path + "/opencti_data"
-        for root, dirs, files in os.walk(path):
-            if name in files:
-                # If find dir is before, no need to process the element as missing
-                path = os.path.basename(root)
-                if date_convert(path) > dir_date:
-                    return fetch_stix_data(os.path.join(root, name))[0]
-        return None
-
-    def resolve_missing(self, dir_date, element_ids, data, acc=[]):
-        refs = ref_extractors([data])
-        for ref in refs:
-            if ref not in element_ids:
-                not_in = next((x for x in acc if x["id"] == ref), None)
-                if not_in is None:
-                    missing_element = self.find_element(dir_date, ref)
-                    if missing_element is not None:
-                        acc.insert(0, missing_element)
-                        self.resolve_missing(
-                            dir_date, element_ids, missing_element, acc
-                        )
+        # If only found in a dir before, no need to process the element as missing.
+        # Found in the current dir, the element is in a chunk not sent yet.
+        location = self.index.find_from(id, dir_date)
+        if location is None:
+            return None
+        directory, file = location
+        path = os.path.join(self.backup_path, "opencti_data", directory, file)
+        return fetch_stix_data(path)[0]
+
+    def resolve_missing(self, dir_date, objects, known_ids):
+        # Elements are appended after the element referencing them, the
+        # reversed list has the dependencies first
+        acc = []
+        stack = list(objects)
+        while len(stack) > 0:
+            data = stack.pop()
+            for ref in ref_extractors([data]):
+                if ref in known_ids:
+                    continue
+                known_ids.add(ref)
+                missing_element = self.find_element(dir_date, ref)
+                if missing_element is not None:
+                    acc.append(missing_element)
+                    stack.append(missing_element)
+        acc.reverse()
+        return acc
 
     def restore_files(self):
         stix2_splitter = OpenCTIStix2Splitter()
@@ -94,77 +223,124 @@ class RestoreFilesConnector:
         )
         path = self.backup_path + "/opencti_data"
         dirs = sorted(Path(path).iterdir(), key=lambda d: date_convert(d.name))
+        if start_date is not None:
+            dirs = [d for d in dirs if date_convert(d.name) > start_date]
+        run_start = time.monotonic()
+        restored_objects = 0
+        self.dirs_done = 0
         for entry in dirs:
             friendly_name = "Restore run directory @ " + entry.name
             self.helper.log_info(friendly_name)
             dir_date = date_convert(entry.name)
-            if start_date is not None and dir_date <= start_date:
-                continue
-            # 00 - Create a bundle for the directory
-            files_data = []
-            element_ids = []
-            # 01 - build all _ref / _refs contained in the bundle
-            element_refs = []
-            for file in os.scandir(entry):
-                if file.is_file():
-                    objects = fetch_stix_data(file)
-                    object_ids = set(map(lambda x: x["id"], objects))
-                    element_refs.extend(ref_extractors(objects))
-                    files_data.extend(objects)
-                    element_ids.extend(object_ids)
-            # Ensure the bundle is consistent (include meta elements)
-            # 02 - Scan bundle to detect missing elements
-            acc = []
-            ids = set(element_ids)
-            refs = set(element_refs)
-            for ref in refs:
-                if ref not in ids:
-                    # 03 - If missing, scan the other dir/files to find the elements
-                    missing_element = self.find_element(dir_date, ref)
-                    if missing_element is not None:
-                        acc.insert(0, missing_element)
-                        # 04 - Restart the process to handle recursive resolution
-                        self.resolve_missing(dir_date, ids, missing_element, acc)
-            # 05 - Add elements to the bundle
-            objects_with_missing = acc + files_data
-            if len(objects_with_missing) > 0:
+            # 00 - Files of the directory (named by element id)
+            files = sorted(
+                (file for file in os.scandir(entry) if file.is_file()),
+                key=lambda f: f.name,
+            )
+            # Ids of the directory elements already sent, or pulled forward as
+            # a dependency of a previous chunk
+            sent_ids = set()
+            work_id = None
+            dir_start = time.monotonic()
+            dir_objects = 0
+            for files_chunk in chunks(files, self.chunk_size):
+                # 01 - Read and parse a bounded chunk of the directory
+                files_data = []
+                for objects in self.executor.map(fetch_stix_data, files_chunk):
+                    files_data.extend(
+                        data for data in objects if data["id"] not in sent_ids
+                    )
+                sent_ids.update(map(lambda x: x["id"], files_data))
+                # Ensure the bundle is consistent (include meta elements)
+                # 02 - Scan the chunk to detect missing elements
+                # 03 - If missing, find the elements in the backup index
+                # 04 - Resolve recursively the missing elements references
+                acc = self.resolve_missing(dir_date, files_data, sent_ids)
+                # 05 - Add elements to the bundle
+                objects_with_missing = acc + files_data
+                if len(objects_with_missing) == 0:
+                    continue
                 # Create the work
-                work_id = self.helper.api.work.initiate_work(
-                    self.helper.connect_id, friendly_name
-                )
-                # 06 - Send the bundle to the worker queue
-                stix_bundle = {
-                    "type": "bundle",
-                    "objects": objects_with_missing,
-                }
-                if self.direct_creation:
-                    # Bundle must be split for reordering
-                    bundles = stix2_splitter.split_bundle(stix_bundle, False)
-                    self.helper.log_info(
-                        "restore dir "
-                        + entry.name
-                        + " with "
-                        + str(len(bundles))
-                        + " bundles (direct creation)"
+                if work_id is None:
+                    work_id = self.helper.api.work.initiate_work(
+                        self.helper.connect_id, friendly_name
                     )
-                    for bundle in bundles:
-                        self.helper.api.stix2.import_bundle_from_json(
-                            json.dumps(bundle), True
+                # 06 - Send the bundle by reference level, a level only
+                # starts once the levels it depends on are sent
+                levels = reference_levels(objects_with_missing)
+                for depth, level_objects in enumerate(levels):
+                    stix_bundle = {
+                        "type": "bundle",
+                        "objects": level_objects,
+                    }
+                    if self.direct_creation:
+                        # Independent objects of the level are created concurrently
+                        bundles = stix2_splitter.split_bundle(stix_bundle, False)
+                        self.helper.log_info(
+                            "restore dir "
+                            + entry.name
+                            + " level "
+                            + str(depth + 1)
+                            + "/"
+                            + str(len(levels))
+                            + " with "
+                            + str(len(bundles))
+                            + " bundles (direct creation)"
                         )
-                    # 06 - Save the state
-                    self.helper.set_state({"current": entry.name})
-                else:
-                    self.helper.log_info("restore dir (worker bundles):" + entry.name)
-                    self.helper.send_stix2_bundle(
-                        json.dumps(stix_bundle), work_id=work_id
-                    )
+                        list(self.executor.map(self.import_bundle, bundles))
+                    else:
+                        self.helper.log_info(
+                            "restore dir (worker bundles):"
+                            + entry.name
+                            + " level "
+                            + str(depth + 1)
+                            + "/"
+                            + str(len(levels))
+                        )
+                        self.helper.send_stix2_bundle(
+                            json.dumps(stix_bundle), work_id=work_id
+                        )
+                dir_objects += len(objects_with_missing)
+            if work_id is not None:
+                if not self.direct_creation:
                     message = "Restore dir run, storing last_run as {0}".format(
                         entry.name
                     )
                     self.helper.api.work.to_processed(work_id, message)
-                    # 06 - Save the state
-                    self.helper.set_state({"current": entry.name})
-        self.helper.log_info("restore run completed")
+                # 07 - Save the state
+                self.helper.set_state({"current": entry.name})
+            restored_objects += dir_objects
+            self.log_progress(
+                entry.name, dir_objects, time.monotonic() - dir_start, len(dirs)
+            )
+        self.helper.log_info(
+            "restore run completed, "
+            + str(restored_objects)
+            + " objects ("
+            + self.rate(restored_objects, time.monotonic() - run_start)
+            + ")"
+        )
+
+    def import_bundle(self, bundle):
+        self.helper.api.stix2.import_bundle_from_json(json.dumps(bundle), True)
+
+    @staticmethod
+    def rate(count, elapsed):
+        return "{:.1f} objects/sec".format(count / elapsed if elapsed > 0 else 0)
+
+    def log_progress(self, name, count, elapsed, total_dirs):
+        self.dirs_done += 1
+        self.helper.log_info(
+            "restore dir "
+            + name
+            + " completed, "
+            + str(count)
+            + " objects ("
+            + self.rate(count, elapsed)
+            + "), queue depth "
+            + str(total_dirs - self.dirs_done)
+            + " directories"
+        )
 
     def start(self):
         # Check if the directory exists
@@ -172,7 +348,15 @@ class RestoreFilesConnector:
             raise ValueError(
                 "Backup path does not exist - " + self.backup_path + "/opencti_data"
             )
-        self.restore_files()
+        # Index the backup once, missing references are then simple lookups
+        self.index = BackupIndex(os.path.join(self.backup_path, "opencti_index.db"))
+        self.executor = ThreadPoolExecutor(max_workers=self.workers)
+        try:
+            self.index.update(self.backup_path + "/opencti_data", self.helper)
+            self.restore_files()
+        finally:
+            self.executor.shutdown()
+            self.index.close()
 
 
 if __name__ == "__main__":
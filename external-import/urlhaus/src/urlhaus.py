@@ -1,5 +1,7 @@
 import csv
 import datetime
+import gzip
+import io
 import os
 import ssl
 import sys
@@ -17,6 +19,8 @@ from pycti import (
     get_config_variable,
 )
 
+THREAT_CACHE_TTL = 7 * 24 * 60 * 60
+
 
 class URLhaus:
     def __init__(self):
@@ -45,6 +49,13 @@ class URLhaus:
             False,
             True,
         )
+        self.bundle_size = get_config_variable(
+            "URLHAUS_BUNDLE_SIZE",
+            ["urlhaus", "bundle_size"],
+            config,
+            isNumber=True,
+            default=10000,
+        )
         self.update_existing_data = get_config_variable(
             "CONNECTOR_UPDATE_EXISTING_DATA",
             ["connector", "update_existing_data"],
@@ -62,6 +73,202 @@ class URLhaus:
     def next_run(self, seconds):
         return
 
+    @staticmethod
+    def parse_date(value):
+        # The feed uses a fixed "%Y-%m-%d %H:%M:%S" (UTC) format, the generic
+        # parser is only used if it ever changes
+        try:
+            date = datetime.datetime.fromisoformat(value)
+        except ValueError:
+            date = parse(value)
+        if date.tzinfo is None:
+            date = date.replace(tzinfo=datetime.timezone.utc)
+        return date
+
+    def open_csv(self):
+        """Open the HTTP response of the CSV, to be closed by the caller."""
+        return urllib.request.urlopen(
+            self.urlhaus_csv_url,
+            context=ssl.create_default_context(),
+        )
+
+    @staticmethod
+    def read_csv(response):
+        """Stream the CSV rows from the HTTP response, gzipped or not."""
+        stream = io.BufferedReader(response)
+        if stream.peek(2)[:2] == b"\x1f\x8b":
+            stream = gzip.GzipFile(fileobj=stream)
+        lines = io.TextIOWrapper(stream, encoding="utf-8", newline="")
+        ## the csv-file hast the following columns
+        # id,dateadded,url,url_status,last_online,threat,tags,urlhaus_link,reporter
+        return csv.reader(line for line in lines if not line.startswith("#"))
+
+    def load_threat_cache(self, current_state):
+        # Threats found by a previous run, expired after a week to pick up
+        # merged or deleted entities
+        threat_cache = {}
+        if current_state is not None and "threat_cache" in current_state:
+            min_fetched_at = time.time() - THREAT_CACHE_TTL
+            for label, (standard_id, fetched_at) in current_state[
+                "threat_cache"
+            ].items():
+                if fetched_at > min_fetched_at:
+                    threat_cache[label] = (standard_id, fetched_at)
+        return threat_cache
+
+    def get_threat(self, label, threat_cache, missing_labels):
+        """Return the standard id of the threat named as the label, if any."""
+        if label in threat_cache:
+            return threat_cache[label][0]
+        if label in missing_labels:
+            return None
+        custom_attributes = """
+            id
+            standard_id
+            entity_type
+        """
+        entities = self.helper.api.stix_domain_object.list(
+            types=[
+                "Threat-Actor",
+                "Intrusion-Set",
+                "Malware",
+                "Campaign",
+                "Incident",
+                "Tool",
+            ],
+            filters={
+                "mode": "and",
+                "filters": [{"key": "name", "values": [label]}],
+                "filterGroups": [],
+            },
+            customAttributes=custom_attributes,
+        )
+        if len(entities) == 0:
+            missing_labels.add(label)
+            return None
+        threat_cache[label] = (entities[0]["standard_id"], time.time())
+        return entities[0]["standard_id"]
+
+    def process_row(self, row, entry_date, threat_cache, missing_labels):
+        """Return the STIX objects of a CSV row."""
+        bundle_objects = []
+        external_reference = stix2.ExternalReference(
+            source_name="Abuse.ch URLhaus",
+            url=row[7],
+            description="URLhaus repository URL",
+        )
+        pattern = "[url:value = '" + row[2] + "']"
+        stix_indicator = stix2.Indicator(
+            id=Indicator.generate_id(pattern),
+            name=row[2],
+            description="Threat: "
+            + row[5]
+            + " - Reporter: "
+            + row[8]
+            + " - Status: "
+            + row[3],
+            created_by_ref=self.identity["standard_id"],
+            confidence=self.helper.connect_confidence_level,
+            pattern_type="stix",
+            valid_from=entry_date,
+            created=entry_date,
+            pattern=pattern,
+            external_references=[external_reference],
+            object_marking_refs=[stix2.TLP_WHITE],
+            custom_properties={
+                "x_opencti_score": 80,
+                "x_opencti_main_observable_type": "Url",
+            },
+        )
+        stix_observable = stix2.URL(
+            value=row[2],
+            object_marking_refs=[stix2.TLP_WHITE],
+            custom_properties={
+                "description": "Threat: "
+                + row[5]
+                + " - Reporter: "
+                + row[8]
+                + " - Status: "
+                + row[3],
+                "x_opencti_score": 80,
+                "labels": [x for x in row[6].split(",") if x],
+                "created_by_ref": self.identity["standard_id"],
+                "external_references": [external_reference],
+            },
+        )
+        stix_relationship = stix2.Relationship(
+            id=StixCoreRelationship.generate_id(
+                "based-on",
+                stix_indicator.id,
+                stix_observable.id,
+            ),
+            relationship_type="based-on",
+            source_ref=stix_indicator.id,
+            target_ref=stix_observable.id,
+            object_marking_refs=[stix2.TLP_WHITE],
+        )
+        bundle_objects.append(stix_indicator)
+        bundle_objects.append(stix_observable)
+        bundle_objects.append(stix_relationship)
+        if self.threats_from_labels:
+            for label in row[6].split(","):
+                if not label:
+                    continue
+                threat_id = self.get_threat(label, threat_cache, missing_labels)
+                if threat_id is None:
+                    continue
+                stix_threat_relation_indicator = stix2.Relationship(
+                    id=StixCoreRelationship.generate_id(
+                        "indicates",
+                        stix_indicator.id,
+                        threat_id,
+                        entry_date,
+                        entry_date,
+                    ),
+                    source_ref=stix_indicator.id,
+                    target_ref=threat_id,
+                    relationship_type="indicates",
+                    start_time=entry_date,
+                    stop_time=entry_date + datetime.timedelta(0, 3),
+                    confidence=self.helper.connect_confidence_level,
+                    created_by_ref=self.identity["standard_id"],
+                    object_marking_refs=[stix2.TLP_WHITE],
+                    created=entry_date,
+                    modified=entry_date,
+                    allow_custom=True,
+                )
+                stix_threat_relation_observable = stix2.Relationship(
+                    id=StixCoreRelationship.generate_id(
+                        "related-to",
+                        stix_observable.id,
+                        threat_id,
+                        entry_date,
+                        entry_date,
+                    ),
+                    source_ref=stix_observable.id,
+                    target_ref=threat_id,
+                    relationship_type="related-to",
+                    start_time=entry_date,
+                    stop_time=entry_date + datetime.timedelta(0, 3),
+                    confidence=self.helper.connect_confidence_level,
+                    created_by_ref=self.identity["standard_id"],
+                    object_marking_refs=[stix2.TLP_WHITE],
+                    created=entry_date,
+                    modified=entry_date,
+                    allow_custom=True,
+                )
+                bundle_objects.append(stix_threat_relation_indicator)
+                bundle_objects.append(stix_threat_relation_observable)
+        return bundle_objects
+
+    def send_bundle(self, bundle_objects, work_id):
+        bundle = stix2.Bundle(objects=bundle_objects, allow_custom=True).serialize()
+        self.helper.send_stix2_bundle(
+            bundle,
+            update=self.update_existing_data,
+            work_id=work_id,
+        )
+
     def run(self):
         self.helper.log_info("Fetching URLhaus dataset...")
         while True:
@@ -86,230 +293,74 @@ class URLhaus:
                 self.helper.log_info("Connector will run!")
                 now = datetime.datetime.utcfromtimestamp(timestamp)
                 friendly_name = "URLhaus run @ " + now.strftime("%Y-%m-%d %H:%M:%S")
-                work_id = self.helper.api.work.initiate_work(
-                    self.helper.connect_id, friendly_name
-                )
-
-                # initialize the threat cache with each run
-                if self.threats_from_labels:
-                    treat_cache = {}
 
                 try:
-                    response = urllib.request.urlopen(
-                        self.urlhaus_csv_url,
-                        context=ssl.create_default_context(),
-                    )
+                    response = self.open_csv()
                 except urllib.error.HTTPError:
                     # we only accept HTTPError
                     self.helper.log_error(traceback.format_exc())
                     time.sleep(60)
                     continue
 
-                image = response.read()
-                with open(
-                    os.path.dirname(os.path.abspath(__file__)) + "/data.csv",
-                    "wb",
-                ) as file:
-                    file.write(image)
-                fp = open(
-                    os.path.dirname(os.path.abspath(__file__)) + "/data.csv",
-                    "r",
-                )
-                rdr = csv.reader(filter(lambda row: row[0] != "#", fp))
-                bundle_objects = []
-                ## the csv-file hast the following columns
-                # id,dateadded,url,url_status,last_online,threat,tags,urlhaus_link,reporter
-
-                if (
-                    current_state is not None
-                    and "last_processed_entry" in current_state
-                ):
-                    last_processed_entry = current_state[
-                        "last_processed_entry"
-                    ]  # epoch time format
-                else:
-                    self.helper.log_info(
-                        "'last_processed_entry' state not found, setting it to epoch start."
+                # the response is also closed when the run stops early
+                with response:
+                    work_id = self.helper.api.work.initiate_work(
+                        self.helper.connect_id, friendly_name
                     )
-                    last_processed_entry = 0  # start of the epoch
-
-                last_processed_entry_running_max = last_processed_entry
 
-                for i, row in enumerate(rdr):
-                    entry_date = parse(row[1])
+                    # the threat cache is kept across runs, the missing threats
+                    # are only remembered during the run
+                    threat_cache = self.load_threat_cache(current_state)
+                    missing_labels = set()
 
-                    if i % 5000 == 0:
+                    if (
+                        current_state is not None
+                        and "last_processed_entry" in current_state
+                    ):
+                        last_processed_entry = current_state[
+                            "last_processed_entry"
+                        ]  # epoch time format
+                    else:
                         self.helper.log_info(
-                            f"Process entry {i} with dateadded='{entry_date.strftime('%Y-%m-%d %H:%M:%S')}'"
+                            "'last_processed_entry' state not found, setting it to epoch start."
                         )
+                        last_processed_entry = 0  # start of the epoch
 
-                    # skip entry if newer events already processed in the past
-                    if last_processed_entry > entry_date.timestamp():
-                        continue
-                    last_processed_entry_running_max = max(
-                        entry_date.timestamp(), last_processed_entry_running_max
-                    )
+                    last_processed_entry_running_max = last_processed_entry
 
-                    if row[3] == "online" or self.urlhaus_import_offline:
-                        external_reference = stix2.ExternalReference(
-                            source_name="Abuse.ch URLhaus",
-                            url=row[7],
-                            description="URLhaus repository URL",
-                        )
-                        pattern = "[url:value = '" + row[2] + "']"
-                        stix_indicator = stix2.Indicator(
-                            id=Indicator.generate_id(pattern),
-                            name=row[2],
-                            description="Threat: "
-                            + row[5]
-                            + " - Reporter: "
-                            + row[8]
-                            + " - Status: "
-                            + row[3],
-                            created_by_ref=self.identity["standard_id"],
-                            confidence=self.helper.connect_confidence_level,
-                            pattern_type="stix",
-                            valid_from=entry_date,
-                            created=entry_date,
-                            pattern=pattern,
-                            external_references=[external_reference],
-                            object_marking_refs=[stix2.TLP_WHITE],
-                            custom_properties={
-                                "x_opencti_score": 80,
-                                "x_opencti_main_observable_type": "Url",
-                            },
-                        )
-                        stix_observable = stix2.URL(
-                            value=row[2],
-                            object_marking_refs=[stix2.TLP_WHITE],
-                            custom_properties={
-                                "description": "Threat: "
-                                + row[5]
-                                + " - Reporter: "
-                                + row[8]
-                                + " - Status: "
-                                + row[3],
-                                "x_opencti_score": 80,
-                                "labels": [x for x in row[6].split(",") if x],
-                                "created_by_ref": self.identity["standard_id"],
-                                "external_references": [external_reference],
-                            },
-                        )
-                        stix_relationship = stix2.Relationship(
-                            id=StixCoreRelationship.generate_id(
-                                "based-on",
-                                stix_indicator.id,
-                                stix_observable.id,
-                            ),
-                            relationship_type="based-on",
-                            source_ref=stix_indicator.id,
-                            target_ref=stix_observable.id,
-                            object_marking_refs=[stix2.TLP_WHITE],
+                    rdr = self.read_csv(response)
+                    bundle_objects = []
+                    for i, row in enumerate(rdr):
+                        entry_date = self.parse_date(row[1])
+                        entry_timestamp = entry_date.timestamp()
+
+                        if i % 5000 == 0:
+                            self.helper.log_info(
+                                f"Process entry {i} with dateadded='{entry_date.strftime('%Y-%m-%d %H:%M:%S')}'"
+                            )
+
+                        # the feed is sorted from the newest entry, the remaining
+                        # entries have already been processed in the past
+                        if last_processed_entry > entry_timestamp:
+                            self.helper.log_info(
+                                f"Entry {i} already processed, stopping the run."
+                            )
+                            break
+                        last_processed_entry_running_max = max(
+                            entry_timestamp, last_processed_entry_running_max
                         )
-                        bundle_objects.append(stix_indicator)
-                        bundle_objects.append(stix_observable)
-                        bundle_objects.append(stix_relationship)
-                        if self.threats_from_labels:
-                            for label in row[6].split(","):
-                                if label and label is not None:
-                                    # implementing a primitive caching
-                                    threat = None
-                                    try:
-                                        threat = treat_cache[label]
-                                    except KeyError:
-                                        custom_attributes = """
-                                            id
-                                            standard_id
-                                            entity_type
-                                        """
-                                        entities = (
-                                            self.helper.api.stix_domain_object.list(
-                                                types=[
-                                                    "Threat-Actor",
-                                                    "Intrusion-Set",
-                                                    "Malware",
-                                                    "Campaign",
-                                                    "Incident",
-                                                    "Tool",
-                                                ],
-                                                filters={
-                                                    "mode": "and",
-                                                    "filters": [
-                                                        {
-                                                            "key": "name",
-                                                            "values": [label],
-                                                        }
-                                                    ],
-                                                    "filterGroups": [],
-                                                },
-                                                customAttributes=custom_attributes,
-                                            )
-                                        )
-                                        if len(entities) > 0:
-                                            threat = entities[0]
-                                            treat_cache[label] = threat
-                                    if threat is not None:
-                                        stix_threat_relation_indicator = stix2.Relationship(
-                                            id=StixCoreRelationship.generate_id(
-                                                "indicates",
-                                                stix_indicator.id,
-                                                threat["standard_id"],
-                                                entry_date,
-                                                entry_date,
-                                            ),
-                                            source_ref=stix_indicator.id,
-                                            target_ref=threat["standard_id"],
-                                            relationship_type="indicates",
-                                            start_time=entry_date,
-                                            stop_time=entry_date
-                                            + datetime.timedelta(0, 3),
-                                            confidence=self.helper.connect_confidence_level,
-                                            created_by_ref=self.identity["standard_id"],
-                                            object_marking_refs=[stix2.TLP_WHITE],
-                                            created=entry_date,
-                                            modified=entry_date,
-                                            allow_custom=True,
-                                        )
-                                        stix_threat_relation_observable = stix2.Relationship(
-                                            id=StixCoreRelationship.generate_id(
-                                                "related-to",
-                                                stix_observable.id,
-                                                threat["standard_id"],
-                                                entry_date,
-                                                entry_date,
-                                            ),
-                                            source_ref=stix_observable.id,
-                                            target_ref=threat["standard_id"],
-                                            relationship_type="related-to",
-                                            start_time=entry_date,
-                                            stop_time=entry_date
-                                            + datetime.timedelta(0, 3),
-                                            confidence=self.helper.connect_confidence_level,
-                                            created_by_ref=self.identity["standard_id"],
-                                            object_marking_refs=[stix2.TLP_WHITE],
-                                            created=entry_date,
-                                            modified=entry_date,
-                                            allow_custom=True,
-                                        )
-                                        bundle_objects.append(
-                                            stix_threat_relation_indicator
-                                        )
-                                        bundle_objects.append(
-                                            stix_threat_relation_observable
-                                        )
-                fp.close()
-                bundle = stix2.Bundle(
-                    objects=bundle_objects, allow_custom=True
-                ).serialize()
-                self.helper.send_stix2_bundle(
-                    bundle,
-                    update=self.update_existing_data,
-                    work_id=work_id,
-                )
-                if os.path.exists(
-                    os.path.dirname(os.path.abspath(__file__)) + "/data.csv"
-                ):
-                    os.remove(os.path.dirname(os.path.abspath(__file__)) + "/data.csv")
+
+                        if row[3] == "online" or self.urlhaus_import_offline:
+                            bundle_objects.extend(
+                                self.process_row(
+                                    row, entry_date, threat_cache, missing_labels
+                                )
+                            )
+                            if len(bundle_objects) >= self.bundle_size:
+                                self.send_bundle(bundle_objects, work_id)
+                                bundle_objects = []
+                    if bundle_objects:
+                        self.send_bundle(bundle_objects, work_id)
 
                 # Store the current timestamp as a last run
                 message = "Connector successfully run, storing last_run as " + str(
@@ -320,6 +371,7 @@ class URLhaus:
                     {
                         "last_run": timestamp,
                         "last_processed_entry": last_processed_entry_running_max,
+                        "threat_cache": threat_cache,
                     }
                 )
                 self.helper.api.work.to_processed(work_id, message)
@@ -1,10 +1,15 @@
 import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
 import requests
+from requests.adapters import HTTPAdapter
 
 
 class GoogleDNSClient:
-    def __init__(self):
+    def __init__(self, max_workers=10, cache_size=10000):
         self.base_url = "https://dns.google.com/resolve"
         self.rr_types = {
             "A": 1,
@@ -14,16 +19,60 @@ class GoogleDNSClient:
             "TXT": 16,
         }
 
+        # Pooled session shared by the concurrent queries
+        self.session = requests.Session()
+        self.session.mount(
+            "https://",
+            HTTPAdapter(pool_connections=1, pool_maxsize=max_workers),
+        )
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+
+        # Answers cached by (host, type) until their TTL expires
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.cache_lock = threading.Lock()
+
     def _remove_dots(self, answers) -> list:
         results = [answer.rstrip(".") for answer in answers]
         return results
 
+    def _get_cached(self, key):
+        with self.cache_lock:
+            cached = self.cache.get(key)
+            if cached is None:
+                return None
+            expires_at, data = cached
+            if expires_at < time.monotonic():
+                del self.cache[key]
+                return None
+            self.cache.move_to_end(key)
+            return data
+
+    def _set_cached(self, key, data, ttl):
+        with self.cache_lock:
+            self.cache[key] = (time.monotonic() + ttl, data)
+            self.cache.move_to_end(key)
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+
+    @staticmethod
+    def _get_ttl(body):
+        # Answers (or the SOA of a negative answer) give the caching duration
+        records = body.get("Answer") or body.get("Authority") or []
+        ttls = [record["TTL"] for record in records if "TTL" in record]
+        return min(ttls) if ttls else None
+
     def query(self, host, query_type) -> list:
+        key = (host.lower(), query_type)
+        data = self._get_cached(key)
+        if data is not None:
+            return data
+
         params = {"name": host, "type": query_type}
         query_type_id = self.rr_types.get(query_type, 1)
 
         try:
-            response = requests.get(self.base_url, params)
+            response = self.session.get(self.base_url, params=params)
             body = response.json()
         except Exception as e:
             print(e)
@@ -39,6 +88,10 @@ class GoogleDNSClient:
         else:
             data = []
 
+        ttl = self._get_ttl(body)
+        if ttl is not None and body.get("Status", 0) in (0, 3):
+            self._set_cached(key, data, ttl)
+
         return data
 
     def a(self, host) -> list:
@@ -65,3 +118,30 @@ class GoogleDNSClient:
         data = self.query(host, "TXT")
         processed = self._remove_dots(data)
         return processed
+
+    def resolve_many(self, hosts) -> dict:
+        """
+        Resolve all the record types of the hosts concurrently.
+
+        Returns the records by host, then by record type.
+        """
+        futures = {
+            host: {
+                query_type: self.executor.submit(
+                    getattr(self, query_type.lower()), host
+                )
+                for query_type in self.rr_types
+            }
+            for host in hosts
+        }
+        return {
+            host: {
+                query_type: future.result()
+                for query_type, future in host_futures.items()
+            }
+            for host, host_futures in futures.items()
+        }
+
+    def resolve(self, host) -> dict:
+        """Resolve all the record types of the host concurrently."""
+        return self.resolve_many([host])[host]
@@ -19,6 +19,42 @@ class GoogleDNSConnector:
         self.helper = OpenCTIConnectorHelper(config)
         self.dns_client = GoogleDNSClient()
 
+    def _get_domains(self, entity_id) -> list:
+        domain = self._get_domain(entity_id)
+        if domain is not None:
+            return [domain]
+
+        # Batch mode: resolve all the domains contained in a container
+        self.helper.log_debug("Getting Domain Names of the container from OpenCTI")
+        custom_attributes = """
+            id
+            entity_type
+            ... on Container {
+                objects(all: true) {
+                    edges {
+                        node {
+                            ... on StixCyberObservable {
+                                id
+                                entity_type
+                                observable_value
+                                standard_id
+                            }
+                        }
+                    }
+                }
+            }
+        """
+        container = self.helper.api.stix_domain_object.read(
+            id=entity_id, customAttributes=custom_attributes
+        )
+        if container is None:
+            return []
+        return [
+            item
+            for item in container.get("objects", [])
+            if item.get("entity_type") in ("Domain-Name", "Hostname")
+        ]
+
     def _get_domain(self, entity_id):
         self.helper.log_debug("Getting Domain Name from OpenCTI")
         custom_attributes = """
@@ -33,7 +69,7 @@ class GoogleDNSConnector:
         return observable
 
     def _build_ip_addrs(self, domain, a_records) -> list:
-        self.helper.log_debug("Creating and sending STIX bundle")
+        self.helper.log_debug("Creating STIX objects")
 
         objects = []
         for record in a_records:
@@ -62,7 +98,7 @@ class GoogleDNSConnector:
         return objects
 
     def _build_nameservers(self, domain, ns_records) -> list:
-        self.helper.log_debug("Creating and sending STIX bundle")
+        self.helper.log_debug("Creating STIX objects")
 
         objects = []
         for record in ns_records:
@@ -95,7 +131,7 @@ class GoogleDNSConnector:
         return objects
 
     def _build_cname_domains(self, domain, cname_records) -> list:
-        self.helper.log_debug("Creating and sending STIX bundle")
+        self.helper.log_debug("Creating STIX objects")
 
         objects = []
         for record in cname_records:
@@ -128,7 +164,7 @@ class GoogleDNSConnector:
         return objects
 
     def _build_mx_domains(self, domain, mx_records) -> list:
-        self.helper.log_debug("Creating and sending STIX bundle")
+        self.helper.log_debug("Creating STIX objects")
 
         objects = []
         for record in mx_records:
@@ -161,7 +197,7 @@ class GoogleDNSConnector:
         return objects
 
     def _build_txt_objects(self, domain, txt_records) -> list:
-        self.helper.log_debug("Creating and sending STIX bundle")
+        self.helper.log_debug("Creating STIX objects")
 
         objects = []
         for record in txt_records:
@@ -190,49 +226,41 @@ class GoogleDNSConnector:
 
         return objects
 
+    def _build_objects(self, domain, records) -> list:
+        objects = []
+        objects += self._build_nameservers(domain, records["NS"])
+        objects += self._build_ip_addrs(domain, records["A"])
+        objects += self._build_cname_domains(domain, records["CNAME"])
+        objects += self._build_mx_domains(domain, records["MX"])
+        objects += self._build_txt_objects(domain, records["TXT"])
+        return objects
+
     def _process_message(self, data: dict) -> str:
         entity_id = data["entity_id"]
         self.helper.log_info(f"Enriching {entity_id}")
-        domain = self._get_domain(entity_id)
-
-        # Handle 'NS' records
-        self.helper.log_debug("Getting 'NS' records via Google Public DNS")
-        ns_records = self.dns_client.ns(domain["observable_value"])
-        if any(ns_records):
-            ns_objects = self._build_nameservers(domain, ns_records)
-            bundle = Bundle(objects=ns_objects).serialize()
-            self.helper.send_stix2_bundle(bundle)
-
-        # Handle any 'A' records
-        self.helper.log_debug("Getting 'A' records via Google Public DNS")
-        a_records = self.dns_client.a(domain["observable_value"])
-        if any(a_records):
-            ipv4_objects = self._build_ip_addrs(domain, a_records)
-            bundle = Bundle(objects=ipv4_objects).serialize()
-            self.helper.send_stix2_bundle(bundle)
-
-        # Handle any 'CNAME' records
-        self.helper.log_debug("Getting 'CNAME' records via Google Public DNS")
-        cname_records = self.dns_client.cname(domain["observable_value"])
-        if any(cname_records):
-            domain_objects = self._build_cname_domains(domain, cname_records)
-            bundle = Bundle(objects=domain_objects).serialize()
-            self.helper.send_stix2_bundle(bundle)
+        domains = self._get_domains(entity_id)
+        if not any(domains):
+            return "No Domain Name to resolve"
+
+        # Resolve all the record types of all the domains concurrently
+        self.helper.log_debug(
+            f"Getting 'NS', 'A', 'CNAME', 'MX' and 'TXT' records of "
+            f"{len(domains)} domain(s) via Google Public DNS"
+        )
+        records = self.dns_client.resolve_many(
+            {domain["observable_value"] for domain in domains}
+        )
 
-        # Handle any 'MX' records
-        self.helper.log_debug("Getting 'MX' records via Google Public DNS")
-        mx_records = self.dns_client.mx(domain["observable_value"])
-        if any(mx_records):
-            domain_objects = self._build_mx_domains(domain, mx_records)
-            bundle = Bundle(objects=domain_objects).serialize()
-            self.helper.send_stix2_bundle(bundle)
+        objects = []
+        for domain in domains:
+            objects += self._build_objects(domain, records[domain["observable_value"]])
 
-        # Handle any 'TXT' records
-        self.helper.log_debug("Getting 'TXT' records via Google Public DNS")
-        txt_records = self.dns_client.txt(domain["observable_value"])
-        if any(txt_records):
-            txt_objects = self._build_txt_objects(domain, txt_records)
-            bundle = Bundle(objects=txt_objects).serialize()
+        # Send all the objects in a single bundle, shared records only once
+        objects = list(
+            {stix_object.id: stix_object for stix_object in objects}.values()
+        )
+        if any(objects):
+            bundle = Bundle(objects=objects).serialize()
             self.helper.send_stix2_bundle(bundle)
 
         return "Done"
@@ -148,3 +148,67 @@ class GoogleDNSClientTest(unittest.TestCase):
         )
         results = self.client.txt("google.com")
         self.assertTrue("v=spf1 include:_spf.google.com ~all" in results)
+
+    @responses.activate
+    def test_cached_by_ttl(self):
+        responses.get(
+            url="https://dns.google.com/resolve",
+            match=[
+                responses.matchers.query_param_matcher(
+                    {"name": "example.com", "type": "A"}
+                )
+            ],
+            json={
+                "Status": 0,
+                "Answer": [
+                    {
+                        "name": "example.com.",
+                        "type": 1,
+                        "TTL": 21267,
+                        "data": "93.184.216.34",
+                    }
+                ],
+            },
+        )
+        self.assertEqual(self.client.a("example.com"), ["93.184.216.34"])
+        self.assertEqual(self.client.a("example.com"), ["93.184.216.34"])
+        self.assertEqual(len(responses.calls), 1)
+
+        # Expired answers are queried again
+        self.client._set_cached(("example.com", "A"), ["93.184.216.34"], -1)
+        self.client.a("example.com")
+        self.assertEqual(len(responses.calls), 2)
+
+    @responses.activate
+    def test_resolve_many(self):
+        for host in ["example.com", "example.org"]:
+            for query_type in ["A", "CNAME", "MX", "NS", "TXT"]:
+                responses.get(
+                    url="https://dns.google.com/resolve",
+                    match=[
+                        responses.matchers.query_param_matcher(
+                            {"name": host, "type": query_type}
+                        )
+                    ],
+                    json=(
+                        {
+                            "Answer": [
+                                {
+                                    "name": host + ".",
+                                    "type": 2,
+                                    "TTL": 300,
+                                    "data": "ns." + host + ".",
+                                }
+                            ]
+                        }
+                        if query_type == "NS"
+                        else {}
+                    ),
+                )
+        results = self.client.resolve_many(["example.com", "example.org"])
+        self.assertEqual(len(responses.calls), 10)
+        self.assertEqual(results["example.org"]["NS"], ["ns.example.org"])
+        self.assertEqual(results["example.com"]["A"], [])
+        self.assertEqual(
+            set(results["example.com"].keys()), {"A", "CNAME", "MX", "NS", "TXT"}
+        )
@@ -1,13 +1,15 @@
 import os
-from time import sleep
+from collections import OrderedDict
 
 import pycountry
-import requests
 import yaml
 from dateutil.parser import parse
+from greynoise_client import GreyNoiseClient
 from pycti import OpenCTIConnectorHelper, get_config_variable
 from stix2 import TLP_WHITE
 
+UNKNOWN_TAG = {"intention": "unknown", "category": "unknown", "description": ""}
+
 
 class GreyNoiseConnector:
     def __init__(self):
@@ -45,9 +47,39 @@ class GreyNoiseConnector:
             "Accept": "application/json",
             "User-Agent": "greynoise-opencti-connector-v1.1",
         }
-        self._CONNECTOR_RUN_INTERVAL_SEC = 60 * 60
         self.greynoise_id = None
 
+        rate_limit = get_config_variable(
+            "GREYNOISE_RATE_LIMIT",
+            ["greynoise", "rate_limit"],
+            config,
+            isNumber=True,
+            default=60,
+        )
+        self.client = GreyNoiseClient(
+            self.helper, self.api_url, self.headers, rate_limit
+        )
+
+        # Bulk quick check of the observables queued for enrichment
+        self.bulk_quick_check = get_config_variable(
+            "GREYNOISE_BULK_QUICK_CHECK",
+            ["greynoise", "bulk_quick_check"],
+            config,
+            default=False,
+        )
+        self.bulk_size = min(
+            get_config_variable(
+                "GREYNOISE_BULK_SIZE",
+                ["greynoise", "bulk_size"],
+                config,
+                isNumber=True,
+                default=1000,
+            ),
+            1000,
+        )
+        self.quick_results = OrderedDict()
+        self.triage_cursor = None
+
     def _get_greynoise_id(self) -> int:
         """Get or create a Greynoise entity if not exists"""
 
@@ -70,22 +102,78 @@ class GreyNoiseConnector:
             self.greynoise_id = greynoise_entity["id"]
             return self.greynoise_id
 
-    def _call_api(self, observable):
-        response = requests.get(
-            self.api_url + "noise/context/" + observable["value"],
-            headers=self.headers,
+    def _list_pending_observables(self, observable) -> list:
+        """List the IPv4 observables created since the last triage."""
+        cursor = self.triage_cursor or observable["created_at"]
+        pending = self.helper.api.stix_cyber_observable.list(
+            types=["IPv4-Addr"],
+            filters={
+                "mode": "and",
+                "filters": [
+                    {"key": "created_at", "values": [cursor], "operator": "gt"}
+                ],
+                "filterGroups": [],
+            },
+            orderBy="created_at",
+            orderMode="asc",
+            first=self.bulk_size - 1,
+            customAttributes="""
+                id
+                observable_value
+                created_at
+                objectMarking {
+                    definition_type
+                    definition
+                }
+            """,
         )
-        json_data = response.json()
+        if pending:
+            self.triage_cursor = pending[-1]["created_at"]
+        return [
+            item["observable_value"]
+            for item in pending
+            if OpenCTIConnectorHelper.check_max_tlp(self._get_tlp(item), self.max_tlp)
+        ]
 
-        if response.status_code == 429:
-            self.helper.log_info(
-                f"Quota reached, waiting {self._CONNECTOR_RUN_INTERVAL_SEC} seconds."
-            )
-            sleep(self._CONNECTOR_RUN_INTERVAL_SEC)
-            self._call_api(observable)
-            return "Observable processed after quota reached, waiting 1 hour."
-        if response.status_code >= 400:
-            raise ValueError(response.text)
+    def _triage(self, observable):
+        """
+        Return the quick check result of the observable.
+
+        The observables created since the last triage are most likely queued
+        for enrichment: they are quick checked in a single request with this
+        one, so their own messages are answered from the results.
+        """
+        value = observable["observable_value"]
+        if value not in self.quick_results:
+            try:
+                ips = [value] + [
+                    ip
+                    for ip in self._list_pending_observables(observable)
+                    if ip != value
+                ]
+                self.quick_results.update(self.client.quick_check(ips))
+                self.helper.log_info(f"Quick checked {len(ips)} IPv4 in bulk.")
+            except ValueError as e:
+                self.helper.log_error(f"Bulk quick check failed: {e}")
+                return None
+            # Keep the results of the last batches only
+            while len(self.quick_results) > self.bulk_size * 10:
+                self.quick_results.popitem(last=False)
+        return self.quick_results.pop(value, None)
+
+    def _call_api(self, observable):
+        json_data = None
+        if self.bulk_quick_check:
+            quick_result = self._triage(observable)
+            # Not seen by GreyNoise, no need of the full context lookup
+            if quick_result is not None and not quick_result["noise"]:
+                json_data = {"ip": observable["observable_value"], "seen": False}
+
+        if json_data is None:
+            response = self.client.get_context(observable["value"])
+            if response.status_code >= 400:
+                raise ValueError(response.text)
+            json_data = response.json()
 
         self.helper.log_info(
             f'Start processing observable {observable["observable_value"]}'
@@ -126,19 +214,11 @@ class GreyNoiseConnector:
             )
             # parse tags in response to create labels
             if "tags" in json_data:
-                # get tag metadata
-                tags_response = requests.get(
-                    self.api_url + "meta/metadata/",
-                    headers=self.headers,
-                )
-                # find tag details
                 for tag in json_data["tags"]:
                     label = {}
                     malware = {}
-                    for item in tags_response.json()["metadata"]:
-                        if item["name"] == tag:
-                            tag_details = item
-                            break
+                    # find tag details in the cached tag metadata
+                    tag_details = self.client.get_tag(tag) or UNKNOWN_TAG
                     # create red label when malicious intent and type not cat or activity
                     if tag_details["intention"] == "malicious" and tag_details[
                         "category"
@@ -349,17 +429,20 @@ class GreyNoiseConnector:
             )
             return f'IPv4 {observable["observable_value"]} found on GreyNoise, knowledge attached.'
 
-    def _process_message(self, data):
-        self.helper.log_info("process data: " + str(data))
-        entity_id = data["entity_id"]
-        observable = self.helper.api.stix_cyber_observable.read(id=entity_id)
-
-        # Extract TLP
+    @staticmethod
+    def _get_tlp(observable) -> str:
         tlp = "TLP:CLEAR"
         for marking_definition in observable["objectMarking"]:
             if marking_definition["definition_type"] == "TLP":
                 tlp = marking_definition["definition"]
+        return tlp
+
+    def _process_message(self, data):
+        self.helper.log_info("process data: " + str(data))
+        entity_id = data["entity_id"]
+        observable = self.helper.api.stix_cyber_observable.read(id=entity_id)
 
+        tlp = self._get_tlp(observable)
         if not OpenCTIConnectorHelper.check_max_tlp(tlp, self.max_tlp):
             raise ValueError(
                 "Do not send any data, TLP of the observable is greater than MAX TLP"
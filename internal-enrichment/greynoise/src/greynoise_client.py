@@ -0,0 +1,130 @@
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+import requests
+
+# Wait before retrying when a rate limited response has no usable Retry-After
+DEFAULT_RETRY_AFTER = 60
+
+
+def parse_retry_after(value) -> int:
+    """Seconds to wait from a Retry-After header, in seconds or an HTTP-date."""
+    if value is None:
+        return DEFAULT_RETRY_AFTER
+    try:
+        return max(int(value), 0)
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return DEFAULT_RETRY_AFTER
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(int((retry_at - datetime.now(timezone.utc)).total_seconds()), 0)
+
+
+class TokenBucket:
+    """Thread-safe token bucket, `rate` tokens refilled per minute."""
+
+    def __init__(self, rate: int):
+        self.capacity = max(rate, 1)
+        self.interval = 60.0 / self.capacity
+        self.tokens = float(self.capacity)
+        self.updated_at = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        elapsed = now - self.updated_at
+        self.tokens = min(self.capacity, self.tokens + elapsed / self.interval)
+        self.updated_at = now
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    wait = self.paused_until - now
+                else:
+                    self._refill(now)
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    wait = (1 - self.tokens) * self.interval
+            time.sleep(wait)
+
+    def pause(self, seconds: float):
+        # Rate limited by the API: no token is handed out until the delay is
+        # over and the bucket is emptied so the requests resume progressively.
+        with self._lock:
+            now = time.monotonic()
+            self.paused_until = max(self.paused_until, now + seconds)
+            self.tokens = 0
+            self.updated_at = self.paused_until
+
+
+class GreyNoiseClient:
+    """GreyNoise API client sharing a session, a rate limiter and the tags."""
+
+    def __init__(
+        self,
+        helper,
+        api_url: str,
+        headers: dict,
+        rate_limit: int,
+        max_retries: int = 3,
+        tags_refresh_interval: int = 24 * 60 * 60,
+    ):
+        self.helper = helper
+        self.api_url = api_url
+        self.session = requests.Session()
+        self.session.headers.update(headers)
+        self.rate_limiter = TokenBucket(rate_limit)
+        self.max_retries = max_retries
+        self.tags_refresh_interval = tags_refresh_interval
+        self.tags = {}
+        self.tags_fetched_at = None
+
+    def _request(self, method, path, **kwargs):
+        for attempt in range(self.max_retries + 1):
+            self.rate_limiter.acquire()
+            response = self.session.request(
+                method, self.api_url + path, timeout=60, **kwargs
+            )
+            if response.status_code != 429:
+                return response
+            if attempt < self.max_retries:
+                retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                self.helper.log_info(
+                    f"Rate limit reached, retrying in {retry_after} seconds "
+                    f"(attempt {attempt + 1}/{self.max_retries})."
+                )
+                self.rate_limiter.pause(retry_after)
+        raise ValueError(f"GreyNoise rate limit or quota reached: {response.text}")
+
+    def get_context(self, ip: str):
+        return self._request("GET", "noise/context/" + ip)
+
+    def quick_check(self, ips: list) -> dict:
+        """Bulk quick check, returns the results indexed by IP."""
+        response = self._request("POST", "noise/multi/quick", json={"ips": ips})
+        if response.status_code >= 400:
+            raise ValueError(response.text)
+        return {result["ip"]: result for result in response.json()}
+
+    def get_tag(self, name: str):
+        """Return the metadata of a tag, the catalogue is refreshed daily."""
+        if (
+            self.tags_fetched_at is None
+            or time.monotonic() - self.tags_fetched_at > self.tags_refresh_interval
+        ):
+            response = self._request("GET", "meta/metadata/")
+            if response.status_code >= 400:
+                raise ValueError(response.text)
+            self.tags = {item["name"]: item for item in response.json()["metadata"]}
+            self.tags_fetched_at = time.monotonic()
+            self.helper.log_info(f"GreyNoise tags catalogue loaded: {len(self.tags)}")
+        return self.tags.get(name)
@@ -0,0 +1,95 @@
+"""
+Benchmark of the warning lists lookups.
+
+Compares pymispwarninglists (fast and slow search modes) with the compiled
+WarningListsIndex on a mix of listed and random values (IPs, domains, URLs,
+hashes), and checks that both return the same lists for every value.
+
+The slow search mode of pymispwarninglists scans every entry of every list,
+it is measured on a smaller sample.
+
+Usage: python benchmarks/warninglists_lookup.py [--values 2000] [--slow-values 200]
+"""
+
+import argparse
+import hashlib
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from pymispwarninglists import WarningLists  # noqa: E402
+from warninglists_index import WarningListsIndex  # noqa: E402
+
+
+def generate_values(warninglists, count):
+    rng = random.Random(42)
+    listed = [
+        value
+        for warninglist in warninglists.warninglists.values()
+        for value in rng.sample(list(warninglist.list), min(len(warninglist.list), 5))
+        if "/" not in value
+    ]
+    values = []
+    for i in range(count):
+        kind = i % 6
+        if kind == 0:
+            values.append(rng.choice(listed))
+        elif kind == 1:
+            values.append(".".join(str(rng.randint(0, 255)) for _ in range(4)))
+        elif kind == 2:
+            values.append("2001:db8::%x" % rng.randint(0, 0xFFFF))
+        elif kind == 3:
+            values.append(f"host{i}.subdomain.{rng.choice(['google.com', 'x.org'])}")
+        elif kind == 4:
+            values.append(f"https://www.example{i}.com/path?query={i}")
+        else:
+            values.append(hashlib.sha256(str(i).encode()).hexdigest())
+    return values
+
+
+def measure(name, search, values):
+    start = time.perf_counter()
+    results = {value: sorted(hit.name for hit in search(value)) for value in values}
+    elapsed = time.perf_counter() - start
+    hits = sum(1 for names in results.values() if names)
+    print(
+        f"{name:<20} {elapsed:8.3f}s  {len(values) / elapsed:12.0f} lookups/s  "
+        f"{hits} value(s) with hits"
+    )
+    return elapsed, results
+
+
+def compare(slow_search, values):
+    mode = "slow" if slow_search else "fast"
+    start = time.perf_counter()
+    warninglists = WarningLists(slow_search=slow_search)
+    print(f"pymispwarninglists {mode} load: {time.perf_counter() - start:.3f}s")
+    start = time.perf_counter()
+    index = WarningListsIndex(slow_search=slow_search)
+    print(f"index {mode} build: {time.perf_counter() - start:.3f}s")
+
+    before, expected = measure(f"pymisp {mode}", warninglists.search, values)
+    after, results = measure(f"index {mode}", index.search, values)
+    mismatches = [value for value in values if expected[value] != results[value]]
+    print(f"Speedup: {before / after:.1f}x, mismatches: {len(mismatches)}")
+    for value in mismatches[:10]:
+        print(f"  {value}: {expected[value]} != {results[value]}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--values", type=int, default=2000)
+    parser.add_argument("--slow-values", type=int, default=200)
+    args = parser.parse_args()
+
+    values = generate_values(WarningLists(), args.values)
+    print(f"Synthetic values: {len(values)}")
+    compare(False, values)
+    compare(True, values[: args.slow_values])
+
+
+if __name__ == "__main__":
+    main()
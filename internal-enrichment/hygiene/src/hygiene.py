@@ -9,7 +9,7 @@ from pycti import (
     OpenCTIStix2,
     get_config_variable,
 )
-from pymispwarninglists import WarningLists
+from warninglists_index import WarningListsIndex, score_from_hits
 
 # At the moment it is not possible to map lists to their upstream path.
 # Thus we need to have our own mapping here.
@@ -127,9 +127,24 @@ class HygieneConnector:
             )
         )
 
+        warninglists_reload_interval = get_config_variable(
+            "HYGIENE_WARNINGLISTS_RELOAD_INTERVAL",
+            ["hygiene", "warninglists_reload_interval"],
+            config,
+            isNumber=True,
+            default=60,
+        )
+
         self.helper.log_info(f"Warning lists slow search: {warninglists_slow_search}")
 
-        self.warninglists = WarningLists(slow_search=warninglists_slow_search)
+        # Compile the warning lists once, lookups no longer scan every list
+        self.warninglists = WarningListsIndex(
+            slow_search=warninglists_slow_search,
+            check_interval=warninglists_reload_interval,
+        )
+        self.helper.log_info(
+            f"Warning lists index built with {self.warninglists.lists_count} lists"
+        )
 
         # Create Hygiene Tag
         self.label_hygiene = self.helper.api.label.read_or_create_unchecked(
@@ -150,17 +165,24 @@ class HygieneConnector:
                 )
 
     def _process_observable(self, stix_objects, stix_entity, opencti_entity) -> str:
-        # Search in warninglist
-        result = self.warninglists.search(opencti_entity["observable_value"])
+        value = opencti_entity["observable_value"]
+        parent_value = None
+        if self.enrich_subdomains is True and stix_entity["type"] == "domain-name":
+            ext = tldextract.extract(stix_entity["value"])
+            if stix_entity["value"] != ext.domain + "." + ext.suffix:
+                parent_value = ext.domain + "." + ext.suffix
 
-        # If not found and the domain is a subdomain, search with the parent.
+        # Search in warninglist, the value and its parent in a single batch
+        results = self.warninglists.search_many(
+            [value] if parent_value is None else [value, parent_value]
+        )
+        result = results[value]
+
+        # If not found and the domain is a subdomain, use the parent results.
         use_parent = False
-        if not result and self.enrich_subdomains is True:
-            if stix_entity["type"] == "domain-name":
-                ext = tldextract.extract(stix_entity["value"])
-                if stix_entity["value"] != ext.domain + "." + ext.suffix:
-                    result = self.warninglists.search(ext.domain + "." + ext.suffix)
-                    use_parent = True
+        if not result and parent_value is not None:
+            result = results[parent_value]
+            use_parent = True
 
         # Iterate over the hits
         if result:
@@ -175,15 +197,7 @@ class HygieneConnector:
                     % (hit.type, hit.name, hit.version, hit.description)
                 )
 
-                # We set the score based on the number of warning list entries
-                if len(result) >= 5:
-                    score = 5
-                elif len(result) >= 3:
-                    score = 10
-                elif len(result) == 1:
-                    score = 15
-                else:
-                    score = 20
+                score = score_from_hits(len(result))
 
                 self.helper.log_info(
                     f"number of hits ({len(result)}) setting score to {score}"
@@ -263,6 +277,11 @@ class HygieneConnector:
             return "Observable value found on warninglist and tagged accordingly"
 
     def _process_message(self, data) -> str:
+        if self.warninglists.reload_if_changed():
+            self.helper.log_info(
+                f"Warning lists changed on disk, index rebuilt with "
+                f"{self.warninglists.lists_count} lists"
+            )
         opencti_entity = self.helper.api.stix_cyber_observable.read(
             id=data["entity_id"]
         )
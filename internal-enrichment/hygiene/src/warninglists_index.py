@@ -0,0 +1,236 @@
+import json
+import time
+from glob import glob
+from ipaddress import IPv4Address, IPv6Address, ip_network
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional, Union
+from urllib.parse import urlparse
+
+# Precompiled lookup engine for the MISP warning lists.
+#
+# The lists are compiled once into:
+#   - a hash map for exact strings and hashes,
+#   - prefix tables (one hash map per prefix length) for CIDRs,
+#   - a reversed-label suffix trie for hostnames,
+# so a lookup no longer iterates over every list and every entry.
+# Matching follows pymispwarninglists: exact match only in fast mode, the
+# most appropriate method per list type in slow mode.
+
+# Labels are strings, None cannot collide with an (empty) label
+_TERMINAL = None
+
+
+class WarningListInfo(NamedTuple):
+    name: str
+    version: int
+    description: str
+    type: str
+
+
+def default_lists_dir() -> Path:
+    import pymispwarninglists
+
+    return (
+        Path(pymispwarninglists.__file__).parent
+        / "data"
+        / "misp-warninglists"
+        / "lists"
+    )
+
+
+def score_from_hits(hits_count: int) -> Optional[int]:
+    # We set the score based on the number of warning list entries
+    if hits_count == 0:
+        return None
+    if hits_count >= 5:
+        return 5
+    if hits_count >= 3:
+        return 10
+    if hits_count == 1:
+        return 15
+    return 20
+
+
+class _CompiledLists:
+    def __init__(self, warninglists: List[dict], slow_search: bool):
+        self.lists: List[WarningListInfo] = []
+        self.exact: Dict[str, Union[int, tuple]] = {}
+        self.cidr_exact: Dict[str, Union[int, tuple]] = {}
+        self.substrings: List[tuple] = []
+        self.hostnames: dict = {}
+        self.networks = {4: {}, 6: {}}
+
+        for index, warninglist in enumerate(warninglists):
+            self.lists.append(
+                WarningListInfo(
+                    name=warninglist["name"],
+                    version=int(warninglist["version"]),
+                    description=warninglist["description"],
+                    type=warninglist["type"],
+                )
+            )
+            entries = warninglist["list"]
+            list_type = warninglist["type"]
+
+            if not slow_search or list_type == "string":
+                self._add_exact(self.exact, entries, index)
+            elif list_type == "substring":
+                self.substrings.extend((entry, index) for entry in entries)
+            elif list_type == "hostname":
+                for entry in entries:
+                    self._add_hostname(entry, index)
+            elif list_type == "cidr":
+                # Values which are not IP addresses fall back to exact match
+                self._add_exact(self.cidr_exact, entries, index)
+                for entry in entries:
+                    self._add_network(entry, index)
+
+        # Only look up the prefix lengths actually used by the lists
+        self.prefix_lengths = {
+            version: sorted(tables) for version, tables in self.networks.items()
+        }
+
+    @staticmethod
+    def _add_exact(table, entries, index):
+        # Most entries belong to a single list, keep a plain index for them
+        # and only allocate a tuple for values shared by several lists.
+        for entry in entries:
+            previous = table.get(entry)
+            if previous is None:
+                table[entry] = index
+            elif type(previous) is int:
+                table[entry] = (previous, index)
+            else:
+                table[entry] = previous + (index,)
+
+    @staticmethod
+    def _get_exact(table, value):
+        indexes = table.get(value, ())
+        return (indexes,) if type(indexes) is int else indexes
+
+    def _add_hostname(self, entry, index):
+        # Entries starting with a dot only match subdomains
+        labels = entry.lstrip(".").split(".")
+        node = self.hostnames
+        for label in reversed(labels):
+            node = node.setdefault(label, {})
+        node.setdefault(_TERMINAL, []).append((index, not entry.startswith(".")))
+
+    def _add_network(self, entry, index):
+        try:
+            network = ip_network(entry)
+        except ValueError:
+            return
+        shift = network.max_prefixlen - network.prefixlen
+        table = self.networks[network.version].setdefault(network.prefixlen, {})
+        table.setdefault(int(network.network_address) >> shift, []).append(index)
+
+    def search(self, value: str, slow_search: bool) -> List[int]:
+        matches = set(self._get_exact(self.exact, value))
+        if not slow_search:
+            return sorted(matches)
+
+        for entry, index in self.substrings:
+            if entry in value:
+                matches.add(index)
+
+        if self.hostnames:
+            matches.update(self._search_hostname(value))
+
+        if self.networks[4] or self.networks[6]:
+            matches.update(self._search_network(value))
+
+        return sorted(matches)
+
+    def _search_hostname(self, value):
+        parsed_url = urlparse(value)
+        if parsed_url.hostname:
+            value = parsed_url.hostname
+        labels = value.split(".")
+        node = self.hostnames
+        for depth, label in enumerate(reversed(labels), start=1):
+            node = node.get(label)
+            if node is None:
+                return
+            for index, allow_exact in node.get(_TERMINAL, ()):
+                if depth < len(labels) or allow_exact:
+                    yield index
+
+    def _search_network(self, value):
+        for address_class, max_prefixlen, version in (
+            (IPv4Address, 32, 4),
+            (IPv6Address, 128, 6),
+        ):
+            try:
+                address = int(address_class(value))
+            except ValueError:
+                continue
+            tables = self.networks[version]
+            for prefixlen in self.prefix_lengths[version]:
+                indexes = tables[prefixlen].get(address >> (max_prefixlen - prefixlen))
+                if indexes is not None:
+                    yield from indexes
+            return
+        yield from self._get_exact(self.cidr_exact, value)
+
+
+class WarningListsIndex:
+    def __init__(
+        self,
+        lists_dir: Path = None,
+        slow_search: bool = False,
+        check_interval: int = 60,
+    ):
+        self.lists_dir = lists_dir if lists_dir is not None else default_lists_dir()
+        self.slow_search = slow_search
+        self.check_interval = check_interval
+        self._last_check = 0.0
+        self._snapshot: Dict[str, float] = {}
+        self._compiled: Optional[_CompiledLists] = None
+        self.load()
+
+    def _list_files(self) -> Dict[str, float]:
+        files = glob(str(Path(self.lists_dir) / "*" / "list.json"))
+        return {file: Path(file).stat().st_mtime for file in sorted(files)}
+
+    def load(self) -> None:
+        snapshot = self._list_files()
+        warninglists = []
+        for file in snapshot:
+            with open(file, encoding="utf-8") as f:
+                warninglists.append(json.load(f))
+        if not warninglists:
+            raise ValueError(f"No warning lists found in {self.lists_dir}")
+
+        # Swap the compiled lists at once, searches keep a consistent view
+        self._compiled = _CompiledLists(warninglists, self.slow_search)
+        self._snapshot = snapshot
+        self._last_check = time.monotonic()
+
+    def reload_if_changed(self) -> bool:
+        if time.monotonic() - self._last_check < self.check_interval:
+            return False
+        self._last_check = time.monotonic()
+        if self._list_files() == self._snapshot:
+            return False
+        self.load()
+        return True
+
+    @property
+    def lists_count(self) -> int:
+        return len(self._compiled.lists)
+
+    def search(self, value: str) -> List[WarningListInfo]:
+        compiled = self._compiled
+        return [
+            compiled.lists[index] for index in compiled.search(value, self.slow_search)
+        ]
+
+    def search_many(self, values: Iterable[str]) -> Dict[str, List[WarningListInfo]]:
+        return {value: self.search(value) for value in values}
+
+    def score_many(self, values: Iterable[str]) -> Dict[str, Optional[int]]:
+        return {
+            value: score_from_hits(len(hits))
+            for value, hits in self.search_many(values).items()
+        }
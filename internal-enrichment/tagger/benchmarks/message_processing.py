@@ -0,0 +1,149 @@
+"""
+Benchmark of the Tagger message processing.
+
+Compares the previous processing (one read per scope per definition, regexes
+searched with their flags rebuilt for every attribute, one mutation per
+label) with the compiled RuleEngine (one read, one update), on synthetic
+definitions and entities. OpenCTI calls are simulated with a fixed latency.
+
+Usage: python benchmarks/message_processing.py [--rules 500] [--messages 200] [--latency 0.002]
+"""
+
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from rule_engine import RuleEngine, load_re_flags  # noqa: E402
+
+SCOPES = ["Report", "Tool", "Malware", "Campaign", "Incident"]
+WORDS = [
+    "cloud",
+    "mobile",
+    "android",
+    "registry",
+    "ransomware",
+    "phishing",
+    "loader",
+    "stealer",
+    "botnet",
+    "exploit",
+]
+
+
+class FakeApi:
+    def __init__(self, entity, latency):
+        self.entity = entity
+        self.latency = latency
+        self.calls = 0
+
+    def call(self):
+        self.calls += 1
+        time.sleep(self.latency)
+
+    def read(self, entity_type):
+        self.call()
+        if entity_type.lower() == self.entity["entity_type"].lower():
+            return self.entity
+        return None
+
+
+def generate_definitions(rules_count, rng):
+    definitions = []
+    for i in range(0, rules_count, 10):
+        rules = []
+        for j in range(i, min(i + 10, rules_count)):
+            word = rng.choice(WORDS)
+            rules.append(
+                {
+                    "label": f"label-{j}",
+                    "search": f"{word}[-_ ]?{j}\\b|{word}{j}",
+                    "flags": ["IGNORECASE"] if j % 2 else [],
+                    "attributes": ["name", "description"],
+                }
+            )
+        definitions.append({"scopes": rng.sample(SCOPES, 2), "rules": rules})
+    return definitions
+
+
+def generate_entity(index, rules_count, rng):
+    words = [f"{rng.choice(WORDS)}{rng.randrange(rules_count)}" for _ in range(3)]
+    filler = " ".join(rng.choice(WORDS) for _ in range(200))
+    return {
+        "id": f"entity-{index}",
+        "entity_type": rng.choice(SCOPES),
+        "name": f"Entity {index}",
+        "description": f"{filler} {' '.join(words)} {filler}",
+    }
+
+
+def process_previous(definitions, api):
+    for definition in definitions:
+        for scope in definition["scopes"]:
+            entity = api.read(scope)
+            if not entity:
+                continue
+            for rule in definition["rules"]:
+                flags = load_re_flags(rule)
+                for attribute in rule["attributes"]:
+                    if not re.search(rule["search"], entity[attribute], flags=flags):
+                        continue
+                    api.call()  # add_label mutation
+                    break
+
+
+def process_engine(engine, api):
+    entity = api.read(api.entity["entity_type"])
+    if engine.match(entity):
+        api.call()  # single update mutation
+
+
+def measure(name, func, entities, latency):
+    calls = 0
+    start = time.perf_counter()
+    for entity in entities:
+        api = FakeApi(entity, latency)
+        func(api)
+        calls += api.calls
+    elapsed = time.perf_counter() - start
+    print(
+        f"{name:<10} {elapsed:8.3f}s  {elapsed / len(entities) * 1000:8.2f}ms/message"
+        f"  {calls / len(entities):6.1f} API calls/message"
+    )
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rules", type=int, default=500)
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.002)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    definitions = generate_definitions(args.rules, rng)
+    entities = [generate_entity(i, args.rules, rng) for i in range(args.messages)]
+    print(f"Synthetic definitions: {args.rules} rules, {args.messages} messages")
+
+    start = time.perf_counter()
+    engine = RuleEngine(definitions)
+    print(f"Engine compilation: {time.perf_counter() - start:.3f}s")
+
+    before = measure(
+        "previous",
+        lambda api: process_previous(definitions, api),
+        entities,
+        args.latency,
+    )
+    after = measure(
+        "engine", lambda api: process_engine(engine, api), entities, args.latency
+    )
+    print(f"Speedup: {before / after:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
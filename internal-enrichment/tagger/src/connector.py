@@ -1,20 +1,7 @@
 import json
-import re
 
 from pycti import OpenCTIConnectorHelper, get_config_variable
-
-
-def load_re_flags(rule):
-    """Load the regular expression flags from a rule definition."""
-
-    config = rule.get("flags") or []
-
-    flags = 0
-    for flag in config:
-        flag = getattr(re, flag)
-        flags |= flag
-
-    return flags
+from rule_engine import RuleEngine
 
 
 class TaggerConnector:
@@ -22,48 +9,51 @@ class TaggerConnector:
         self.helper = OpenCTIConnectorHelper({})
         self.definitions = json.loads(get_config_variable("TAGGER_DEFINITIONS", []))
 
+        # Compile the definitions once, every message reuses the same matchers
+        self.engine = RuleEngine(self.definitions)
+        self.custom_attributes = self.engine.custom_attributes()
+        self.label_ids = {}
+
     def start(self):
         self.helper.listen(self._process_message)
 
+    def _get_label_id(self, label_name):
+        if label_name not in self.label_ids:
+            label = self.helper.api.label.read_or_create_unchecked(value=label_name)
+            if label is None:
+                self.helper.log_error(f"The label {label_name} could not be created")
+                return None
+            self.label_ids[label_name] = label["id"]
+        return self.label_ids[label_name]
+
     def _process_message(self, data):
         entity_id = data.get("entity_id")
 
-        for definition in self.definitions:
-            for scope in definition["scopes"]:
-                entity_type = scope.lower()
-                api = getattr(self.helper.api, entity_type)
-                entity = api.read(id=entity_id)
-
-                if not entity:
-                    continue
-
-                for rule in definition["rules"]:
-                    flags = load_re_flags(rule)
-
-                    for attribute in rule["attributes"]:
-                        self.helper.log_debug(entity)
-                        attr = entity[attribute]
-                        if attribute.lower() == "objectlabel":
-                            for el in attr:
-                                if not re.search(
-                                    rule["search"], el["value"], flags=flags
-                                ):
-                                    continue
-
-                                self.helper.api.stix_domain_object.add_label(
-                                    id=entity_id, label_name=rule["label"]
-                                )
-                                break
-
-                            continue
-
-                        if not re.search(rule["search"], attr, flags=flags):
-                            continue
-
-                        self.helper.api.stix_domain_object.add_label(
-                            id=entity_id, label_name=rule["label"]
-                        )
-                        break
+        # Read the entity once, with only the attributes used by the rules
+        entity = self.helper.api.stix_domain_object.read(
+            id=entity_id, customAttributes=self.custom_attributes
+        )
+        if not entity:
+            return
+
+        self.helper.log_debug(entity)
+        labels = self.engine.match(entity)
+        if not labels:
+            return
+
+        label_ids = [
+            label_id
+            for label_id in map(self._get_label_id, sorted(labels))
+            if label_id is not None
+        ]
+        if not label_ids:
+            return
+
+        # Add all the matched labels at once
+        self.helper.api.stix_domain_object.update_field(
+            id=entity_id,
+            input=[{"key": "objectLabel", "value": label_ids, "operation": "add"}],
+        )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,139 @@
+import re
+
+# Patterns referencing their own groups cannot be merged with other patterns
+# in a single alternation, the group numbers would be shifted.
+GROUP_REFERENCE = re.compile(r"\\[1-9]|\(\?P=|\(\?\(")
+
+LABEL_ATTRIBUTE = "objectlabel"
+
+
+def load_re_flags(rule):
+    """Load the regular expression flags from a rule definition."""
+
+    config = rule.get("flags") or []
+
+    flags = 0
+    for flag in config:
+        flag = getattr(re, flag)
+        flags |= flag
+
+    return flags
+
+
+class AttributeMatcher:
+    """Rules applied to one attribute, compiled once."""
+
+    def __init__(self):
+        self._rules = []
+        self._groups = []
+
+    def add_rule(self, label, search, flags):
+        self._rules.append((label, search, flags))
+
+    def compile(self):
+        # Rules sharing the same flags are combined into one alternation used
+        # as a prefilter: a single search tells if any of them can match, the
+        # individual regexes only run when it does.
+        by_flags = {}
+        for label, search, flags in self._rules:
+            by_flags.setdefault(flags, []).append((label, search))
+
+        self._groups = []
+        for flags, rules in by_flags.items():
+            compiled = [(label, re.compile(search, flags)) for label, search in rules]
+            combinable = [
+                search for _, search in rules if not GROUP_REFERENCE.search(search)
+            ]
+            prefilter = None
+            if len(combinable) == len(rules) and len(rules) > 1:
+                try:
+                    prefilter = re.compile(
+                        "|".join(f"(?:{search})" for search in combinable), flags
+                    )
+                except re.error:
+                    prefilter = None
+            self._groups.append((prefilter, compiled))
+
+    def match(self, value, labels):
+        for prefilter, compiled in self._groups:
+            if prefilter is not None and prefilter.search(value) is None:
+                continue
+            for label, regex in compiled:
+                if label not in labels and regex.search(value):
+                    labels.add(label)
+
+
+class EntityMatcher:
+    """Rules applied to one entity type, indexed by attribute."""
+
+    def __init__(self, entity_type):
+        self.entity_type = entity_type
+        self.attributes = {}
+
+    def add_rule(self, rule):
+        flags = load_re_flags(rule)
+        for attribute in rule["attributes"]:
+            matcher = self.attributes.setdefault(attribute, AttributeMatcher())
+            matcher.add_rule(rule["label"], rule["search"], flags)
+
+    def compile(self):
+        for matcher in self.attributes.values():
+            matcher.compile()
+
+    def graphql_fragment(self):
+        fields = [
+            (
+                f"{attribute} {{ id value }}"
+                if attribute.lower() == LABEL_ATTRIBUTE
+                else attribute
+            )
+            for attribute in self.attributes
+        ]
+        return "... on %s { %s }" % (
+            self.entity_type.replace("-", ""),
+            " ".join(fields),
+        )
+
+    def match(self, entity):
+        labels = set()
+        for attribute, matcher in self.attributes.items():
+            value = entity.get(attribute)
+            if not value:
+                continue
+            if attribute.lower() == LABEL_ATTRIBUTE:
+                for label in value:
+                    matcher.match(label["value"], labels)
+            else:
+                matcher.match(value, labels)
+        return labels
+
+
+class RuleEngine:
+    """
+    Tagger definitions compiled into one matcher per entity type.
+
+    The custom attributes select only the attributes used by the rules, so an
+    entity is read once whatever the number of definitions.
+    """
+
+    def __init__(self, definitions):
+        self.matchers = {}
+        for definition in definitions:
+            for scope in definition["scopes"]:
+                matcher = self.matchers.setdefault(scope.lower(), EntityMatcher(scope))
+                for rule in definition["rules"]:
+                    matcher.add_rule(rule)
+        for matcher in self.matchers.values():
+            matcher.compile()
+
+    def custom_attributes(self):
+        return "\n".join(
+            ["id", "entity_type"]
+            + [matcher.graphql_fragment() for matcher in self.matchers.values()]
+        )
+
+    def match(self, entity):
+        matcher = self.matchers.get(entity["entity_type"].lower())
+        if matcher is None:
+            return set()
+        return matcher.match(entity)
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""Virustotal response cache module."""
+import datetime
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+
+class ResponseCache:
+    """
+    Persistent, size-bounded cache of the VirusTotal responses.
+
+    Responses are keyed by (endpoint, value) and stored in a SQLite database
+    so they survive a restart. The number of requests sent to VirusTotal per
+    (UTC) day is stored in the same database for the quota accounting.
+    """
+
+    def __init__(self, path: str, ttl: int, max_entries: int) -> None:
+        """
+        Initialize the response cache.
+
+        Parameters
+        ----------
+        path : str
+            Path of the SQLite database.
+        ttl : int
+            Time to live of a response, in seconds. Expired responses are only
+            used when the daily quota is near exhaustion.
+        max_entries : int
+            Maximum number of responses kept, the least recently used ones
+            are evicted first.
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "endpoint TEXT NOT NULL, value TEXT NOT NULL, "
+                "stored_at REAL NOT NULL, accessed_at REAL NOT NULL, "
+                "body TEXT NOT NULL, PRIMARY KEY (endpoint, value))"
+            )
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS responses_accessed_at "
+                "ON responses (accessed_at)"
+            )
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS quota ("
+                "day TEXT PRIMARY KEY, requests INTEGER NOT NULL)"
+            )
+
+    def get(self, endpoint: str, value: str, allow_expired=False) -> Optional[dict]:
+        """
+        Retrieve a cached response.
+
+        Parameters
+        ----------
+        endpoint : str
+            VirusTotal endpoint (files, ip_addresses, ...).
+        value : str
+            Value queried on the endpoint.
+        allow_expired : bool, default False
+            Return the response even if its time to live is exceeded.
+
+        Returns
+        -------
+        dict or None
+            The cached response or None if not cached (or expired).
+        """
+        now = time.time()
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT stored_at, body FROM responses WHERE endpoint = ? AND value = ?",
+                (endpoint, value),
+            ).fetchone()
+            if row is None or (not allow_expired and now - row[0] > self.ttl):
+                return None
+            with self._connection:
+                self._connection.execute(
+                    "UPDATE responses SET accessed_at = ? "
+                    "WHERE endpoint = ? AND value = ?",
+                    (now, endpoint, value),
+                )
+        return json.loads(row[1])
+
+    def set(self, endpoint: str, value: str, response: dict) -> None:
+        """
+        Store a response, evicting the least recently used ones if needed.
+
+        Parameters
+        ----------
+        endpoint : str
+            VirusTotal endpoint (files, ip_addresses, ...).
+        value : str
+            Value queried on the endpoint.
+        response : dict
+            Response to store.
+        """
+        now = time.time()
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+                (endpoint, value, now, now, json.dumps(response)),
+            )
+            self._connection.execute(
+                "DELETE FROM responses WHERE rowid IN ("
+                "SELECT rowid FROM responses ORDER BY accessed_at DESC "
+                "LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection.execute(
+                "SELECT COUNT(*) FROM responses"
+            ).fetchone()[0]
+
+    @staticmethod
+    def _today() -> str:
+        return datetime.datetime.now(datetime.timezone.utc).date().isoformat()
+
+    def count_request(self) -> None:
+        """Count a request sent to VirusTotal in the quota of the day."""
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT INTO quota VALUES (?, 1) "
+                "ON CONFLICT (day) DO UPDATE SET requests = requests + 1",
+                (self._today(),),
+            )
+            self._connection.execute(
+                "DELETE FROM quota WHERE day < ?", (self._today(),)
+            )
+
+    def requests_today(self) -> int:
+        """Return the number of requests sent to VirusTotal today (UTC)."""
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT requests FROM quota WHERE day = ?", (self._today(),)
+            ).fetchone()
+        return row[0] if row is not None else 0
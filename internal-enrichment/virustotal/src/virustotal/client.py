@@ -7,18 +7,39 @@ import time
 import urllib.parse
 
 import requests
+from prometheus_client import Gauge
 from pycti import OpenCTIConnectorHelper
 from requests.adapters import HTTPAdapter
 from requests.packages.urllib3.util.retry import Retry
 
+from .cache import ResponseCache
+
 
 class VirusTotalClient:
     """VirusTotal client."""
 
     def __init__(
-        self, helper: OpenCTIConnectorHelper, base_url: str, token: str
+        self,
+        helper: OpenCTIConnectorHelper,
+        base_url: str,
+        token: str,
+        cache: ResponseCache = None,
+        daily_quota: int = 0,
+        quota_reserve: int = 0,
     ) -> None:
-        """Initialize Virustotal client."""
+        """
+        Initialize Virustotal client.
+
+        Parameters
+        ----------
+        cache : ResponseCache, optional
+            Cache of the responses, also used for the quota accounting.
+        daily_quota : int, default 0
+            Number of requests allowed per day (0 for no quota accounting).
+        quota_reserve : int, default 0
+            When the remaining requests of the day fall to this number, cached
+            responses are used even if expired.
+        """
         self.helper = helper
         # Drop the ending slash if present.
         self.url = base_url[:-1] if base_url[-1] == "/" else base_url
@@ -28,6 +49,110 @@ class VirusTotalClient:
             "accept": "application/json",
         }
 
+        # Single session, connections are pooled and reused between queries.
+        retry_strategy = Retry(
+            total=3,
+            status_forcelist=[429, 500, 502, 503, 504],
+            allowed_methods=["HEAD", "GET", "OPTIONS"],
+        )
+        self.session = requests.Session()
+        self.session.mount("https://", HTTPAdapter(max_retries=retry_strategy))
+        self.session.headers.update(self.headers)
+
+        self.cache = cache
+        self.daily_quota = daily_quota
+        self.quota_reserve = quota_reserve
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._metrics = None
+        if self.helper.metric.activated:
+            self._metrics = {
+                "cache_hit_ratio": Gauge(
+                    "virustotal_cache_hit_ratio",
+                    "Ratio of the lookups served from the response cache",
+                ),
+                "quota_remaining": Gauge(
+                    "virustotal_quota_remaining",
+                    "Number of requests remaining in the daily quota",
+                ),
+            }
+
+    @property
+    def quota_remaining(self):
+        """Number of requests remaining today, None without quota accounting."""
+        if self.cache is None or self.daily_quota <= 0:
+            return None
+        return max(self.daily_quota - self.cache.requests_today(), 0)
+
+    @property
+    def cache_hit_ratio(self) -> float:
+        """Ratio of the lookups served from the cache since the start."""
+        lookups = self.cache_hits + self.cache_misses
+        return self.cache_hits / lookups if lookups > 0 else 0.0
+
+    def _count_request(self) -> None:
+        """Count a request in the daily quota and update the metric."""
+        if self.cache is None:
+            return
+        self.cache.count_request()
+        remaining = self.quota_remaining
+        if remaining is not None and self._metrics is not None:
+            self._metrics["quota_remaining"].set(remaining)
+
+    def _cached(self, endpoint, value, fetch, refresh=False):
+        """
+        Return the cached response of (endpoint, value) or fetch it.
+
+        Only successful responses are cached. Expired responses are used when
+        the daily quota is near exhaustion.
+
+        Parameters
+        ----------
+        endpoint : str
+            VirusTotal endpoint (files, ip_addresses, ...).
+        value : str
+            Value queried on the endpoint.
+        fetch : callable
+            Function querying VirusTotal on a cache miss.
+        refresh : bool, default False
+            Skip the cached response (the result is still stored).
+
+        Returns
+        -------
+        JSON or None
+            The response, as JSON or None in case of failure.
+        """
+        if self.cache is None:
+            return fetch()
+
+        remaining = self.quota_remaining
+        near_exhaustion = remaining is not None and remaining <= self.quota_reserve
+        response = (
+            None
+            if refresh
+            else self.cache.get(endpoint, value, allow_expired=near_exhaustion)
+        )
+        if response is not None:
+            self.cache_hits += 1
+            self.helper.log_debug(
+                f"[VirusTotal] {endpoint}/{value} retrieved from cache "
+                f"(hit ratio: {self.cache_hit_ratio:.2f}, quota remaining: {remaining})"
+            )
+        else:
+            self.cache_misses += 1
+            if near_exhaustion and not refresh:
+                self.helper.log_warning(
+                    f"[VirusTotal] Daily quota near exhaustion ({remaining} requests "
+                    f"remaining) and {endpoint}/{value} is not cached"
+                )
+            response = fetch()
+            if response is not None and "data" in response:
+                self.cache.set(endpoint, value, response)
+
+        if self._metrics is not None:
+            self._metrics["cache_hit_ratio"].set(self.cache_hit_ratio)
+        return response
+
     def _query(self, url):
         """
         Execute a query to the Virustotal api.
@@ -47,19 +172,11 @@ class VirusTotalClient:
         JSON or None
             The result of the query, as JSON or None in case of failure.
         """
-        # Configure the adapter for the retry strategy.
-        retry_strategy = Retry(
-            total=3,
-            status_forcelist=[429, 500, 502, 503, 504],
-            allowed_methods=["HEAD", "GET", "OPTIONS"],
-        )
-        adapter = HTTPAdapter(max_retries=retry_strategy)
-        http = requests.Session()
-        http.mount("https://", adapter)
         response = None
+        self._count_request()
         try:
-            response = http.get(
-                url, headers=self.headers | {"content-type": "application/json"}
+            response = self.session.get(
+                url, headers={"content-type": "application/json"}
             )
             response.raise_for_status()
         except requests.exceptions.HTTPError as errh:
@@ -108,14 +225,10 @@ class VirusTotalClient:
             The result of the query, as JSON or None in case of failure.
         """
         response = None
-        headers = (
-            self.headers
-            if additional_headers is None
-            else self.headers | additional_headers
-        )
+        self._count_request()
         try:
-            response = requests.post(
-                url, data=data, files=files, headers=headers, timeout=60
+            response = self.session.post(
+                url, data=data, files=files, headers=additional_headers, timeout=60
             )
             response.raise_for_status()
         except requests.exceptions.HTTPError as errh:
@@ -143,7 +256,7 @@ class VirusTotalClient:
             self.helper.metric.inc("client_error_count")
             return None
 
-    def get_file_info(self, hash256) -> dict:
+    def get_file_info(self, hash256, refresh=False) -> dict:
         """
         Retrieve file information based on the given hash-256.
 
@@ -151,6 +264,8 @@ class VirusTotalClient:
         ----------
         hash256 : str
             Hash of the file to retrieve.
+        refresh : bool, default False
+            Query VirusTotal even if the file is cached.
 
         Returns
         -------
@@ -158,7 +273,7 @@ class VirusTotalClient:
             File object, see https://developers.virustotal.com/reference/files
         """
         url = f"{self.url}/files/{hash256}"
-        return self._query(url)
+        return self._cached("files", hash256, lambda: self._query(url), refresh)
 
     def upload_artifact(self, artifact_name, artifact) -> str:
         """
@@ -195,7 +310,7 @@ class VirusTotalClient:
             YARA ruleset objects, see https://developers.virustotal.com/reference/yara-rulesets
         """
         url = f"{self.url}/yara_rulesets/{ruleset_id}"
-        return self._query(url)
+        return self._cached("yara_rulesets", ruleset_id, lambda: self._query(url))
 
     def get_ip_info(self, ip):
         """
@@ -212,7 +327,7 @@ class VirusTotalClient:
             IP address object, see https://developers.virustotal.com/reference/ip-object
         """
         url = f"{self.url}/ip_addresses/{ip}"
-        return self._query(url)
+        return self._cached("ip_addresses", ip, lambda: self._query(url))
 
     def get_domain_info(self, domain):
         """
@@ -229,9 +344,9 @@ class VirusTotalClient:
             Domain Object, see https://developers.virustotal.com/reference/domains-1
         """
         url = f"{self.url}/domains/{domain}"
-        return self._query(url)
+        return self._cached("domains", domain, lambda: self._query(url))
 
-    def get_url_info(self, url):
+    def get_url_info(self, url, refresh=False):
         """
         Retrieve URL report based on the given URL.
 
@@ -239,12 +354,18 @@ class VirusTotalClient:
         ----------
         url : str
             Url.
+        refresh : bool, default False
+            Query VirusTotal even if the URL is cached.
 
         Returns
         -------
         dict
             URL Object, see https://developers.virustotal.com/reference/url-object
         """
+        return self._cached("urls", url, lambda: self._query_url(url), refresh)
+
+    def _query_url(self, url):
+        """Query the URL report by its base64 id, then by its SHA-256 id."""
         base64_url = f"{self.url}/urls/{VirusTotalClient.base64_encode_no_padding(url)}"
         results = self._query(base64_url)
         if "error" in results:
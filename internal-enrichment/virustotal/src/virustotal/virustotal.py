@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 """VirusTotal enrichment module."""
+
 import json
 from pathlib import Path
 
@@ -8,6 +9,7 @@ import yaml
 from pycti import Identity, OpenCTIConnectorHelper, get_config_variable
 
 from .builder import VirusTotalBuilder
+from .cache import ResponseCache
 from .client import VirusTotalClient
 from .indicator_config import IndicatorConfig
 
@@ -44,10 +46,51 @@ class VirusTotalConnector:
             confidence=self.helper.connect_confidence_level,
         )
 
-        self.client = VirusTotalClient(self.helper, self._API_URL, token)
-
-        # Cache to store YARA rulesets.
-        self.yara_cache = {}
+        # Persistent cache of the responses (YARA rulesets included), also
+        # used to account the requests against the daily quota.
+        cache = ResponseCache(
+            get_config_variable(
+                "VIRUSTOTAL_CACHE_PATH",
+                ["virustotal", "cache_path"],
+                config,
+                default=str(Path(__file__).parent.parent.resolve() / "cache.db"),
+            ),
+            ttl=60
+            * get_config_variable(
+                "VIRUSTOTAL_CACHE_TTL_MINUTES",
+                ["virustotal", "cache_ttl_minutes"],
+                config,
+                True,
+                1440,
+            ),
+            max_entries=get_config_variable(
+                "VIRUSTOTAL_CACHE_MAX_ENTRIES",
+                ["virustotal", "cache_max_entries"],
+                config,
+                True,
+                100000,
+            ),
+        )
+        self.client = VirusTotalClient(
+            self.helper,
+            self._API_URL,
+            token,
+            cache=cache,
+            daily_quota=get_config_variable(
+                "VIRUSTOTAL_DAILY_QUOTA",
+                ["virustotal", "daily_quota"],
+                config,
+                True,
+                0,
+            ),
+            quota_reserve=get_config_variable(
+                "VIRUSTOTAL_QUOTA_RESERVE",
+                ["virustotal", "quota_reserve"],
+                config,
+                True,
+                0,
+            ),
+        )
 
         self.confidence_level = get_config_variable(
             "CONNECTOR_CONFIDENCE_LEVEL",
@@ -112,7 +155,7 @@ class VirusTotalConnector:
         """
         Retrieve yara ruleset.
 
-        If the yara is not in the cache, make an API call.
+        Rulesets are served from the client response cache when available.
 
         Returns
         -------
@@ -120,14 +163,7 @@ class VirusTotalConnector:
             YARA ruleset object.
         """
         self.helper.log_debug(f"[VirusTotal] Retrieving ruleset {ruleset_id}")
-        if ruleset_id in self.yara_cache:
-            self.helper.log_debug(f"Retrieving YARA ruleset {ruleset_id} from cache.")
-            ruleset = self.yara_cache[ruleset_id]
-        else:
-            self.helper.log_debug(f"Retrieving YARA ruleset {ruleset_id} from API.")
-            ruleset = self.client.get_yara_ruleset(ruleset_id)
-            self.yara_cache[ruleset_id] = ruleset
-        return ruleset
+        return self.client.get_yara_ruleset(ruleset_id)
 
     def _process_file(self, stix_objects, stix_entity, opencti_entity):
         json_data = self.client.get_file_info(self.resolve_default_value(stix_entity))
@@ -161,7 +197,9 @@ class VirusTotalConnector:
                     opencti_entity["importFiles"][0]["name"], artifact
                 )
                 # Attempting to get the file info immediately queues the artifact for more immediate analysis
-                self.client.get_file_info(self.resolve_default_value(stix_entity))
+                self.client.get_file_info(
+                    self.resolve_default_value(stix_entity), refresh=True
+                )
             except Exception as err:
                 raise ValueError(
                     "[VirusTotal] Error uploading artifact to VirusTotal"
@@ -175,7 +213,7 @@ class VirusTotalConnector:
                     "[VirusTotal] Error waiting for VirusTotal to analyze artifact"
                 ) from err
             json_data = self.client.get_file_info(
-                self.resolve_default_value(stix_entity)
+                self.resolve_default_value(stix_entity), refresh=True
             )
             assert json_data
         if "error" in json_data:
@@ -323,7 +361,9 @@ class VirusTotalConnector:
                 raise ValueError(
                     "[VirusTotal] Error waiting for VirusTotal to analyze URL"
                 ) from err
-            json_data = self.client.get_url_info(opencti_entity["observable_value"])
+            json_data = self.client.get_url_info(
+                opencti_entity["observable_value"], refresh=True
+            )
             assert json_data
         if "error" in json_data:
             raise ValueError(json_data["error"]["message"])
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""Virustotal response cache unittest."""
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import MagicMock
+
+from src.virustotal.cache import ResponseCache
+from src.virustotal.client import VirusTotalClient
+
+
+class ResponseCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = str(Path(self.directory.name) / "cache.db")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_get_set(self):
+        cache = ResponseCache(self.path, ttl=60, max_entries=10)
+        self.assertIsNone(cache.get("domains", "example.com"))
+        cache.set("domains", "example.com", {"data": {"id": "example.com"}})
+        self.assertEqual(
+            cache.get("domains", "example.com"), {"data": {"id": "example.com"}}
+        )
+        self.assertIsNone(cache.get("urls", "example.com"))
+
+    def test_persistent(self):
+        ResponseCache(self.path, ttl=60, max_entries=10).set(
+            "files", "hash", {"data": {}}
+        )
+        cache = ResponseCache(self.path, ttl=60, max_entries=10)
+        self.assertEqual(cache.get("files", "hash"), {"data": {}})
+
+    def test_expired(self):
+        cache = ResponseCache(self.path, ttl=-1, max_entries=10)
+        cache.set("files", "hash", {"data": {}})
+        self.assertIsNone(cache.get("files", "hash"))
+        self.assertEqual(cache.get("files", "hash", allow_expired=True), {"data": {}})
+
+    def test_max_entries(self):
+        cache = ResponseCache(self.path, ttl=60, max_entries=2)
+        cache.set("files", "a", {"data": "a"})
+        cache.set("files", "b", {"data": "b"})
+        # Access "a" so that "b" is the least recently used.
+        cache.get("files", "a")
+        cache.set("files", "c", {"data": "c"})
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get("files", "b"))
+        self.assertIsNotNone(cache.get("files", "a"))
+
+    def test_quota(self):
+        cache = ResponseCache(self.path, ttl=60, max_entries=10)
+        self.assertEqual(cache.requests_today(), 0)
+        cache.count_request()
+        cache.count_request()
+        self.assertEqual(cache.requests_today(), 2)
+
+
+class VirusTotalClientCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.helper = MagicMock()
+        self.helper.metric.activated = False
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def create_client(self, ttl, daily_quota=0, quota_reserve=0):
+        cache = ResponseCache(
+            str(Path(self.directory.name) / "cache.db"), ttl=ttl, max_entries=10
+        )
+        client = VirusTotalClient(
+            self.helper,
+            "https://www.virustotal.com/api/v3/",
+            "token",
+            cache=cache,
+            daily_quota=daily_quota,
+            quota_reserve=quota_reserve,
+        )
+        client._query = MagicMock(return_value={"data": {"id": "8.8.8.8"}})
+        return client
+
+    def test_cache_hit(self):
+        client = self.create_client(ttl=60)
+        client.get_ip_info("8.8.8.8")
+        client.get_ip_info("8.8.8.8")
+        client._query.assert_called_once_with(
+            "https://www.virustotal.com/api/v3/ip_addresses/8.8.8.8"
+        )
+        self.assertEqual(client.cache_hit_ratio, 0.5)
+
+    def test_errors_not_cached(self):
+        client = self.create_client(ttl=60)
+        client._query.return_value = {"error": {"code": "NotFoundError"}}
+        client.get_ip_info("8.8.8.8")
+        client.get_ip_info("8.8.8.8")
+        self.assertEqual(client._query.call_count, 2)
+
+    def test_refresh(self):
+        client = self.create_client(ttl=60)
+        client.get_file_info("hash")
+        client.get_file_info("hash", refresh=True)
+        self.assertEqual(client._query.call_count, 2)
+
+    def test_expired_used_near_quota_exhaustion(self):
+        client = self.create_client(ttl=-1, daily_quota=10, quota_reserve=5)
+        client.get_domain_info("example.com")
+        client.get_domain_info("example.com")
+        self.assertEqual(client._query.call_count, 2)
+
+        for _ in range(5):
+            client.cache.count_request()
+        self.assertEqual(client.quota_remaining, 5)
+        client.get_domain_info("example.com")
+        self.assertEqual(client._query.call_count, 2)
@@ -3,8 +3,8 @@ import sys
 import time
 
 import yaml
-import yara
 from pycti import OpenCTIConnectorHelper, StixCoreRelationship, get_config_variable
+from ruleset import YaraRuleset
 from stix2 import Bundle, Relationship
 
 
@@ -20,6 +20,20 @@ class YaraConnector:
         self.octi_api_url = get_config_variable(
             "OPENCTI_URL", ["opencti", "url"], config
         )
+        rules_cache_dir = get_config_variable(
+            "YARA_RULES_CACHE_DIR",
+            ["yara", "rules_cache_dir"],
+            config,
+            default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache"),
+        )
+        rules_refresh_interval = get_config_variable(
+            "YARA_RULES_REFRESH_INTERVAL",
+            ["yara", "rules_refresh_interval"],
+            config,
+            isNumber=True,
+            default=300,
+        )
+        self.ruleset = YaraRuleset(self.helper, rules_cache_dir, rules_refresh_interval)
 
     def _get_artifact(self, entity_id):
         self.helper.log_debug("Getting Artifact from OpenCTI")
@@ -52,66 +66,27 @@ class YaraConnector:
         file_content = self.helper.api.fetch_opencti_file(file_url, binary=True)
         return file_content
 
-    def _get_yara_indicators(self) -> list:
-        self.helper.log_debug("Getting all YARA Indicators in OpenCTI")
-
-        data = {"pagination": {"hasNextPage": True, "endCursor": None}}
-        customAttributes = """
-        id
-        name
-        standard_id
-        pattern
-        pattern_type
-        """
-        while data["pagination"]["hasNextPage"]:
-            after = data["pagination"]["endCursor"]
-            data = self.helper.api.indicator.list(
-                first=1000,
-                after=after,
-                filters={
-                    "mode": "and",
-                    "filters": [{"key": "pattern_type", "values": ["yara"]}],
-                    "filterGroups": [],
-                },
-                orderBy="created_at",
-                orderMode="asc",
-                withPagination=True,
-                customAttributes=customAttributes,
-            )
-        return data["entities"]
-
-    def _scan_artifact(self, artifact, yara_indicators) -> None:
+    def _scan_artifact(self, artifact) -> None:
         self.helper.log_debug("Scanning Artifact contents with YARA")
 
         artifact_contents = self._get_artifact_contents(artifact)
 
         bundle_objects = []
 
-        for indicator in yara_indicators:
-            try:
-                rule_content = indicator["pattern"]
-                rule = yara.compile(source=rule_content)
-            except yara.SyntaxError:
-                self.helper.log_debug(
-                    f"Encountered YARA syntax error {indicator['name']}"
-                )
-                continue
-
-            results = rule.match(data=artifact_contents, timeout=60)
-            if results:
-                relationship = Relationship(
-                    id=StixCoreRelationship.generate_id(
-                        "related-to", artifact["standard_id"], indicator["standard_id"]
-                    ),
-                    relationship_type="related-to",
-                    source_ref=artifact["standard_id"],
-                    target_ref=indicator["standard_id"],
-                    description="YARA rule matched for this Artifact",
-                )
-                bundle_objects.append(relationship)
-                self.helper.log_debug(
-                    f"Created Relationship from Artifact to YARA Indicator {indicator['name']}"
-                )
+        for indicator in self.ruleset.match(artifact_contents):
+            relationship = Relationship(
+                id=StixCoreRelationship.generate_id(
+                    "related-to", artifact["standard_id"], indicator["standard_id"]
+                ),
+                relationship_type="related-to",
+                source_ref=artifact["standard_id"],
+                target_ref=indicator["standard_id"],
+                description="YARA rule matched for this Artifact",
+            )
+            bundle_objects.append(relationship)
+            self.helper.log_debug(
+                f"Created Relationship from Artifact to YARA Indicator {indicator['name']}"
+            )
 
         if any(bundle_objects):
             bundle = Bundle(objects=bundle_objects).serialize()
@@ -125,11 +100,10 @@ class YaraConnector:
 
         artifact = self._get_artifact(entity_id)
 
-        yara_indicators = self._get_yara_indicators()
-        if any(yara_indicators):
-            rule_count = len(yara_indicators)
+        rule_count = len(self.ruleset)
+        if rule_count > 0:
             self.helper.log_debug(f"Scanning an Artifact with {rule_count} rules")
-            self._scan_artifact(artifact, yara_indicators)
+            self._scan_artifact(artifact)
         else:
             self.helper.log_debug("No YARA Indicators to match")
             response = "No YARA Indicators to match"
@@ -139,6 +113,8 @@ class YaraConnector:
     # Start the main loop
     def start(self) -> None:
         self.helper.log_info("YARA connector started")
+        self.ruleset.load()
+        self.ruleset.start_refresh()
         self.helper.listen(self._process_message)
 
 
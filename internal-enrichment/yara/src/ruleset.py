@@ -0,0 +1,206 @@
+import json
+import os
+import threading
+import time
+
+import yara
+
+INDICATOR_ATTRIBUTES = """
+    id
+    name
+    standard_id
+    pattern
+    pattern_type
+    modified
+"""
+
+# Deleted indicators (or indicators no longer of the YARA pattern type) are not
+# returned by the delta query, a full synchronization removes them.
+FULL_SYNC_INTERVAL = 24 * 60 * 60
+
+
+class YaraRuleset:
+    """
+    All the YARA indicators of the platform compiled into a single ruleset.
+
+    Every indicator is compiled in its own namespace (the indicator id), so a
+    single match() call scans an artifact against all the rules and each
+    matching rule maps back to its indicator. The compiled rules and the
+    indicators are saved in the cache directory and reused at restart, then
+    only the indicators modified since the last synchronization are fetched.
+    """
+
+    def __init__(self, helper, cache_dir: str, refresh_interval: int):
+        self.helper = helper
+        self.refresh_interval = refresh_interval
+        self.rules_path = os.path.join(cache_dir, "rules.yarc")
+        self.indicators_path = os.path.join(cache_dir, "indicators.json")
+        os.makedirs(cache_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._rules = None
+        self._indicators = {}
+        self._last_modified = None
+        self._last_full_sync = 0
+
+    def __len__(self):
+        return len(self._indicators)
+
+    def _list_indicators(self, modified_after=None) -> list:
+        filters = [{"key": "pattern_type", "values": ["yara"]}]
+        if modified_after is not None:
+            filters.append(
+                {"key": "modified", "values": [modified_after], "operator": "gte"}
+            )
+
+        indicators = []
+        data = {"pagination": {"hasNextPage": True, "endCursor": None}}
+        while data["pagination"]["hasNextPage"]:
+            after = data["pagination"]["endCursor"]
+            data = self.helper.api.indicator.list(
+                first=1000,
+                after=after,
+                filters={"mode": "and", "filters": filters, "filterGroups": []},
+                orderBy="created_at",
+                orderMode="asc",
+                withPagination=True,
+                customAttributes=INDICATOR_ATTRIBUTES,
+            )
+            indicators.extend(data["entities"])
+        return indicators
+
+    def _is_valid(self, indicator) -> bool:
+        try:
+            yara.compile(source=indicator["pattern"])
+            return True
+        except yara.Error:
+            self.helper.log_debug(f"Encountered YARA syntax error {indicator['name']}")
+            return False
+
+    def _merge(self, indicators, indexed) -> int:
+        changes = 0
+        for indicator in indicators:
+            if self._last_modified is None or indicator["modified"] > (
+                self._last_modified
+            ):
+                self._last_modified = indicator["modified"]
+            # A rule is checked once when it appears or changes, so an invalid
+            # rule never breaks the compilation of the whole ruleset
+            known = self._indicators.get(indicator["id"])
+            if known is not None and known["pattern"] == indicator["pattern"]:
+                continue
+            changes += 1
+            if self._is_valid(indicator):
+                indexed[indicator["id"]] = {
+                    "name": indicator["name"],
+                    "standard_id": indicator["standard_id"],
+                    "pattern": indicator["pattern"],
+                }
+            else:
+                indexed.pop(indicator["id"], None)
+        return changes
+
+    def _compile(self, indicators):
+        if not indicators:
+            return None
+        return yara.compile(
+            sources={
+                indicator_id: indicator["pattern"]
+                for indicator_id, indicator in indicators.items()
+            }
+        )
+
+    def _save(self) -> None:
+        if self._rules is not None:
+            self._rules.save(self.rules_path)
+        elif os.path.exists(self.rules_path):
+            os.remove(self.rules_path)
+        with open(self.indicators_path, "w") as f:
+            json.dump(
+                {"last_modified": self._last_modified, "indicators": self._indicators},
+                f,
+            )
+
+    def _load_cache(self) -> bool:
+        if not os.path.exists(self.indicators_path):
+            return False
+        try:
+            with open(self.indicators_path) as f:
+                cache = json.load(f)
+            indicators = cache["indicators"]
+            rules = yara.load(self.rules_path) if indicators else None
+        except (OSError, ValueError, KeyError, yara.Error) as e:
+            self.helper.log_warning(f"Unable to load the YARA rules cache: {e}")
+            return False
+        with self._lock:
+            self._rules = rules
+            self._indicators = indicators
+            self._last_modified = cache["last_modified"]
+        return True
+
+    def full_sync(self) -> None:
+        indicators = self._list_indicators()
+        known_ids = {indicator["id"] for indicator in indicators}
+        indexed = {
+            indicator_id: indicator
+            for indicator_id, indicator in self._indicators.items()
+            if indicator_id in known_ids
+        }
+        self._last_modified = None
+        self._merge(indicators, indexed)
+        self._update(indexed)
+        self._last_full_sync = time.time()
+
+    def delta_sync(self) -> None:
+        indexed = dict(self._indicators)
+        if self._merge(self._list_indicators(self._last_modified), indexed) > 0:
+            self._update(indexed)
+
+    def _update(self, indexed) -> None:
+        rules = self._compile(indexed)
+        with self._lock:
+            self._rules = rules
+            self._indicators = indexed
+        self._save()
+        self.helper.log_info(f"YARA ruleset compiled with {len(indexed)} rules")
+
+    def load(self) -> None:
+        if self._load_cache():
+            self.helper.log_info(
+                f"YARA ruleset loaded from cache with {len(self)} rules"
+            )
+            self.delta_sync()
+        else:
+            self.full_sync()
+
+    def refresh(self) -> None:
+        if time.time() - self._last_full_sync >= FULL_SYNC_INTERVAL:
+            self.full_sync()
+        else:
+            self.delta_sync()
+
+    def start_refresh(self) -> None:
+        def refresh_loop():
+            while True:
+                time.sleep(self.refresh_interval)
+                try:
+                    self.refresh()
+                except Exception as e:
+                    self.helper.log_error(f"Unable to refresh the YARA ruleset: {e}")
+
+        threading.Thread(target=refresh_loop, daemon=True).start()
+
+    def match(self, data: bytes) -> list:
+        with self._lock:
+            rules = self._rules
+            indicators = self._indicators
+        if rules is None:
+            return []
+
+        # Several rules of the same indicator can match, report it once
+        namespaces = dict.fromkeys(
+            match.namespace for match in rules.match(data=data, timeout=60)
+        )
+        return [
+            indicators[namespace] for namespace in namespaces if namespace in indicators
+        ]
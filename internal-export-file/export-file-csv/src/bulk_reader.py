@@ -0,0 +1,66 @@
+from concurrent.futures import ThreadPoolExecutor
+
+# Ids resolved per API call
+BATCH_SIZE = 200
+
+# API calls running at the same time
+MAX_WORKERS = 4
+
+
+class BulkReader:
+    """
+    Read lists of entities by id in a few paginated API calls.
+
+    The ids are resolved in batches with an `id` filter, by the first entity
+    class which knows them (domain objects, then observables, then the
+    relationships for instance), the batches of a class being listed
+    concurrently. It replaces one or more `read` calls per id.
+    """
+
+    def __init__(self, helper, batch_size=BATCH_SIZE, max_workers=MAX_WORKERS):
+        self.helper = helper
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+
+    def _list_batch(self, reader, ids, kwargs):
+        filters = {
+            "mode": "and",
+            "filters": [{"key": "id", "values": ids}],
+            "filterGroups": [],
+        }
+        return reader.list(filters=filters, first=len(ids), **kwargs)
+
+    def read(self, ids, readers):
+        """
+        Read the entities of the ids with the readers, a list of pycti entity
+        classes or of (entity class, list arguments) pairs tried in order.
+
+        Returns the entities by requested id, unknown ids are left out.
+        """
+        entities = {}
+        remaining = list(dict.fromkeys(ids))
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for reader in readers:
+                if not remaining:
+                    break
+                reader, kwargs = reader if isinstance(reader, tuple) else (reader, {})
+                batches = [
+                    remaining[i : i + self.batch_size]
+                    for i in range(0, len(remaining), self.batch_size)
+                ]
+                for batch_entities in executor.map(
+                    lambda batch: self._list_batch(reader, batch, kwargs), batches
+                ):
+                    for entity in batch_entities:
+                        # The id filter also matches the standard and STIX ids
+                        keys = [entity.get("id"), entity.get("standard_id")]
+                        keys += entity.get("x_opencti_stix_ids") or []
+                        for key in keys:
+                            if key is not None:
+                                entities.setdefault(key, entity)
+                remaining = [id for id in remaining if id not in entities]
+        result = {id: entities[id] for id in ids if id in entities}
+        self.helper.connector_logger.info(
+            "Entities read", {"requested": len(set(ids)), "found": len(result)}
+        )
+        return result
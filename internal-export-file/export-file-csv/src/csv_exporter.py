@@ -0,0 +1,319 @@
+import csv
+import io
+import json
+import re
+import tempfile
+import uuid
+
+from pycti.utils.constants import IdentityTypes, LocationTypes, StixCyberObservableTypes
+
+# Entities fetched per API call when paging through a list
+PAGE_SIZE = 500
+
+# Rows are kept in memory up to this size, then spilled to disk
+SPOOL_MAX_SIZE = 16 * 1024 * 1024
+
+# Read size of the uploaded file
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+HASH_HEADERS = {
+    "hashes.MD5": "MD5",
+    "hashes_SHA-1": "SHA-1",
+    "hashes_SHA-256": "SHA-256",
+    "hashes_SHA-512": "SHA-512",
+    "hashes_SSDEEP": "SSDEEP",
+}
+
+# Keys added by pycti when it processes the result of a query
+CONNECTION_FIELDS = [
+    "objectMarking",
+    "objectLabel",
+    "reports",
+    "notes",
+    "opinions",
+    "observedData",
+    "killChainPhases",
+    "externalReferences",
+    "objects",
+    "observables",
+    "stixCoreRelationships",
+    "indicators",
+    "importFiles",
+]
+RENAMED_FIELDS = {"name_alt": "name", "content_alt": "content"}
+
+GRAPHQL_TOKENS = re.compile(
+    r"\.\.\.\s*on\s+\w+|\w+\s*:\s*\w+|\w+|\([^)]*\)|[{}]", re.MULTILINE
+)
+
+EXPORT_PUSH_MUTATIONS = {
+    "Stix-Cyber-Observable": """
+        mutation StixCyberObservablesExportPush($entity_id: String, $entity_type: String!, $file: Upload!, $listFilters: String) {
+            stixCyberObservablesExportPush(entity_id: $entity_id, entity_type: $entity_type, file: $file, listFilters: $listFilters)
+        }
+    """,
+    "Stix-Core-Object": """
+        mutation StixCoreObjectsExportPush($entity_id: String, $entity_type: String!, $file: Upload!, $listFilters: String) {
+            stixCoreObjectsExportPush(entity_id: $entity_id, entity_type: $entity_type, file: $file, listFilters: $listFilters)
+        }
+    """,
+    "Stix-Domain-Object": """
+        mutation StixDomainObjectsExportPush($entity_id: String, $entity_type: String!, $file: Upload!, $listFilters: String) {
+            stixDomainObjectsExportPush(entity_id: $entity_id, entity_type: $entity_type, file: $file, listFilters: $listFilters)
+        }
+    """,
+}
+ENTITY_EXPORT_PUSH_MUTATION = """
+    mutation StixDomainObjectEdit($id: ID!, $file: Upload!) {
+        stixDomainObjectEdit(id: $id) {
+            exportPush(file: $file)
+        }
+    }
+"""
+
+
+def get_lister(api, entity_type):
+    """Return the pycti entity class listing the entity type."""
+    if IdentityTypes.has_value(entity_type):
+        entity_type = "Identity"
+    elif LocationTypes.has_value(entity_type):
+        entity_type = "Location"
+    elif StixCyberObservableTypes.has_value(entity_type):
+        entity_type = "Stix-Cyber-Observable"
+    elif entity_type == "Container":
+        entity_type = "Stix-Domain-Object"
+    elif entity_type == "Threat-Actor":
+        entity_type = "Threat-Actor-Group"
+    lister = getattr(api, entity_type.lower().replace("-", "_"), None)
+    if lister is None or not hasattr(lister, "list"):
+        raise ValueError("Unable to export the unknown entity type " + entity_type)
+    return lister
+
+
+def iter_entities(lister, **kwargs):
+    """Page through a list with the API cursor, one entity at a time."""
+    after = None
+    while True:
+        result = lister.list(
+            first=PAGE_SIZE, after=after, withPagination=True, **kwargs
+        )
+        yield from result["entities"]
+        pagination = result["pagination"]
+        if not pagination.get("hasNextPage") or not pagination.get("endCursor"):
+            return
+        after = pagination["endCursor"]
+
+
+def schema_headers(*properties):
+    """
+    Compute the CSV headers from the GraphQL properties queried for the
+    entities: the top level fields of every fragment, as they are returned
+    by pycti.
+    """
+    fields = set()
+    for selection in properties:
+        # True for the braces of an inline fragment, which fields stay at
+        # the level of the enclosing selection
+        stack = []
+        fragment = False
+        for token in GRAPHQL_TOKENS.findall(selection):
+            if token == "{":
+                stack.append(fragment)
+                fragment = False
+            elif token == "}":
+                stack.pop()
+            elif token.startswith("..."):
+                fragment = True
+            elif token.startswith("("):
+                continue
+            elif all(stack):
+                # The key of an aliased field is the alias
+                fields.add(token.split(":")[0].strip())
+    for field in CONNECTION_FIELDS:
+        if field in fields:
+            fields.add(field + "Ids")
+    if "createdBy" in fields:
+        fields.add("createdById")
+    for alias, name in RENAMED_FIELDS.items():
+        if alias in fields:
+            fields.remove(alias)
+            fields.add(name)
+    headers = sorted(fields)
+    if "hashes" in headers:
+        headers = headers + list(HASH_HEADERS)
+    return headers
+
+
+def format_value(value):
+    if isinstance(value, str):
+        return value
+    if isinstance(value, int):
+        return str(value)
+    if isinstance(value, list):
+        if len(value) > 0 and isinstance(value[0], str):
+            return ",".join(value)
+        if len(value) > 0 and isinstance(value[0], dict):
+            values = []
+            for item in value:
+                for key in ["name", "definition", "value", "observable_value"]:
+                    if key in item:
+                        values.append(item[key])
+                        break
+            return ",".join(values)
+        return ""
+    if isinstance(value, dict):
+        for key in ["name", "value", "observable_value"]:
+            if key in value:
+                return value[key]
+    return ""
+
+
+class CsvExporter:
+    """
+    Write entities as CSV rows into a spooled temporary file.
+
+    The headers are known before the first row, the value of every column is
+    read by an accessor built once for all the rows.
+    """
+
+    def __init__(self, headers, delimiter):
+        self.headers = headers
+        self.delimiter = delimiter
+        self.rows = 0
+        self._accessors = [self._accessor(header) for header in headers]
+        self._with_hashes = any(header in HASH_HEADERS for header in headers)
+
+    @staticmethod
+    def _accessor(header):
+        if header in HASH_HEADERS:
+            algorithm = HASH_HEADERS[header]
+            return lambda entity, hashes: hashes.get(algorithm, "")
+        return lambda entity, hashes: format_value(entity.get(header))
+
+    def _row(self, entity):
+        hashes = {}
+        if self._with_hashes and entity.get("hashes"):
+            hashes = {item["algorithm"]: item["hash"] for item in entity["hashes"]}
+        return [accessor(entity, hashes) for accessor in self._accessors]
+
+    def write(self, entities):
+        """Write the entities, return the file positioned at its start."""
+        output = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+        text = io.TextIOWrapper(output, encoding="utf-8", errors="replace", newline="")
+        writer = csv.writer(
+            text,
+            delimiter=self.delimiter,
+            quotechar='"',
+            quoting=csv.QUOTE_ALL,
+        )
+        writer.writerow(self.headers)
+        for entity in entities:
+            writer.writerow(self._row(entity))
+            self.rows += 1
+        text.flush()
+        text.detach()
+        output.seek(0)
+        return output
+
+
+class MultipartStream:
+    """
+    GraphQL multipart request (file upload) read from the file, so the whole
+    export is never loaded in memory to be sent.
+    """
+
+    def __init__(self, query, variables, file_name, file, mime_type):
+        self.boundary = uuid.uuid4().hex
+        operations = json.dumps(
+            {"query": query, "variables": dict(variables, file=None)}
+        )
+        head = (
+            self._field("operations", operations)
+            + self._field("map", json.dumps({"0": ["variables.file"]}))
+            + (
+                f"--{self.boundary}\r\n"
+                f'Content-Disposition: form-data; name="0"; filename="{file_name}"\r\n'
+                f"Content-Type: {mime_type}\r\n\r\n"
+            )
+        ).encode("utf-8")
+        tail = f"\r\n--{self.boundary}--\r\n".encode("utf-8")
+        file.seek(0, io.SEEK_END)
+        self.length = len(head) + file.tell() + len(tail)
+        file.seek(0)
+        self._parts = [io.BytesIO(head), file, io.BytesIO(tail)]
+
+    def _field(self, name, value):
+        return (
+            f"--{self.boundary}\r\n"
+            f'Content-Disposition: form-data; name="{name}"\r\n\r\n'
+            f"{value}\r\n"
+        )
+
+    @property
+    def content_type(self):
+        return "multipart/form-data; boundary=" + self.boundary
+
+    def __len__(self):
+        return self.length
+
+    def __iter__(self):
+        while True:
+            chunk = self.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                return
+            yield chunk
+
+    def read(self, size=-1):
+        chunks = []
+        while self._parts and (size < 0 or size > 0):
+            chunk = self._parts[0].read(size)
+            if not chunk:
+                self._parts.pop(0)
+                continue
+            chunks.append(chunk)
+            if size > 0:
+                size -= len(chunk)
+        return b"".join(chunks)
+
+
+def push_export(api, query, variables, file_name, file, mime_type="text/plain"):
+    """Upload an export file with a streamed request."""
+    body = MultipartStream(query, variables, file_name, file, mime_type)
+    headers = dict(api.request_headers, **{"Content-Type": body.content_type})
+    response = api.session.post(
+        api.api_url,
+        data=body,
+        headers=headers,
+        verify=api.ssl_verify,
+        cert=api.cert,
+        proxies=api.proxies,
+    )
+    if response.status_code != 200:
+        raise ValueError(response.text)
+    result = response.json()
+    if "errors" in result:
+        raise ValueError(result["errors"][0]["message"])
+    return result
+
+
+def push_list_export(api, entity_id, entity_type, file_name, file, list_filters):
+    query = EXPORT_PUSH_MUTATIONS.get(
+        entity_type, EXPORT_PUSH_MUTATIONS["Stix-Domain-Object"]
+    )
+    return push_export(
+        api,
+        query,
+        {
+            "entity_id": entity_id,
+            "entity_type": entity_type,
+            "listFilters": list_filters,
+        },
+        file_name,
+        file,
+    )
+
+
+def push_entity_export(api, entity_id, file_name, file):
+    return push_export(
+        api, ENTITY_EXPORT_PUSH_MUTATION, {"id": entity_id}, file_name, file
+    )
@@ -1,11 +1,18 @@
-import csv
-import io
 import json
 import os
 import sys
 import time
 
 import yaml
+from bulk_reader import BulkReader
+from csv_exporter import (
+    CsvExporter,
+    get_lister,
+    iter_entities,
+    push_entity_export,
+    push_list_export,
+    schema_headers,
+)
 from pycti import OpenCTIConnectorHelper, get_config_variable
 
 
@@ -26,73 +33,41 @@ class ExportFileCsv:
             False,
             ";",
         )
+        self.bulk_reader = BulkReader(self.helper)
 
-    def export_dict_list_to_csv(self, data):
-        output = io.StringIO()
-        headers = sorted(set().union(*(d.keys() for d in data)))
-        if "hashes" in headers:
-            headers = headers + [
-                "hashes.MD5",
-                "hashes_SHA-1",
-                "hashes_SHA-256",
-                "hashes_SHA-512",
-                "hashes_SSDEEP",
-            ]
-        csv_data = [headers]
-        for d in data:
-            row = []
-            for h in headers:
-                if h.startswith("hashes_") and "hashes" in d:
-                    hashes = {}
-                    for hash in d["hashes"]:
-                        hashes[hash["algorithm"]] = hash["hash"]
-                    if h.split("_")[1] in hashes:
-                        row.append(hashes[h.split("_")[1]])
-                    else:
-                        row.append("")
-                elif h not in d:
-                    row.append("")
-                elif isinstance(d[h], str):
-                    row.append(d[h])
-                elif isinstance(d[h], int):
-                    row.append(str(d[h]))
-                elif isinstance(d[h], list):
-                    if len(d[h]) > 0 and isinstance(d[h][0], str):
-                        row.append(",".join(d[h]))
-                    elif len(d[h]) > 0 and isinstance(d[h][0], dict):
-                        rrow = []
-                        for r in d[h]:
-                            if "name" in r:
-                                rrow.append(r["name"])
-                            elif "definition" in r:
-                                rrow.append(r["definition"])
-                            elif "value" in r:
-                                rrow.append(r["value"])
-                            elif "observable_value" in r:
-                                rrow.append(r["observable_value"])
-                        row.append(",".join(rrow))
-                    else:
-                        row.append("")
-                elif isinstance(d[h], dict):
-                    if "name" in d[h]:
-                        row.append(d[h]["name"])
-                    elif "value" in d[h]:
-                        row.append(d[h]["value"])
-                    elif "observable_value" in d[h]:
-                        row.append(d[h]["observable_value"])
-                    else:
-                        row.append("")
-                else:
-                    row.append("")
-            csv_data.append(row)
-        writer = csv.writer(
-            output,
-            delimiter=self.export_file_csv_delimiter,
-            quotechar='"',
-            quoting=csv.QUOTE_ALL,
+    def _read_entity(self, entity_id, readers):
+        for reader in readers:
+            entity = reader.read(id=entity_id)
+            if entity is not None:
+                return entity
+        return None
+
+    def _export_csv(self, headers, entities):
+        exporter = CsvExporter(headers, self.export_file_csv_delimiter)
+        csv_file = exporter.write(entities)
+        self.helper.connector_logger.info(
+            "CSV written", {"rows": exporter.rows, "columns": len(headers)}
         )
-        writer.writerows(csv_data)
-        return output.getvalue()
+        return csv_file
+
+    def _container_entities(self, entity_data):
+        members = self.bulk_reader.read(
+            entity_data.get("objectsIds") or [],
+            [
+                self.helper.api_impersonate.stix_domain_object,
+                self.helper.api_impersonate.stix_cyber_observable,
+            ],
+        )
+        yield from members.values()
+        yield entity_data
+
+    def _selected_entities(self, selected_ids, readers):
+        entities = self.bulk_reader.read(selected_ids, readers)
+        if len(entities) < len(set(selected_ids)):
+            raise ValueError(
+                "Unable to read/access to the entity, please check that the connector permission. Please note that all export files connectors should have admin permission as they impersonate the user requesting the export to avoir data leak."
+            )
+        return [entities[selected_id] for selected_id in selected_ids]
 
     def _process_message(self, data):
         file_name = data["file_name"]
@@ -111,44 +86,33 @@ class ExportFileCsv:
                     "file_name": file_name,
                 },
             )
-            entity_data = self.helper.api_impersonate.stix_domain_object.read(
-                id=entity_id
-            )
-            if entity_data is None:
-                entity_data = self.helper.api_impersonate.stix_cyber_observable.read(
-                    id=entity_id
-                )
+            readers = [
+                self.helper.api_impersonate.stix_domain_object,
+                self.helper.api_impersonate.stix_cyber_observable,
+            ]
+            entity_data = self._read_entity(entity_id, readers)
             if entity_data is None:
                 raise ValueError(
                     "Unable to read/access to the entity, please check that the connector permission. Please note that all export files connectors should have admin permission as they impersonate the user requesting the export to avoir data leak."
                 )
-            entities_list = []
-            if "objectsIds" in entity_data:
-                for id in entity_data["objectsIds"]:
-                    entity = self.helper.api_impersonate.stix_domain_object.read(id=id)
-                    if entity is None:
-                        entity = self.helper.api_impersonate.stix_cyber_observable.read(
-                            id=id
-                        )
-                    if entity is not None:
-                        del entity["objectLabelIds"]
-                        entities_list.append(entity)
-                del entity_data["objectsIds"]
-            if "objectLabelIds" in entity_data:
-                del entity_data["objectLabelIds"]
-            entities_list.append(entity_data)
-            csv_data = self.export_dict_list_to_csv(entities_list)
-            self.helper.connector_logger.info(
-                "Uploading",
-                {
-                    "entity_id": entity_id,
-                    "export_type": export_type,
-                    "file_name": file_name,
-                },
-            )
-            self.helper.api.stix_domain_object.push_entity_export(
-                entity_id, file_name, csv_data
-            )
+            # The labels and the container objects are not exported
+            headers = [
+                header
+                for header in schema_headers(*(reader.properties for reader in readers))
+                if header not in ["objectLabelIds", "objectsIds"]
+            ]
+            with self._export_csv(
+                headers, self._container_entities(entity_data)
+            ) as csv_file:
+                self.helper.connector_logger.info(
+                    "Uploading",
+                    {
+                        "entity_id": entity_id,
+                        "export_type": export_type,
+                        "file_name": file_name,
+                    },
+                )
+                push_entity_export(self.helper.api, entity_id, file_name, csv_file)
             self.helper.connector_logger.info(
                 "Export done",
                 {
@@ -161,37 +125,15 @@ class ExportFileCsv:
 
         else:  # list export: export_scope = 'query' or 'selection'
             if export_scope == "selection":
-                selected_ids = data["selected_ids"]
                 list_filters = "selected_ids"
-                entities_list = []
-
-                for selected_id in selected_ids:
-                    entity_data = self.helper.api_impersonate.stix_domain_object.read(
-                        id=selected_id
-                    )
-                    if entity_data is None:
-                        entity_data = (
-                            self.helper.api_impersonate.stix_cyber_observable.read(
-                                id=selected_id
-                            )
-                        )
-                    if entity_data is None:
-                        entity_data = (
-                            self.helper.api_impersonate.stix_core_relationship.read(
-                                id=selected_id
-                            )
-                        )
-                    if entity_data is None:
-                        entity_data = (
-                            self.helper.api_impersonate.stix_sighting_relationship.read(
-                                id=selected_id
-                            )
-                        )
-                    if entity_data is None:
-                        raise ValueError(
-                            "Unable to read/access to the entity, please check that the connector permission. Please note that all export files connectors should have admin permission as they impersonate the user requesting the export to avoir data leak."
-                        )
-                    entities_list.append(entity_data)
+                readers = [
+                    self.helper.api_impersonate.stix_domain_object,
+                    self.helper.api_impersonate.stix_cyber_observable,
+                    self.helper.api_impersonate.stix_core_relationship,
+                    self.helper.api_impersonate.stix_sighting_relationship,
+                ]
+                headers = schema_headers(*(reader.properties for reader in readers))
+                entities = self._selected_entities(data["selected_ids"], readers)
 
             else:  # export_scope = 'query'
                 list_params = data["list_params"]
@@ -203,43 +145,38 @@ class ExportFileCsv:
                         "file_name": file_name,
                     },
                 )
-                entities_list = self.helper.api_impersonate.stix2.export_entities_list(
-                    entity_type=entity_type,
+                lister = get_lister(self.helper.api_impersonate, entity_type)
+                headers = schema_headers(lister.properties)
+                # Streamed page by page from the API, never held in memory
+                entities = iter_entities(
+                    lister,
                     search=list_params.get("search"),
                     filters=list_params.get("filters"),
                     orderBy=list_params["orderBy"],
                     orderMode=list_params["orderMode"],
-                    getAll=True,
                 )
                 list_filters = json.dumps(list_params)
 
-            if entities_list is not None:
-                csv_data = self.export_dict_list_to_csv(entities_list)
+            with self._export_csv(headers, entities) as csv_file:
                 self.helper.log_info(
                     "Uploading: " + entity_type + "/" + export_type + " to " + file_name
                 )
-                if entity_type == "Stix-Cyber-Observable":
-                    self.helper.api.stix_cyber_observable.push_list_export(
-                        entity_id, entity_type, file_name, csv_data, list_filters
-                    )
-                elif entity_type == "Stix-Core-Object":
-                    self.helper.api.stix_core_object.push_list_export(
-                        entity_id, entity_type, file_name, csv_data, list_filters
-                    )
-                else:
-                    self.helper.api.stix_domain_object.push_list_export(
-                        entity_id, entity_type, file_name, csv_data, list_filters
-                    )
-                self.helper.connector_logger.info(
-                    "Export done",
-                    {
-                        "entity_type": entity_type,
-                        "export_type": export_type,
-                        "file_name": file_name,
-                    },
+                push_list_export(
+                    self.helper.api,
+                    entity_id,
+                    entity_type,
+                    file_name,
+                    csv_file,
+                    list_filters,
                 )
-            else:
-                raise ValueError("An error occurred, the list is empty")
+            self.helper.connector_logger.info(
+                "Export done",
+                {
+                    "entity_type": entity_type,
+                    "export_type": export_type,
+                    "file_name": file_name,
+                },
+            )
 
         return "Export done"
 
@@ -4,6 +4,7 @@ import sys
 import time
 
 import yaml
+from bulk_reader import BulkReader
 from pycti import OpenCTIConnectorHelper
 
 
@@ -17,6 +18,7 @@ class ExportFileStix:
             else {}
         )
         self.helper = OpenCTIConnectorHelper(config)
+        self.bulk_reader = BulkReader(self.helper)
 
     def _process_message(self, data):
         file_name = data["file_name"]
@@ -65,31 +67,22 @@ class ExportFileStix:
             if export_scope == "selection":
                 selected_ids = data["selected_ids"]
                 list_filters = "selected_ids"
-                entities_list = []
-
-                for selected_id in selected_ids:
-                    entity_data = self.helper.api_impersonate.stix_domain_object.read(
-                        id=selected_id, withFiles=True
-                    )
-                    if entity_data is None:
-                        entity_data = (
-                            self.helper.api_impersonate.stix_cyber_observable.read(
-                                id=selected_id, withFiles=True
-                            )
-                        )
-                    if entity_data is None:
-                        entity_data = (
-                            self.helper.api_impersonate.stix_core_relationship.read(
-                                id=selected_id
-                            )
-                        )
-                    if entity_data is None:
-                        entity_data = (
-                            self.helper.api_impersonate.stix_sighting_relationship.read(
-                                id=selected_id
-                            )
-                        )
-                    entities_list.append(entity_data)
+                entities = self.bulk_reader.read(
+                    selected_ids,
+                    [
+                        (
+                            self.helper.api_impersonate.stix_domain_object,
+                            {"withFiles": True},
+                        ),
+                        (
+                            self.helper.api_impersonate.stix_cyber_observable,
+                            {"withFiles": True},
+                        ),
+                        self.helper.api_impersonate.stix_core_relationship,
+                        self.helper.api_impersonate.stix_sighting_relationship,
+                    ],
+                )
+                entities_list = list(entities.values())
 
                 bundle = self.helper.api_impersonate.stix2.export_selected(
                     entities_list, export_type, max_marking
@@ -1,18 +1,27 @@
 import base64
 import datetime
 import io
+import multiprocessing
 import os
 import sys
 import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 
 import cairosvg
 import yaml
-from jinja2 import Environment, FileSystemLoader
+from pdf_renderer import init_worker, render_pdf
 from pycti import OpenCTIConnectorHelper, get_config_variable
 from pycti.utils.constants import StixCyberObservableTypes
 from pygal_maps_world.i18n import COUNTRIES
 from pygal_maps_world.maps import World
-from weasyprint import HTML
+
+# Members read per API call
+BATCH_SIZE = 100
+
+# Targets maps kept, by set of countries
+TARGET_MAP_CACHE_SIZE = 64
 
 
 class ExportReportPdf:
@@ -80,6 +89,9 @@ class ExportReportPdf:
             config,
         )
 
+        self.target_maps = OrderedDict()
+        self.renderer = self._start_renderer()
+
     def _get_readable_date_time(self, str_date_time):
         """
         Convert ISO date times to readable format
@@ -165,64 +177,15 @@ class ExportReportPdf:
             "observables": {},
         }
 
-        # Process each STIX Object
-        for report_obj in report_objs:
-            obj_entity_type = report_obj["entity_type"]
-            obj_id = report_obj["standard_id"]
-
-            # Handle StixCyberObservables entities
-            if obj_entity_type == "StixFile" or StixCyberObservableTypes.has_value(
-                obj_entity_type
-            ):
-                observable_dict = (
-                    self.helper.api_impersonate.stix_cyber_observable.read(id=obj_id)
-                )
-
-                # If only include indicators and
-                # the observable doesn't have an indicator, skip it
-                if self.indicators_only and not observable_dict["indicators"]:
-                    self.helper.log_info(
-                        f"Skipping {obj_entity_type} observable with value {observable_dict['observable_value']} as it was not an Indicator."
-                    )
-                    continue
-
-                if obj_entity_type not in context["observables"]:
-                    context["observables"][obj_entity_type] = []
-
-                # Defang urls
-                if self.defang_urls and obj_entity_type == "Url":
-                    observable_dict["observable_value"] = observable_dict[
-                        "observable_value"
-                    ].replace("http", "hxxp", 1)
-
-                context["observables"][obj_entity_type].append(observable_dict)
-
-            # Handle all other entities
-            else:
-                reader_func = self._get_reader(obj_entity_type)
-                if reader_func is None:
-                    self.helper.log_error(
-                        f'Could not find a function to read entity with type "{obj_entity_type}"'
-                    )
-                    continue
-                entity_dict = reader_func(id=obj_id)
-
-                if obj_entity_type not in context["entities"]:
-                    context["entities"][obj_entity_type] = []
-
-                context["entities"][obj_entity_type].append(entity_dict)
-
-        # Render html with input variables
-        env = Environment(
-            loader=FileSystemLoader(self.current_dir), finalize=self._finalize
+        # Read all the members in a few batched queries
+        members = self._read_entities(
+            [(obj["entity_type"], obj["standard_id"]) for obj in report_objs],
+            with_observables=True,
         )
-        template = env.get_template("resources/report.html")
-        html_string = template.render(context)
+        self._add_members(context, members)
 
-        # Generate pdf from html string
-        pdf_contents = HTML(
-            string=html_string, base_url=f"{self.current_dir}/resources"
-        ).write_pdf()
+        # Render the pdf in the worker process
+        pdf_contents = self._render_pdf("report.html", context)
 
         # Upload the output pdf
         self.helper.log_info(f"Uploading: {file_name}")
@@ -255,20 +218,11 @@ class ExportReportPdf:
             "Intrusion-Set", entity_id, "full"
         )
 
-        for intrusion_set_obj in intrusion_set_objs["objects"]:
-            obj_id = intrusion_set_obj["id"]
-            obj_entity_type = intrusion_set_obj["type"]
-
-            reader_func = self._get_reader(obj_entity_type)
-            if reader_func is None:
-                self.helper.log_error(
-                    f'Could not find a function to read entity with type "{obj_entity_type}"'
-                )
-                continue
-
-            time.sleep(0.3)
-            entity_dict = reader_func(id=obj_id)
-
+        # Read all the objects in a few batched queries
+        members = self._read_entities(
+            [(obj["type"], obj["id"]) for obj in intrusion_set_objs["objects"]]
+        )
+        for obj_entity_type, entity_dict in members:
             # Key names cannot have - in them for jinja2 templating
             obj_entity_type = obj_entity_type.replace("-", "_")
             if obj_entity_type not in context["entities"]:
@@ -276,48 +230,14 @@ class ExportReportPdf:
 
             context["entities"][obj_entity_type].append(entity_dict)
 
-        # Generate the svg img contents for the targets map
+        # Generate the img contents for the targets map
         if "relationship" in context["entities"]:
-            # Create world map
-            world_map = World()
-            world_map.title = "Targeted Countries"
-            targeted_countries = []
-            for relationship in context["entities"]["relationship"]:
-                if (
-                    relationship["entity_type"] == "targets"
-                    and relationship["relationship_type"] == "targets"
-                    and relationship["to"]["entity_type"] == "Country"
-                ):
-                    country_code = relationship["to"]["name"].lower()
-                    if not self._validate_country_code(country_code):
-                        self.helper.log_warning(
-                            f"{country_code} is not a supported country code, skipping..."
-                        )
-                        continue
-
-                    targeted_countries.append(country_code)
-
-            # Build targeted countries image
-            if targeted_countries:
-                world_map.add("Targeted Countries", targeted_countries)
-                # Convert the svg to base64 png
-                svg_bytes = world_map.render()
-                png_bytes = io.BytesIO()
-                cairosvg.svg2png(bytestring=svg_bytes, write_to=png_bytes)
-                base64_png = base64.b64encode(png_bytes.getvalue()).decode()
-                context["target_map_country"] = f"data:image/png;base64, {base64_png}"
-
-        # Render html with input variables
-        env = Environment(
-            loader=FileSystemLoader(self.current_dir), finalize=self._finalize
-        )
-        template = env.get_template("resources/intrusion-set.html")
-        html_string = template.render(context)
+            context["target_map_country"] = self._get_target_map(
+                context["entities"]["relationship"]
+            )
 
-        # Generate pdf from html string
-        pdf_contents = HTML(
-            string=html_string, base_url=f"{self.current_dir}/resources"
-        ).write_pdf()
+        # Render the pdf in the worker process
+        pdf_contents = self._render_pdf("intrusion-set.html", context)
 
         # Upload the output pdf
         self.helper.log_info(f"Uploading: {file_name}")
@@ -350,20 +270,11 @@ class ExportReportPdf:
             "Threat-Actor-Group", entity_id, "full"
         )
 
-        for bundle_obj in bundle["objects"]:
-            obj_id = bundle_obj["id"]
-            obj_entity_type = bundle_obj["type"]
-
-            reader_func = self._get_reader(obj_entity_type)
-            if reader_func is None:
-                self.helper.log_error(
-                    f'Could not find a function to read entity with type "{obj_entity_type}"'
-                )
-                continue
-
-            time.sleep(0.3)
-            entity_dict = reader_func(id=obj_id)
-
+        # Read all the objects in a few batched queries
+        members = self._read_entities(
+            [(obj["type"], obj["id"]) for obj in bundle["objects"]]
+        )
+        for obj_entity_type, entity_dict in members:
             # Key names cannot have - in them for jinja2 templating
             obj_entity_type = obj_entity_type.replace("-", "_")
             if obj_entity_type not in context["entities"]:
@@ -371,48 +282,14 @@ class ExportReportPdf:
 
             context["entities"][obj_entity_type].append(entity_dict)
 
-        # Generate the svg img contents for the targets map
+        # Generate the img contents for the targets map
         if "relationship" in context["entities"]:
-            # Create world map
-            world_map = World()
-            world_map.title = "Targeted Countries"
-            targeted_countries = []
-            for relationship in context["entities"]["relationship"]:
-                if (
-                    relationship["entity_type"] == "targets"
-                    and relationship["relationship_type"] == "targets"
-                    and relationship["to"]["entity_type"] == "Country"
-                ):
-                    country_code = relationship["to"]["name"].lower()
-                    if not self._validate_country_code(country_code):
-                        self.helper.log_warning(
-                            f"{country_code} is not a supported country code, skipping..."
-                        )
-                        continue
-
-                    targeted_countries.append(country_code)
-
-            # Build targeted countries image
-            if targeted_countries:
-                world_map.add("Targeted Countries", targeted_countries)
-                # Convert the svg to base64 png
-                svg_bytes = world_map.render()
-                png_bytes = io.BytesIO()
-                cairosvg.svg2png(bytestring=svg_bytes, write_to=png_bytes)
-                base64_png = base64.b64encode(png_bytes.getvalue()).decode()
-                context["target_map_country"] = f"data:image/png;base64, {base64_png}"
-
-        # Render html with input variables
-        env = Environment(
-            loader=FileSystemLoader(self.current_dir), finalize=self._finalize
-        )
-        template = env.get_template("resources/threat-actor.html")
-        html_string = template.render(context)
+            context["target_map_country"] = self._get_target_map(
+                context["entities"]["relationship"]
+            )
 
-        # Generate pdf from html string
-        pdf_contents = HTML(
-            string=html_string, base_url=f"{self.current_dir}/resources"
-        ).write_pdf()
+        # Render the pdf in the worker process
+        pdf_contents = self._render_pdf("threat-actor.html", context)
 
         # Upload the output pdf
         self.helper.log_info(f"Uploading: {file_name}")
@@ -445,20 +322,11 @@ class ExportReportPdf:
             "Threat-Actor-Individual", entity_id, "full"
         )
 
-        for bundle_obj in bundle["objects"]:
-            obj_id = bundle_obj["id"]
-            obj_entity_type = bundle_obj["type"]
-
-            reader_func = self._get_reader(obj_entity_type)
-            if reader_func is None:
-                self.helper.log_error(
-                    f'Could not find a function to read entity with type "{obj_entity_type}"'
-                )
-                continue
-
-            time.sleep(0.3)
-            entity_dict = reader_func(id=obj_id)
-
+        # Read all the objects in a few batched queries
+        members = self._read_entities(
+            [(obj["type"], obj["id"]) for obj in bundle["objects"]]
+        )
+        for obj_entity_type, entity_dict in members:
             # Key names cannot have - in them for jinja2 templating
             obj_entity_type = obj_entity_type.replace("-", "_")
             if obj_entity_type not in context["entities"]:
@@ -466,48 +334,14 @@ class ExportReportPdf:
 
             context["entities"][obj_entity_type].append(entity_dict)
 
-        # Generate the svg img contents for the targets map
+        # Generate the img contents for the targets map
         if "relationship" in context["entities"]:
-            # Create world map
-            world_map = World()
-            world_map.title = "Targeted Countries"
-            targeted_countries = []
-            for relationship in context["entities"]["relationship"]:
-                if (
-                    relationship["entity_type"] == "targets"
-                    and relationship["relationship_type"] == "targets"
-                    and relationship["to"]["entity_type"] == "Country"
-                ):
-                    country_code = relationship["to"]["name"].lower()
-                    if not self._validate_country_code(country_code):
-                        self.helper.log_warning(
-                            f"{country_code} is not a supported country code, skipping..."
-                        )
-                        continue
-
-                    targeted_countries.append(country_code)
-
-            # Build targeted countries image
-            if targeted_countries:
-                world_map.add("Targeted Countries", targeted_countries)
-                # Convert the svg to base64 png
-                svg_bytes = world_map.render()
-                png_bytes = io.BytesIO()
-                cairosvg.svg2png(bytestring=svg_bytes, write_to=png_bytes)
-                base64_png = base64.b64encode(png_bytes.getvalue()).decode()
-                context["target_map_country"] = f"data:image/png;base64, {base64_png}"
-
-        # Render html with input variables
-        env = Environment(
-            loader=FileSystemLoader(self.current_dir), finalize=self._finalize
-        )
-        template = env.get_template("resources/threat-actor.html")
-        html_string = template.render(context)
+            context["target_map_country"] = self._get_target_map(
+                context["entities"]["relationship"]
+            )
 
-        # Generate pdf from html string
-        pdf_contents = HTML(
-            string=html_string, base_url=f"{self.current_dir}/resources"
-        ).write_pdf()
+        # Render the pdf in the worker process
+        pdf_contents = self._render_pdf("threat-actor.html", context)
 
         # Upload the output pdf
         self.helper.log_info(f"Uploading: {file_name}")
@@ -578,64 +412,15 @@ class ExportReportPdf:
             "observables": {},
         }
 
-        # Process each STIX Object
-        for case_obj in case_objs:
-            obj_entity_type = case_obj["entity_type"]
-            obj_id = case_obj["standard_id"]
-            # Handle StixCyberObservables entities
-            if obj_entity_type == "StixFile" or StixCyberObservableTypes.has_value(
-                obj_entity_type
-            ):
-                observable_dict = (
-                    self.helper.api_impersonate.stix_cyber_observable.read(id=obj_id)
-                )
-
-                # If only include indicators and
-                # the observable doesn't have an indicator, skip it
-                if self.indicators_only and not observable_dict["indicators"]:
-                    self.helper.log_info(
-                        f"Skipping {obj_entity_type} observable with value {observable_dict['observable_value']} as it was not an Indicator."
-                    )
-                    continue
-
-                if obj_entity_type not in context["observables"]:
-                    context["observables"][obj_entity_type] = []
-
-                # Defang urls
-                if self.defang_urls and obj_entity_type == "Url":
-                    observable_dict["observable_value"] = observable_dict[
-                        "observable_value"
-                    ].replace("http", "hxxp", 1)
-
-                context["observables"][obj_entity_type].append(observable_dict)
-
-            # Handle all other entities
-            else:
-                reader_func = self._get_reader(obj_entity_type)
-                if reader_func is None:
-                    self.helper.log_error(
-                        f'Could not find a function to read entity with type "{obj_entity_type}"'
-                    )
-                    continue
-                entity_dict = reader_func(id=obj_id)
-
-                if obj_entity_type not in context["entities"]:
-                    context["entities"][obj_entity_type] = []
-
-                context["entities"][obj_entity_type].append(entity_dict)
-
-        # Render html with input variables
-        env = Environment(
-            loader=FileSystemLoader(self.current_dir), finalize=self._finalize
+        # Read all the members in a few batched queries
+        members = self._read_entities(
+            [(obj["entity_type"], obj["standard_id"]) for obj in case_objs],
+            with_observables=True,
         )
+        self._add_members(context, members)
 
-        template = env.get_template("resources/case.html")
-        html_string = template.render(context)
-
-        # Generate pdf from html string
-        pdf_contents = HTML(
-            string=html_string, base_url=f"{self.current_dir}/resources"
-        ).write_pdf()
+        # Render the pdf in the worker process
+        pdf_contents = self._render_pdf("case.html", context)
 
         # Upload the output pdf
         self.helper.log_info(f"Uploading: {file_name}")
@@ -666,64 +451,223 @@ class ExportReportPdf:
             return True
         return False
 
-    def _finalize(self, data):
+    def _start_renderer(self):
         """
-        Used for rendering jinja2 template to supress None
+        Start the worker process rendering the pdf files, which keeps the
+        templates, stylesheets and fonts loaded between the exports.
         """
-        return data if data is not None else "N/A"
+        return ProcessPoolExecutor(
+            max_workers=1,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=init_worker,
+            initargs=(os.path.join(self.current_dir, "resources"),),
+        )
+
+    def _render_pdf(self, template_name, context):
+        try:
+            return self.renderer.submit(render_pdf, template_name, context).result()
+        except BrokenProcessPool:
+            # The worker died (out of memory for instance), use a new one
+            # for the next exports
+            self.renderer = self._start_renderer()
+            raise
+
+    def _get_target_map(self, relationships):
+        """
+        Returns the targeted countries map as a base64 png, or None if no
+        country is targeted. The maps are cached by set of countries.
+        """
+        targeted_countries = set()
+        for relationship in relationships:
+            if (
+                relationship["entity_type"] == "targets"
+                and relationship["relationship_type"] == "targets"
+                and relationship["to"]["entity_type"] == "Country"
+            ):
+                country_code = relationship["to"]["name"].lower()
+                if not self._validate_country_code(country_code):
+                    self.helper.log_warning(
+                        f"{country_code} is not a supported country code, skipping..."
+                    )
+                    continue
+
+                targeted_countries.add(country_code)
+
+        if not targeted_countries:
+            return None
+        key = tuple(sorted(targeted_countries))
+        if key in self.target_maps:
+            self.target_maps.move_to_end(key)
+            return self.target_maps[key]
+
+        # Create world map
+        world_map = World()
+        world_map.title = "Targeted Countries"
+        world_map.add("Targeted Countries", list(key))
+        # Convert the svg to base64 png
+        svg_bytes = world_map.render()
+        png_bytes = io.BytesIO()
+        cairosvg.svg2png(bytestring=svg_bytes, write_to=png_bytes)
+        base64_png = base64.b64encode(png_bytes.getvalue()).decode()
+        target_map = f"data:image/png;base64, {base64_png}"
+
+        self.target_maps[key] = target_map
+        while len(self.target_maps) > TARGET_MAP_CACHE_SIZE:
+            self.target_maps.popitem(last=False)
+        return target_map
+
+    def _list_by_ids(self, reader, ids):
+        """
+        Read the entities of the ids with batched list queries of the reader.
+
+        Returns the entities by id, standard id and STIX ids.
+        """
+        entities = {}
+        ids = list(dict.fromkeys(ids))
+        for i in range(0, len(ids), BATCH_SIZE):
+            batch = ids[i : i + BATCH_SIZE]
+            filters = {
+                "mode": "and",
+                "filters": [{"key": "id", "values": batch}],
+                "filterGroups": [],
+            }
+            for entity in reader.list(filters=filters, first=len(batch)):
+                keys = [entity.get("id"), entity.get("standard_id")]
+                keys += entity.get("x_opencti_stix_ids") or []
+                for key in keys:
+                    if key is not None:
+                        entities.setdefault(key, entity)
+        return entities
+
+    def _read_entities(self, objects, with_observables=False):
+        """
+        Read the entities of a list of (entity type, id), grouped by reader.
+
+        Returns the (entity type, entity) of the entities read, in order.
+        """
+        ids_by_reader = {}
+        members = []
+        for obj_entity_type, obj_id in objects:
+            if with_observables and (
+                obj_entity_type == "StixFile"
+                or StixCyberObservableTypes.has_value(obj_entity_type)
+            ):
+                reader = self.helper.api_impersonate.stix_cyber_observable
+            else:
+                reader = self._get_reader(obj_entity_type)
+            if reader is None:
+                self.helper.log_error(
+                    f'Could not find a function to read entity with type "{obj_entity_type}"'
+                )
+                continue
+            ids_by_reader.setdefault(reader, []).append(obj_id)
+            members.append((obj_entity_type, reader, obj_id))
+
+        entities = {
+            reader: self._list_by_ids(reader, ids)
+            for reader, ids in ids_by_reader.items()
+        }
+        result = []
+        for obj_entity_type, reader, obj_id in members:
+            if obj_id not in entities[reader]:
+                self.helper.log_warning(
+                    f'Unable to read the {obj_entity_type} "{obj_id}", skipping...'
+                )
+                continue
+            result.append((obj_entity_type, entities[reader][obj_id]))
+        return result
+
+    def _add_members(self, context, members):
+        """
+        Add the members of a container to the context of its template.
+        """
+        for obj_entity_type, entity_dict in members:
+            # Handle StixCyberObservables entities
+            if obj_entity_type == "StixFile" or StixCyberObservableTypes.has_value(
+                obj_entity_type
+            ):
+                observable_dict = entity_dict
+
+                # If only include indicators and
+                # the observable doesn't have an indicator, skip it
+                if self.indicators_only and not observable_dict["indicators"]:
+                    self.helper.log_info(
+                        f"Skipping {obj_entity_type} observable with value {observable_dict['observable_value']} as it was not an Indicator."
+                    )
+                    continue
+
+                if obj_entity_type not in context["observables"]:
+                    context["observables"][obj_entity_type] = []
+
+                # Defang urls
+                if self.defang_urls and obj_entity_type == "Url":
+                    observable_dict["observable_value"] = observable_dict[
+                        "observable_value"
+                    ].replace("http", "hxxp", 1)
+
+                context["observables"][obj_entity_type].append(observable_dict)
+
+            # Handle all other entities
+            else:
+                if obj_entity_type not in context["entities"]:
+                    context["entities"][obj_entity_type] = []
+
+                context["entities"][obj_entity_type].append(entity_dict)
 
     def _get_reader(self, entity_type):
         """
-        Returns the function to use for reading the data of a particular entity type.
+        Returns the pycti entity class to use for reading the data of a particular entity type.
 
         entity_type: a str representing the entity type, i.e. Indicator
 
-        returns: a function or None if entity type is not supported
+        returns: an entity class or None if entity type is not supported
         """
         reader = {
-            "stix-core-object": self.helper.api_impersonate.stix_core_object.read,
-            "stix-domain-object": self.helper.api_impersonate.stix_domain_object.read,
-            "attack-pattern": self.helper.api_impersonate.attack_pattern.read,
-            "campaign": self.helper.api_impersonate.campaign.read,
-            "event": self.helper.api_impersonate.event.read,
-            "note": self.helper.api_impersonate.note.read,
-            "observed-data": self.helper.api_impersonate.observed_data.read,
-            "organization": self.helper.api_impersonate.identity.read,
-            "opinion": self.helper.api_impersonate.opinion.read,
-            "report": self.helper.api_impersonate.report.read,
-            "grouping": self.helper.api_impersonate.grouping.read,
-            "sector": self.helper.api_impersonate.identity.read,
-            "system": self.helper.api_impersonate.identity.read,
-            "course-of-action": self.helper.api_impersonate.course_of_action.read,
-            "identity": self.helper.api_impersonate.identity.read,
-            "indicator": self.helper.api_impersonate.indicator.read,
-            "individual": self.helper.api_impersonate.identity.read,
-            "infrastructure": self.helper.api_impersonate.infrastructure.read,
-            "intrusion-set": self.helper.api_impersonate.intrusion_set.read,
-            "malware": self.helper.api_impersonate.malware.read,
-            "Malware-Analysis": self.helper.api_impersonate.malware_analysis.list,
-            "threat-actor": self.helper.api_impersonate.threat_actor.read,
-            "tool": self.helper.api_impersonate.tool.read,
-            "channel": self.helper.api_impersonate.channel.read,
-            "narrative": self.helper.api_impersonate.narrative.read,
-            "language": self.helper.api_impersonate.language.read,
-            "vulnerability": self.helper.api_impersonate.vulnerability.read,
-            "incident": self.helper.api_impersonate.incident.read,
-            "x-opencti-case-incident": self.helper.api_impersonate.case_incident.read,
-            "case-incident": self.helper.api_impersonate.case_incident.read,
-            "x-opencti-case-rfi": self.helper.api_impersonate.case_rfi.read,
-            "case-rfi": self.helper.api_impersonate.case_rfi.read,
-            "city": self.helper.api_impersonate.location.read,
-            "country": self.helper.api_impersonate.location.read,
-            "region": self.helper.api_impersonate.location.read,
-            "position": self.helper.api_impersonate.location.read,
-            "location": self.helper.api_impersonate.location.read,
-            "relationship": self.helper.api_impersonate.stix_core_relationship.read,
+            "stix-core-object": self.helper.api_impersonate.stix_core_object,
+            "stix-domain-object": self.helper.api_impersonate.stix_domain_object,
+            "attack-pattern": self.helper.api_impersonate.attack_pattern,
+            "campaign": self.helper.api_impersonate.campaign,
+            "event": self.helper.api_impersonate.event,
+            "note": self.helper.api_impersonate.note,
+            "observed-data": self.helper.api_impersonate.observed_data,
+            "organization": self.helper.api_impersonate.identity,
+            "opinion": self.helper.api_impersonate.opinion,
+            "report": self.helper.api_impersonate.report,
+            "grouping": self.helper.api_impersonate.grouping,
+            "sector": self.helper.api_impersonate.identity,
+            "system": self.helper.api_impersonate.identity,
+            "course-of-action": self.helper.api_impersonate.course_of_action,
+            "identity": self.helper.api_impersonate.identity,
+            "indicator": self.helper.api_impersonate.indicator,
+            "individual": self.helper.api_impersonate.identity,
+            "infrastructure": self.helper.api_impersonate.infrastructure,
+            "intrusion-set": self.helper.api_impersonate.intrusion_set,
+            "malware": self.helper.api_impersonate.malware,
+            "malware-analysis": self.helper.api_impersonate.malware_analysis,
+            "threat-actor": self.helper.api_impersonate.threat_actor,
+            "tool": self.helper.api_impersonate.tool,
+            "channel": self.helper.api_impersonate.channel,
+            "narrative": self.helper.api_impersonate.narrative,
+            "language": self.helper.api_impersonate.language,
+            "vulnerability": self.helper.api_impersonate.vulnerability,
+            "incident": self.helper.api_impersonate.incident,
+            "x-opencti-case-incident": self.helper.api_impersonate.case_incident,
+            "case-incident": self.helper.api_impersonate.case_incident,
+            "x-opencti-case-rfi": self.helper.api_impersonate.case_rfi,
+            "case-rfi": self.helper.api_impersonate.case_rfi,
+            "city": self.helper.api_impersonate.location,
+            "country": self.helper.api_impersonate.location,
+            "region": self.helper.api_impersonate.location,
+            "position": self.helper.api_impersonate.location,
+            "location": self.helper.api_impersonate.location,
+            "relationship": self.helper.api_impersonate.stix_core_relationship,
         }
         return reader.get(entity_type.lower(), None)
 
     # Start the main loop
     def start(self):
+        # Load the templates in the worker before the first export
+        self.renderer.submit(int).result()
         self.helper.listen(self._process_message)
 
 
@@ -0,0 +1,64 @@
+import os
+
+from jinja2 import Environment, FileSystemLoader
+from weasyprint import CSS, HTML
+from weasyprint.text.fonts import FontConfiguration
+
+# Stylesheet of every template
+TEMPLATES = {
+    "report.html": "report.css",
+    "case.html": "case.css",
+    "intrusion-set.html": "intrusion-set.css",
+    "threat-actor.html": "intrusion-set.css",
+}
+
+# Renderer of the worker process
+_renderer = None
+
+
+def _finalize(data):
+    """
+    Used for rendering jinja2 template to supress None
+    """
+    return data if data is not None else "N/A"
+
+
+class PdfRenderer:
+    """
+    Render the templates as PDF.
+
+    The Jinja templates, the stylesheets and their fonts are loaded once, then
+    shared by all the exports.
+    """
+
+    def __init__(self, resources_dir):
+        self.resources_dir = resources_dir
+        env = Environment(loader=FileSystemLoader(resources_dir), finalize=_finalize)
+        self.templates = {name: env.get_template(name) for name in TEMPLATES}
+        self.font_config = FontConfiguration()
+        stylesheets = {}
+        for css_name in set(TEMPLATES.values()):
+            stylesheets[css_name] = CSS(
+                filename=os.path.join(resources_dir, css_name),
+                font_config=self.font_config,
+            )
+        self.stylesheets = {
+            name: stylesheets[css_name] for name, css_name in TEMPLATES.items()
+        }
+
+    def render(self, template_name, context):
+        html_string = self.templates[template_name].render(context)
+        return HTML(string=html_string, base_url=self.resources_dir).write_pdf(
+            stylesheets=[self.stylesheets[template_name]],
+            font_config=self.font_config,
+        )
+
+
+def init_worker(resources_dir):
+    global _renderer
+    _renderer = PdfRenderer(resources_dir)
+
+
+def render_pdf(template_name, context):
+    """Render a template in the worker process, return the PDF bytes."""
+    return _renderer.render(template_name, context)
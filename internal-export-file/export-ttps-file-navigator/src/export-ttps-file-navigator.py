@@ -6,6 +6,26 @@ import time
 import yaml
 from pycti import OpenCTIConnectorHelper
 
+# Entities whose relationships are listed per query
+FROM_BATCH_SIZE = 100
+
+RELATION_ATTRIBUTES = """
+    id
+    from {
+        ... on BasicObject {
+            id
+        }
+    }
+    to {
+        ... on BasicObject {
+            id
+        }
+        ... on AttackPattern {
+            x_mitre_id
+        }
+    }
+"""
+
 
 class ExportTTPsFileNavigator:
     def __init__(self):
@@ -18,21 +38,22 @@ class ExportTTPsFileNavigator:
             else {}
         )
         self.helper = OpenCTIConnectorHelper(config)
+        self.x_mitre_ids = {}
 
     def _process_message(self, data):
-        if "entity_type" not in data or "entity_id" not in data:
+        if "entity_type" not in data:
             raise ValueError(
-                "This Connector currently only handles direct export (single entity and not list)"
+                "This Connector requires the type of the exported entities"
             )
         file_name = data["file_name"]
         export_scope = data["export_scope"]  # query or selection or single
         export_type = data["export_type"]  # Simple or Full
-        entity_name = data["entity_name"]
         entity_type = data["entity_type"]
 
         # handle single export
         if export_scope == "single":
             entity_id = data["entity_id"]
+            entity_name = data["entity_name"]
             self.helper.log_info(
                 "Exporting: " + entity_id + "(" + export_type + ") to " + file_name
             )
@@ -55,19 +76,96 @@ class ExportTTPsFileNavigator:
                 + file_name
             )
 
+        # handle list export: the techniques of all the entities in one layer
+        else:
+            if export_scope == "selection":
+                entity_ids = data["selected_ids"]
+                list_filters = "selected_ids"
+            else:  # export_scope = 'query'
+                list_params = data["list_params"]
+                entities = self.helper.api_impersonate.stix_core_object.list(
+                    types=[entity_type],
+                    search=list_params.get("search"),
+                    filters=list_params.get("filters"),
+                    orderBy=list_params["orderBy"],
+                    orderMode=list_params["orderMode"],
+                    customAttributes="id",
+                    getAll=True,
+                )
+                entity_ids = [entity["id"] for entity in entities]
+                list_filters = json.dumps(list_params)
+            self.helper.log_info(
+                "Exporting: "
+                + str(len(entity_ids))
+                + " "
+                + entity_type
+                + "("
+                + export_type
+                + ") to "
+                + file_name
+            )
+            layer = self._process_list_export(
+                entity_ids, data.get("entity_name") or entity_type
+            )
+            json_bundle = json.dumps(layer, indent=4)
+            self.helper.log_info("Uploading: " + entity_type + " to " + file_name)
+            self.helper.api.stix_domain_object.push_list_export(
+                data.get("entity_id"), entity_type, file_name, json_bundle, list_filters
+            )
+            self.helper.log_info("Export done: " + entity_type + " to " + file_name)
+
+        return "Export done"
+
+    def _list_techniques(self, entity_ids):
+        """
+        List the relationships from the entities to attack patterns, for many
+        entities per paginated query.
+
+        Returns the attack pattern ids by entity id. The MITRE ids of the
+        attack patterns are read with the relationships and kept for the run.
+        """
+        techniques = {entity_id: [] for entity_id in entity_ids}
+        for i in range(0, len(entity_ids), FROM_BATCH_SIZE):
+            stix_relations = self.helper.api_impersonate.stix_core_relationship.list(
+                fromId=entity_ids[i : i + FROM_BATCH_SIZE],
+                toTypes=["Attack-Pattern"],
+                customAttributes=RELATION_ATTRIBUTES,
+                getAll=True,
+            )
+            for relation in stix_relations:
+                attack_pattern_id = relation["to"]["id"]
+                if attack_pattern_id not in self.x_mitre_ids:
+                    self.x_mitre_ids[attack_pattern_id] = relation["to"].get(
+                        "x_mitre_id"
+                    )
+                techniques.setdefault(relation["from"]["id"], []).append(
+                    attack_pattern_id
+                )
+        return techniques
+
     def _process_entity_export(self, entity_id, entity_name):
-        related_ttps = []
+        self.x_mitre_ids = {}
         # Get the relations from the main entity to attack pattern
-        stix_relations = self.helper.api_impersonate.stix_core_relationship.list(
-            fromId=entity_id, toTypes=["Attack-Pattern"]
-        )
-        for relation in stix_relations:
-            attack_pattern = self.helper.api_impersonate.attack_pattern.read(
-                id=relation["to"]["id"]
-            )
-            related_ttps.append(attack_pattern)
+        techniques = self._list_techniques([entity_id])
+        related_ttps = [
+            {"x_mitre_id": self.x_mitre_ids[attack_pattern_id]}
+            for attack_pattern_id in techniques[entity_id]
+        ]
         return self.build_layer(entity_name, related_ttps)
 
+    def _process_list_export(self, entity_ids, layer_name):
+        self.x_mitre_ids = {}
+        techniques = self._list_techniques(list(dict.fromkeys(entity_ids)))
+        # Score of a technique: the number of exported entities using it
+        scores = {}
+        for attack_pattern_ids in techniques.values():
+            for attack_pattern_id in set(attack_pattern_ids):
+                x_mitre_id = self.x_mitre_ids[attack_pattern_id]
+                if x_mitre_id is None:
+                    continue
+                scores[x_mitre_id] = scores.get(x_mitre_id, 0) + 1
+        return self.build_heatmap_layer(layer_name, scores)
+
     @staticmethod
     def build_layer(entity_name, ttps):
         layer = {
@@ -91,6 +189,34 @@ class ExportTTPsFileNavigator:
             layer["techniques"].append(technique)
         return layer
 
+    @staticmethod
+    def build_heatmap_layer(layer_name, scores):
+        layer = {
+            "name": layer_name,
+            "versions": {"attack": "14", "navigator": "4.9.1", "layer": "4.5"},
+            "domain": "enterprise-attack",
+            "description": "",
+            "sorting": 3,
+            "gradient": {
+                "colors": ["#ffe766", "#e60d0d"],
+                "minValue": 1,
+                "maxValue": max(scores.values(), default=1),
+            },
+            "techniques": [],
+        }
+        for x_mitre_id, score in sorted(scores.items()):
+            technique = {
+                "techniqueID": x_mitre_id,
+                "score": score,
+                "comment": "",
+                "enabled": True,
+                "metadata": [],
+                "links": [],
+                "showSubtechniques": False,
+            }
+            layer["techniques"].append(technique)
+        return layer
+
     # Start the main loop
     def start(self):
         self.helper.listen(self._process_message)
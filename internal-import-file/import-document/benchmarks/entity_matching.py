@@ -0,0 +1,213 @@
+"""
+Benchmark of the import-document entity extraction.
+
+Compares the previous extraction (one `\\bvalue\\b` regex per entity value,
+run against every text block) with the EntityMatcher automaton (the whole
+document scanned once), on synthetic entities and sample PDFs. The sample
+PDFs are generated with entity names spread in random text, real reports can
+be given instead. Both extractions must find the same entities.
+
+Usage: python benchmarks/entity_matching.py [--entities 10000] [--pages 50] [--pdf report.pdf ...]
+"""
+
+import argparse
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from pdfminer.high_level import extract_pages  # noqa: E402
+from pdfminer.layout import LTTextContainer  # noqa: E402
+from reportimporter.entity_matcher import EntityMatcher  # noqa: E402
+from reportimporter.models import Entity  # noqa: E402
+
+SYLLABLES = ["ka", "zu", "ro", "mi", "tan", "vel", "dor", "sha", "qi", "lex", "on"]
+WORDS = [
+    "the",
+    "group",
+    "used",
+    "a",
+    "new",
+    "loader",
+    "to",
+    "deliver",
+    "payloads",
+    "against",
+    "targets",
+    "in",
+    "several",
+    "sectors",
+    "campaign",
+    "observed",
+]
+
+
+def generate_entities(count, rng):
+    entities = []
+    names = set()
+    while len(entities) < count:
+        name = "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+        name = name.capitalize() + rng.choice(["", " Bear", " Panda", "-7"])
+        if name in names:
+            continue
+        names.add(name)
+        values = [name, f"APT-{len(entities)}"]
+        entities.append(
+            Entity(
+                name="intrusion_set",
+                stix_class="intrusion_set",
+                stix_id=f"intrusion-set--{len(entities)}",
+                values=values,
+            )
+        )
+    return entities
+
+
+def generate_lines(pages, entities, rng):
+    lines = []
+    for _ in range(pages):
+        page = []
+        for _ in range(40):
+            words = [rng.choice(WORDS) for _ in range(12)]
+            if rng.random() < 0.2:
+                entity = rng.choice(entities)
+                words.insert(rng.randrange(len(words)), rng.choice(entity.values))
+            page.append(" ".join(words))
+        lines.append(page)
+    return lines
+
+
+def write_sample_pdf(path, pages):
+    """Write a minimal PDF, one text line per row of the pages."""
+
+    def escape(text):
+        return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    page_ids = []
+    for page in pages:
+        content = "BT /F1 10 Tf 14 TL 40 800 Td "
+        # Blank lines split the paragraphs in several text containers
+        for i, line in enumerate(page):
+            content += f"({escape(line)}) ' " + ("T* " if i % 5 == 4 else "")
+        content = (content + "ET").encode("latin-1")
+        objects.append(
+            b"<< /Length %d >>\nstream\n%s\nendstream" % (len(content), content)
+        )
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>"
+            % (len(objects))
+        )
+        page_ids.append(len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(b"%d 0 R" % page_id for page_id in page_ids),
+        len(page_ids),
+    )
+
+    data = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(data))
+        data += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(data)
+    data += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        data += b"%010d 00000 n \n" % offset
+    data += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (
+        len(objects) + 1,
+        xref,
+    )
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def extract_blocks(path):
+    blocks = []
+    for page_layout in extract_pages(path):
+        for element in page_layout:
+            if isinstance(element, LTTextContainer):
+                blocks.append(element.get_text().replace("\n", ""))
+    return blocks
+
+
+def match_previous(regexes, blocks):
+    found = set()
+    for block_index, block in enumerate(blocks):
+        for entity_index, entity_regexes in enumerate(regexes):
+            for regex in entity_regexes:
+                if regex.search(block):
+                    found.add((block_index, entity_index))
+                    break
+    return found
+
+
+def match_automaton(matcher, blocks):
+    return {
+        (block_index, entity_index)
+        for block_index, block_matches in enumerate(matcher.match_blocks(blocks))
+        for entity_index in block_matches
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--entities", type=int, default=10000)
+    parser.add_argument("--pages", type=int, default=50)
+    parser.add_argument("--pdf", nargs="*", default=[])
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    entities = generate_entities(args.entities, rng)
+    print(f"Synthetic entities: {len(entities)}")
+
+    start = time.perf_counter()
+    regexes = [
+        [
+            re.compile(f"\\b{re.escape(value)}\\b", re.IGNORECASE)
+            for value in entity.values
+        ]
+        for entity in entities
+    ]
+    print(f"Regexes compilation: {time.perf_counter() - start:.3f}s")
+    start = time.perf_counter()
+    matcher = EntityMatcher(entities)
+    print(f"Automaton compilation: {time.perf_counter() - start:.3f}s")
+
+    with tempfile.TemporaryDirectory() as directory:
+        pdfs = args.pdf
+        if not pdfs:
+            path = os.path.join(directory, f"sample-{args.pages}-pages.pdf")
+            write_sample_pdf(path, generate_lines(args.pages, entities, rng))
+            pdfs = [path]
+
+        for path in pdfs:
+            start = time.perf_counter()
+            blocks = extract_blocks(path)
+            print(
+                f"{os.path.basename(path)}: {len(blocks)} text blocks extracted"
+                f" in {time.perf_counter() - start:.3f}s"
+            )
+
+            start = time.perf_counter()
+            previous = match_previous(regexes, blocks)
+            before = time.perf_counter() - start
+            start = time.perf_counter()
+            automaton = match_automaton(matcher, blocks)
+            after = time.perf_counter() - start
+            print(f"previous   {before:8.3f}s  {len(previous)} block matches")
+            print(f"automaton  {after:8.3f}s  {len(automaton)} block matches")
+            print(f"Speedup: {before / after:.1f}x")
+            print(f"Mismatches: {len(previous ^ automaton)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,9 @@
 import base64
+import multiprocessing
 import os
 import re
 import time
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 from typing import Callable, Dict, List
 
@@ -13,6 +15,7 @@ from pycti import (
     StixCoreRelationship,
     get_config_variable,
 )
+from prometheus_client import Gauge
 from pydantic import BaseModel
 from reportimporter.constants import (
     ENTITY_CLASS,
@@ -21,10 +24,51 @@ from reportimporter.constants import (
     RESULT_FORMAT_MATCH,
     RESULT_FORMAT_TYPE,
 )
-from reportimporter.models import Entity, EntityConfig, Observable
+from reportimporter.entity_dictionary import EntityDictionary
+from reportimporter.file_upload import push_import_file
+from reportimporter.models import EntityConfig, Observable
 from reportimporter.report_parser import ReportParser
 from reportimporter.util import MyConfigParser
 
+# Size of the chunks read from the disk, a multiple of 3 so the chunks can be
+# base64 encoded separately
+FILE_CHUNK_SIZE = 3 * 1024 * 1024
+
+# Attributes of the matched entities, enough to build the STIX objects the
+# bundle references them with
+ENTITY_ATTRIBUTES = """
+    id
+    standard_id
+    entity_type
+    created
+    modified
+"""
+VULNERABILITY_ATTRIBUTES = """
+    name
+"""
+ATTACK_PATTERN_ATTRIBUTES = """
+    name
+    x_mitre_id
+"""
+STIX_DOMAIN_OBJECT_ATTRIBUTES = """
+    ... on AttackPattern { name x_mitre_id }
+    ... on Campaign { name }
+    ... on Case { name }
+    ... on CourseOfAction { name }
+    ... on Identity { name }
+    ... on Incident { name }
+    ... on Infrastructure { name }
+    ... on IntrusionSet { name }
+    ... on City { name latitude longitude }
+    ... on Country { name latitude longitude }
+    ... on Region { name latitude longitude }
+    ... on Position { name latitude longitude }
+    ... on Malware { name is_family }
+    ... on ThreatActor { name }
+    ... on Tool { name }
+    ... on Vulnerability { name }
+"""
+
 
 class ReportImporter:
     def __init__(self) -> None:
@@ -63,7 +107,57 @@ class ReportImporter:
         else:
             raise FileNotFoundError(f"{entity_config_file} was not found")
 
+        entity_cache_dir = get_config_variable(
+            "IMPORT_DOCUMENT_ENTITY_CACHE_DIR",
+            ["import_document", "entity_cache_dir"],
+            config,
+            default=os.path.join(base_path, "..", "cache"),
+        )
+        entity_refresh_interval = get_config_variable(
+            "IMPORT_DOCUMENT_ENTITY_REFRESH_INTERVAL",
+            ["import_document", "entity_refresh_interval"],
+            config,
+            isNumber=True,
+            default=300,
+        )
+        self.entity_dictionary = EntityDictionary(
+            self.helper, self.entity_config, entity_cache_dir, entity_refresh_interval
+        )
+
+        # PDF pages are extracted by worker processes, spawned rather than
+        # forked as the connector runs several threads
+        pdf_workers = get_config_variable(
+            "IMPORT_DOCUMENT_PDF_WORKERS",
+            ["import_document", "pdf_workers"],
+            config,
+            isNumber=True,
+            default=2,
+        )
+        self.pdf_workers = max(pdf_workers, 0)
+        self.pdf_executor = (
+            ProcessPoolExecutor(
+                max_workers=self.pdf_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+            if self.pdf_workers > 0
+            else None
+        )
+
+        self.metrics = None
+        if self.helper.metric.activated:
+            self.metrics = {
+                "parse_seconds": Gauge(
+                    "import_document_parse_seconds",
+                    "Time spent parsing the last imported document",
+                ),
+                "pages_per_second": Gauge(
+                    "import_document_pages_per_second",
+                    "Pages parsed per second in the last imported PDF",
+                ),
+            }
+
         self.file = None
+        self.file_upload = None
 
     def _process_message(self, data: Dict) -> str:
         self.helper.log_info("Processing new message")
@@ -78,34 +172,49 @@ class ReportImporter:
         if self.helper.get_only_contextual() and entity is None:
             return "Connector is only contextual and entity is not defined. Nothing was imported"
 
-        # Retrieve entity set from OpenCTI
-        entity_indicators = self._collect_stix_objects(self.entity_config)
+        # Entity set from OpenCTI, kept up to date in the background
+        entity_matcher = self.entity_dictionary.matcher()
 
         # Parse report
-        parser = ReportParser(self.helper, entity_indicators, self.observable_config)
+        parser = ReportParser(
+            self.helper,
+            entity_matcher,
+            self.observable_config,
+            pdf_executor=self.pdf_executor,
+            pdf_max_pending=2 * self.pdf_workers,
+        )
+        parsed = parser.run_parser(file_name, data["file_mime"])
+        self._report_parse_stats(file_name, parser)
 
+        # The file is attached to the container of the results. Nothing is
+        # created before a validation, the file then travels in the bundle,
+        # otherwise it is uploaded from the disk once the container exists.
+        self.file = None
+        self.file_upload = None
         if data["file_id"].startswith("import/global"):
-            file_data = open(file_name, "rb").read()
-            file_data_encoded = base64.b64encode(file_data)
-            self.file = {
+            attachment = {
                 "name": data["file_id"].replace("import/global/", ""),
-                "data": file_data_encoded,
-                "mime_type": "application/pdf",
+                "mime_type": data["file_mime"],
             }
-        parsed = parser.run_parser(file_name, data["file_mime"])
-        os.remove(file_name)
-
-        if not parsed:
-            return "No information extracted from report"
-
-        # Process parsing results
-        self.helper.log_debug("Results: {}".format(parsed))
-        observables, entities = self._process_parsing_results(parsed, entity)
-        # Send results to OpenCTI
-        observable_cnt = self._process_parsed_objects(
-            entity, observables, entities, bypass_validation, file_name
-        )
-        entity_cnt = len(entities)
+            if self.helper.get_validate_before_import() and not bypass_validation:
+                self.file = dict(attachment, data=self._encode_file(file_name))
+            else:
+                self.file_upload = dict(attachment, path=file_name)
+
+        try:
+            if not parsed:
+                return "No information extracted from report"
+
+            # Process parsing results
+            self.helper.log_debug("Results: {}".format(parsed))
+            observables, entities = self._process_parsing_results(parsed, entity)
+            # Send results to OpenCTI
+            observable_cnt = self._process_parsed_objects(
+                entity, observables, entities, bypass_validation, file_name
+            )
+            entity_cnt = len(entities)
+        finally:
+            os.remove(file_name)
 
         if self.helper.get_validate_before_import() and not bypass_validation:
             return "Generated bundle sent for validation"
@@ -116,6 +225,7 @@ class ReportImporter:
             )
 
     def start(self) -> None:
+        self.entity_dictionary.start()
         self.helper.listen(self._process_message)
 
     def _download_import_file(self, data: Dict) -> str:
@@ -125,7 +235,11 @@ class ReportImporter:
         # Downloading and saving file to connector
         self.helper.log_info("Importing the file " + file_uri)
         file_name = os.path.basename(file_fetch)
-        file_content = self.helper.api.fetch_opencti_file(file_uri, True)
+        # Streamed to the disk instead of being loaded in memory
+        response = self.helper.api.session.get(
+            file_uri, headers=self.helper.api.request_headers, stream=True
+        )
+        response.raise_for_status()
 
         """
         On Windows, the invalid characters are different, so the behavior is not the same as Linux
@@ -138,30 +252,30 @@ class ReportImporter:
             file_name = re.sub(r'[\\/:*?"<>|]', "_", file_name)
 
         with open(file_name, "wb") as f:
-            f.write(file_content)
+            for chunk in response.iter_content(chunk_size=FILE_CHUNK_SIZE):
+                f.write(chunk)
 
         return file_name
 
-    def _collect_stix_objects(
-        self, entity_config_list: List[EntityConfig]
-    ) -> List[Entity]:
-        base_func = self.helper.api
-        entity_list = []
-        for entity_config in entity_config_list:
-            func_format = entity_config.stix_class
-            try:
-                custom_function = getattr(base_func, func_format)
-                entries = custom_function.list(
-                    getAll=True,
-                    filters=entity_config.filter,
-                    customAttributes=entity_config.custom_attributes,
-                )
-                entity_list += entity_config.convert_to_entity(entries, self.helper)
-            except AttributeError:
-                e = "Selected parser format is not supported: {}".format(func_format)
-                raise NotImplementedError(e)
+    @staticmethod
+    def _encode_file(file_name: str) -> str:
+        # Encoded chunk by chunk, the raw file is never fully in memory
+        with open(file_name, "rb") as f:
+            return "".join(
+                base64.b64encode(chunk).decode("utf-8")
+                for chunk in iter(lambda: f.read(FILE_CHUNK_SIZE), b"")
+            )
 
-        return entity_list
+    def _report_parse_stats(self, file_name: str, parser: ReportParser) -> None:
+        message = f"Report {file_name} parsed in {parser.parse_time:.2f}s"
+        if self.metrics is not None:
+            self.metrics["parse_seconds"].set(parser.parse_time)
+        if parser.pages:
+            pages_per_second = parser.pages / max(parser.parse_time, 1e-6)
+            message += f" ({parser.pages} pages, {pages_per_second:.1f} pages/s)"
+            if self.metrics is not None:
+                self.metrics["pages_per_second"].set(pages_per_second)
+        self.helper.log_info(message)
 
     @staticmethod
     def _parse_config(config_file: str, file_class: Callable) -> List[BaseModel]:
@@ -181,6 +295,9 @@ class ReportImporter:
     ) -> (List[Dict], List[str]):
         observables = []
         entities = []
+        vulnerability_names = []
+        attack_pattern_ids = []
+        entity_ids = []
         if context_entity is not None:
             object_markings = [
                 x["standard_id"] for x in context_entity.get("objectMarking", [])
@@ -195,65 +312,11 @@ class ReportImporter:
             author = author.get("standard_id", None)
         for match in parsed:
             if match[RESULT_FORMAT_TYPE] == OBSERVABLE_CLASS:
+                # Resolved afterwards, all at once
                 if match[RESULT_FORMAT_CATEGORY] == "Vulnerability.name":
-                    entity = self.helper.api.vulnerability.read(
-                        filters={
-                            "mode": "and",
-                            "filters": [
-                                {"key": "name", "values": [match[RESULT_FORMAT_MATCH]]}
-                            ],
-                            "filterGroups": [],
-                        }
-                    )
-                    if entity is None:
-                        self.helper.log_info(
-                            f"Vulnerability with name '{match[RESULT_FORMAT_MATCH]}' could not be "
-                            f"found. Is the CVE Connector activated?"
-                        )
-                        continue
-                    entity_stix_bundle = self.helper.api.stix2.export_entity(
-                        entity["entity_type"], entity["id"]
-                    )
-                    if len(entity_stix_bundle["objects"]) == 0:
-                        raise ValueError("Entity cannot be found or exported")
-                    entity_stix = [
-                        object
-                        for object in entity_stix_bundle["objects"]
-                        if "x_opencti_id" in object
-                        and object["x_opencti_id"] == entity["id"]
-                    ][0]
-                    entities.append(entity_stix)
+                    vulnerability_names.append(match[RESULT_FORMAT_MATCH])
                 elif match[RESULT_FORMAT_CATEGORY] == "Attack-Pattern.x_mitre_id":
-                    entity = self.helper.api.attack_pattern.read(
-                        filters={
-                            "mode": "and",
-                            "filters": [
-                                {
-                                    "key": "x_mitre_id",
-                                    "values": [match[RESULT_FORMAT_MATCH]],
-                                }
-                            ],
-                            "filterGroups": [],
-                        }
-                    )
-                    if entity is None:
-                        self.helper.log_info(
-                            f"AttackPattern with MITRE ID '{match[RESULT_FORMAT_MATCH]}' could not be "
-                            f"found. Is the MITRE Connector activated?"
-                        )
-                        continue
-                    entity_stix_bundle = self.helper.api.stix2.export_entity(
-                        entity["entity_type"], entity["id"]
-                    )
-                    if len(entity_stix_bundle["objects"]) == 0:
-                        raise ValueError("Entity cannot be found or exported")
-                    entity_stix = [
-                        object
-                        for object in entity_stix_bundle["objects"]
-                        if "x_opencti_id" in object
-                        and object["x_opencti_id"] == entity["id"]
-                    ][0]
-                    entities.append(entity_stix)
+                    attack_pattern_ids.append(match[RESULT_FORMAT_MATCH])
                 else:
                     observable = None
                     if match[RESULT_FORMAT_CATEGORY] == "Autonomous-System.number":
@@ -371,26 +434,99 @@ class ReportImporter:
                         observables.append(observable)
 
             elif match[RESULT_FORMAT_TYPE] == ENTITY_CLASS:
-                stix_type = "-".join(
-                    x[:1].upper() + x[1:]
-                    for x in match[RESULT_FORMAT_CATEGORY].split("_")
-                )
-                entity_stix_bundle = self.helper.api.stix2.export_entity(
-                    stix_type, match[RESULT_FORMAT_MATCH]
-                )
-                if len(entity_stix_bundle["objects"]) == 0:
-                    raise ValueError("Entity cannot be found or exported")
-                entity_stix = [
-                    object
-                    for object in entity_stix_bundle["objects"]
-                    if object["id"] == match[RESULT_FORMAT_MATCH]
-                ][0]
-                entities.append(entity_stix)
+                entity_ids.append(match[RESULT_FORMAT_MATCH])
             else:
                 self.helper.log_info("Odd data received: {}".format(match))
 
+        for name in self._resolve_entities(
+            self.helper.api.vulnerability,
+            "name",
+            vulnerability_names,
+            entities,
+            VULNERABILITY_ATTRIBUTES,
+        ):
+            self.helper.log_info(
+                f"Vulnerability with name '{name}' could not be "
+                f"found. Is the CVE Connector activated?"
+            )
+        for mitre_id in self._resolve_entities(
+            self.helper.api.attack_pattern,
+            "x_mitre_id",
+            attack_pattern_ids,
+            entities,
+            ATTACK_PATTERN_ATTRIBUTES,
+        ):
+            self.helper.log_info(
+                f"AttackPattern with MITRE ID '{mitre_id}' could not be "
+                f"found. Is the MITRE Connector activated?"
+            )
+        # The entity dictionary may be slightly behind the platform
+        for entity_id in self._resolve_entities(
+            self.helper.api.stix_domain_object,
+            "standard_id",
+            entity_ids,
+            entities,
+            STIX_DOMAIN_OBJECT_ATTRIBUTES,
+        ):
+            self.helper.log_warning(f"Entity {entity_id} cannot be found")
+
         return observables, entities
 
+    def _resolve_entities(
+        self,
+        entity_api,
+        filter_key: str,
+        values: List,
+        entities: List[Dict],
+        attributes: str,
+    ) -> List:
+        """
+        Resolve the entities matching the values with a single paginated list.
+
+        The listed entities are added to `entities` as the small STIX objects
+        the bundle references them with, the values not found are returned.
+        """
+        values = list(dict.fromkeys(values))
+        if len(values) == 0:
+            return []
+        entries = entity_api.list(
+            getAll=True,
+            filters={
+                "mode": "and",
+                "filters": [{"key": filter_key, "values": values}],
+                "filterGroups": [],
+            },
+            customAttributes=ENTITY_ATTRIBUTES + attributes,
+        )
+        requested = {str(value).lower() for value in values}
+        found = set()
+        for entry in entries:
+            value = str(entry.get(filter_key)).lower()
+            if value not in requested:
+                continue
+            entities.append(self._to_stix_entity(entry))
+            found.add(value)
+        return [value for value in values if str(value).lower() not in found]
+
+    def _to_stix_entity(self, entry: Dict) -> Dict:
+        stix_id = self._convert_id(entry["entity_type"], entry["standard_id"])
+        entity_stix = {
+            "id": stix_id,
+            "type": stix_id.split("--")[0],
+            "spec_version": "2.1",
+            "created": entry["created"],
+            "modified": entry["modified"],
+        }
+        for attribute in ["name", "x_mitre_id", "is_family", "latitude", "longitude"]:
+            if entry.get(attribute) is not None:
+                entity_stix[attribute] = entry[attribute]
+        # A location needs a region, a country or coordinates
+        if entry["entity_type"] == "Region":
+            entity_stix["region"] = entry["name"]
+        elif entry["entity_type"] == "Country":
+            entity_stix["country"] = entry["name"]
+        return entity_stix
+
     def _convert_id(self, type, standard_id):
         if type == "Case-Incident":
             return "x-opencti-" + standard_id
@@ -418,17 +554,19 @@ class ReportImporter:
     ) -> int:
         if len(observables) == 0 and len(entities) == 0:
             return 0
-        ids = []
+        # Id of the container the file is uploaded to
+        attach_to = None
+        ids = set()
         observables_ids = []
         entities_ids = []
         for o in observables:
             if o["id"] not in ids:
                 observables_ids.append(o["id"])
-                ids.append(o["id"])
+                ids.add(o["id"])
         for e in entities:
             if e["id"] not in ids:
                 entities_ids.append(e["id"])
-                ids.append(e["id"])
+                ids.add(e["id"])
         if entity is not None:
             entity_stix_bundle = self.helper.api.stix2.export_entity(
                 entity["entity_type"], entity["id"]
@@ -460,6 +598,7 @@ class ReportImporter:
                 entity_stix["x_opencti_files"] = (
                     [self.file] if self.file is not None else []
                 )
+                attach_to = entity["id"]
             # For observed data, just insert all observables in it
             elif entity_stix["type"] == "observed-data":
                 entity_stix["object_refs"] = (
@@ -530,55 +669,6 @@ class ReportImporter:
                                     allow_custom=True,
                                 )
                             )
-                if entity_stix["type"] == "incident":
-                    for entity_id in entities_ids:
-                        # Incident attributed-to Threats
-                        if (
-                            entity_id.startswith("threat-actor")
-                            or entity_id.startswith("intrusion-set")
-                            or entity_id.startswith("campaign")
-                        ):
-                            relationships.append(
-                                stix2.Relationship(
-                                    id=StixCoreRelationship.generate_id(
-                                        "attributed-to",
-                                        entity_stix["id"],
-                                        entity["id"],
-                                    ),
-                                    relationship_type="attributed-to",
-                                    source_ref=entity_stix["id"],
-                                    target_ref=entity,
-                                    allow_custom=True,
-                                )
-                            )
-                        # Incident targets Vulnerabilities
-                        elif entity_id.startswith("vulnerability"):
-                            relationships.append(
-                                stix2.Relationship(
-                                    id=StixCoreRelationship.generate_id(
-                                        "targets",
-                                        entity_stix["id"],
-                                        entity["id"],
-                                    ),
-                                    relationship_type="targets",
-                                    source_ref=entity_stix["id"],
-                                    target_ref=entity,
-                                    allow_custom=True,
-                                )
-                            )
-                        # Incident uses Attack Patterns
-                        elif entity_id.startswith("attack-pattern"):
-                            relationships.append(
-                                stix2.Relationship(
-                                    id=StixCoreRelationship.generate_id(
-                                        "uses", entity_stix["id"], entity["id"]
-                                    ),
-                                    relationship_type="uses",
-                                    source_ref=entity_stix["id"],
-                                    target_ref=entity,
-                                    allow_custom=True,
-                                )
-                            )
                 if entity_stix["type"] == "threat-actor":
                     for entity_id in entities_ids:
                         # Threat actor targets Vulnerabilities
@@ -627,14 +717,24 @@ class ReportImporter:
                 },
             )
             observables.append(report)
+            if self.file_upload is not None:
+                # Created ahead of the bundle, so the file can be uploaded to it
+                created_report = self.helper.api.report.create(
+                    stix_id=report["id"],
+                    name=report["name"],
+                    description=report["description"],
+                    published=now.strftime("%Y-%m-%dT%H:%M:%SZ"),
+                    report_types=report["report_types"],
+                )
+                attach_to = created_report["id"]
         observables = observables + entities
         bundles_sent = []
         if len(observables) > 0:
-            ids = []
+            ids = set()
             final_objects = []
             for object in observables:
                 if object["id"] not in ids:
-                    ids.append(object["id"])
+                    ids.add(object["id"])
                     final_objects.append(object)
             bundle = stix2.Bundle(objects=final_objects, allow_custom=True).serialize()
             bundles_sent = self.helper.send_stix2_bundle(
@@ -644,5 +744,14 @@ class ReportImporter:
                 entity_id=entity["id"] if entity is not None else None,
             )
 
+        if self.file_upload is not None and attach_to is not None:
+            push_import_file(
+                self.helper.api,
+                attach_to,
+                self.file_upload["name"],
+                self.file_upload["path"],
+                self.file_upload["mime_type"],
+            )
+
         # len() - 1 because the report update increases the count by one
         return len(bundles_sent) - 1
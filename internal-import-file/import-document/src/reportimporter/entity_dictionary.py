@@ -0,0 +1,283 @@
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from pycti import OpenCTIConnectorHelper
+from reportimporter.entity_matcher import EntityMatcher
+from reportimporter.models import Entity, EntityConfig
+
+# An entity deleted in OpenCTI is only noticed when every entity is listed
+# again, the listings in between ask for the updated entities only.
+COMPLETE_LISTING_MAX_AGE = 24 * 60 * 60
+
+# Attributes needed to index the entities and to resume the synchronization
+REQUIRED_ATTRIBUTES = ["id", "standard_id", "updated_at"]
+
+
+class EntityDictionary:
+    """
+    Names and aliases of the OpenCTI entities matched in the documents.
+
+    Kept in memory by the connector for its whole lifetime and written to the
+    cache directory, the dictionary is synchronized in the background: the
+    imports always read the latest complete matcher without listing anything
+    from OpenCTI.
+    """
+
+    def __init__(
+        self,
+        helper: OpenCTIConnectorHelper,
+        entity_configs: List[EntityConfig],
+        cache_dir: str,
+        refresh_interval: int,
+    ):
+        self.helper = helper
+        self.entity_configs = entity_configs
+        self.refresh_interval = refresh_interval
+        self.cache_path = os.path.join(cache_dir, "entities.json")
+        os.makedirs(cache_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        # By entity config name: the listed attributes and the converted
+        # entity of every OpenCTI id, and the greatest updated_at seen
+        self._items: Dict[str, Dict[str, Dict]] = {}
+        self._entities: Dict[str, Dict[str, Entity]] = {}
+        self._last_updated: Dict[str, Optional[str]] = {}
+        self._matcher = EntityMatcher([])
+        # Time of the last listing of every entity
+        self._listed_at = 0.0
+
+    def __len__(self):
+        return sum(len(items) for items in self._items.values())
+
+    @staticmethod
+    def _custom_attributes(entity_config: EntityConfig) -> str:
+        attributes = entity_config.custom_attributes.split()
+        for attribute in REQUIRED_ATTRIBUTES:
+            if attribute not in attributes:
+                attributes.append(attribute)
+        return "\n".join(attributes)
+
+    def _list_entities(
+        self, entity_config: EntityConfig, updated_after: Optional[str] = None
+    ) -> List[Dict]:
+        try:
+            custom_function = getattr(self.helper.api, entity_config.stix_class)
+        except AttributeError:
+            e = "Selected parser format is not supported: {}".format(
+                entity_config.stix_class
+            )
+            raise NotImplementedError(e)
+
+        filters = entity_config.filter
+        if updated_after is not None:
+            filters = {
+                "mode": "and",
+                "filters": [
+                    {"key": "updated_at", "values": [updated_after], "operator": "gte"}
+                ],
+                "filterGroups": [entity_config.filter] if entity_config.filter else [],
+            }
+        return custom_function.list(
+            getAll=True,
+            filters=filters,
+            customAttributes=self._custom_attributes(entity_config),
+        )
+
+    def _index(
+        self,
+        entity_config: EntityConfig,
+        entries: List[Dict],
+        items: Dict[str, Dict],
+        entities: Dict[str, Entity],
+        last_updated: Optional[str],
+    ) -> Tuple[int, Optional[str]]:
+        """
+        Add the listed entries of an entity config, return the changed count
+        and the updated_at cursor moved past the entries.
+        """
+        changes = 0
+        for entry in entries:
+            updated_at = entry.get("updated_at")
+            if updated_at is not None and (
+                last_updated is None or updated_at > last_updated
+            ):
+                last_updated = updated_at
+            # Converting the values into an entity is the costly part, an
+            # entry listed again without any change keeps its entity
+            item = {
+                key: entry.get(key)
+                for key in ["standard_id", "updated_at"] + entity_config.fields
+            }
+            if items.get(entry["id"]) == item:
+                continue
+            changes += 1
+            items[entry["id"]] = item
+            self._to_entity(entity_config, entry["id"], item, entities)
+        return changes, last_updated
+
+    def _to_entity(
+        self,
+        entity_config: EntityConfig,
+        item_id: str,
+        item: Dict,
+        entities: Dict[str, Entity],
+    ) -> None:
+        converted = entity_config.convert_to_entity([item], self.helper)
+        if converted:
+            entities[item_id] = converted[0]
+        else:
+            entities.pop(item_id, None)
+
+    @staticmethod
+    def _build_matcher(entities: Dict[str, Dict[str, Entity]]) -> EntityMatcher:
+        return EntityMatcher(
+            [
+                entity
+                for config_entities in entities.values()
+                for entity in config_entities.values()
+            ]
+        )
+
+    def _publish(
+        self, items: Dict[str, Dict[str, Dict]], entities: Dict[str, Dict[str, Entity]]
+    ) -> None:
+        # The matcher is built before taking the lock, an import running
+        # meanwhile keeps the previous one
+        matcher = self._build_matcher(entities)
+        with self._lock:
+            self._items = items
+            self._entities = entities
+            self._matcher = matcher
+
+    def _write_cache(self) -> None:
+        # Written aside then renamed, a crash never leaves a truncated cache
+        tmp_path = self.cache_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(
+                {
+                    "listed_at": self._listed_at,
+                    "last_updated": self._last_updated,
+                    "items": self._items,
+                },
+                f,
+            )
+        os.replace(tmp_path, self.cache_path)
+
+    def _read_cache(self) -> bool:
+        if not os.path.exists(self.cache_path):
+            return False
+        try:
+            with open(self.cache_path) as f:
+                cache = json.load(f)
+            listed_at = cache.get("listed_at", 0.0)
+            last_updated = cache["last_updated"]
+            cached_items = cache["items"]
+        except (OSError, ValueError, KeyError) as e:
+            self.helper.log_warning(f"Unable to load the entity cache: {e}")
+            return False
+
+        # The entity configs may have changed since the cache was written, a
+        # config without cached entities is listed from its start
+        items = {}
+        entities = {}
+        for entity_config in self.entity_configs:
+            name = entity_config.name
+            items[name] = cached_items.get(name, {})
+            entities[name] = {}
+            if name not in cached_items:
+                last_updated.pop(name, None)
+            for item_id, item in items[name].items():
+                self._to_entity(entity_config, item_id, item, entities[name])
+        self._last_updated = last_updated
+        self._listed_at = listed_at
+        self._publish(items, entities)
+        return True
+
+    def synchronize(self) -> None:
+        """
+        Apply the changes made in OpenCTI since the last synchronization.
+
+        Only the entities updated since the updated_at cursor of their entity
+        config are listed, unless the last complete listing is older than
+        COMPLETE_LISTING_MAX_AGE: every entity is then listed, and the ones
+        missing from the listing are removed.
+        """
+        complete = time.time() - self._listed_at >= COMPLETE_LISTING_MAX_AGE
+        listing_start = time.time()
+        items = {}
+        entities = {}
+        # The cursors only move once every config is listed, a failed listing
+        # leaves them where the published entities stand
+        last_updated: Dict[str, Optional[str]] = {}
+        changes = 0
+        for entity_config in self.entity_configs:
+            name = entity_config.name
+            known_items = self._items.get(name, {})
+            known_entities = self._entities.get(name, {})
+            if complete:
+                entries = self._list_entities(entity_config)
+                listed_ids = {entry["id"] for entry in entries}
+                items[name] = {
+                    item_id: item
+                    for item_id, item in known_items.items()
+                    if item_id in listed_ids
+                }
+                entities[name] = {
+                    item_id: entity
+                    for item_id, entity in known_entities.items()
+                    if item_id in listed_ids
+                }
+                changes += len(known_items) - len(items[name])
+                last_updated[name] = None
+            else:
+                entries = self._list_entities(
+                    entity_config, self._last_updated.get(name)
+                )
+                items[name] = dict(known_items)
+                entities[name] = dict(known_entities)
+                last_updated[name] = self._last_updated.get(name)
+            config_changes, last_updated[name] = self._index(
+                entity_config, entries, items[name], entities[name], last_updated[name]
+            )
+            changes += config_changes
+        if changes > 0:
+            self._publish(items, entities)
+            self.helper.log_info(
+                f"Entity dictionary synchronized, {changes} changes,"
+                f" {len(self)} entities"
+            )
+        self._last_updated = last_updated
+        if complete:
+            self._listed_at = listing_start
+        if changes > 0 or complete:
+            self._write_cache()
+
+    def start(self) -> None:
+        """
+        Load the dictionary, from the cache when there is one, then keep it
+        synchronized every refresh interval in a background thread.
+        """
+        if self._read_cache():
+            self.helper.log_info(
+                f"Entity dictionary loaded from cache with {len(self)} entities"
+            )
+        self.synchronize()
+
+        def synchronize_loop():
+            while True:
+                time.sleep(self.refresh_interval)
+                try:
+                    self.synchronize()
+                except Exception as e:
+                    self.helper.log_error(
+                        f"Unable to synchronize the entity dictionary: {e}"
+                    )
+
+        threading.Thread(target=synchronize_loop, daemon=True).start()
+
+    def matcher(self) -> EntityMatcher:
+        with self._lock:
+            return self._matcher
@@ -0,0 +1,103 @@
+import bisect
+from typing import Dict, List, Tuple
+
+import ahocorasick
+from reportimporter.models import Entity
+
+# Blocks are joined with a separator which is not a word character, so a
+# value never matches across two blocks
+BLOCK_SEPARATOR = "\n"
+
+
+def _is_word(char: str) -> bool:
+    # Same definition as the \w of the re module
+    return char.isalnum() or char == "_"
+
+
+def _lower(text: str) -> str:
+    lowered = text.lower()
+    if len(lowered) == len(text):
+        return lowered
+    # Some characters are longer in lower case ("İ"), keep them as is so the
+    # match positions stay the same as in the original text
+    return "".join(c.lower() if len(c.lower()) == 1 else c for c in text)
+
+
+class EntityMatcher:
+    """
+    All the entity values compiled into a single Aho-Corasick automaton.
+
+    The values are matched case insensitively and only as whole words, the
+    same way as a `\\bvalue\\b` regex with the IGNORECASE flag, but the text is
+    scanned once for all the entities instead of once per value.
+    """
+
+    def __init__(self, entities: List[Entity]):
+        self.entities = entities
+        self._automaton = ahocorasick.Automaton()
+        for index, entity in enumerate(entities):
+            for value in entity.values:
+                key = _lower(value)
+                if not key:
+                    continue
+                # Several entities can share a value (name of one, alias of
+                # another), every entity is matched
+                _, indexes = self._automaton.get(key, (len(key), []))
+                if index not in indexes:
+                    indexes.append(index)
+                    self._automaton.add_word(key, (len(key), indexes))
+        if len(self._automaton) > 0:
+            self._automaton.make_automaton()
+
+    def __len__(self):
+        return len(self._automaton)
+
+    @staticmethod
+    def _is_bounded(text: str, start: int, end: int) -> bool:
+        # \b between the characters before and after the match and the match
+        before = start > 0 and _is_word(text[start - 1])
+        after = end < len(text) and _is_word(text[end])
+        return before != _is_word(text[start]) and after != _is_word(text[end - 1])
+
+    def match(self, text: str) -> List[Tuple[int, int, int]]:
+        """
+        Match the entity values in the text.
+
+        Returns the (start, end, entity index) of every match.
+        """
+        if len(self._automaton) == 0:
+            return []
+        matches = []
+        for end, (length, indexes) in self._automaton.iter(_lower(text)):
+            start = end + 1 - length
+            if not self._is_bounded(text, start, end + 1):
+                continue
+            for index in indexes:
+                matches.append((start, end + 1, index))
+        return matches
+
+    def match_blocks(
+        self, blocks: List[str]
+    ) -> List[Dict[int, Dict[str, List[Tuple[int, int]]]]]:
+        """
+        Match the entity values in all the text blocks of a document at once.
+
+        Returns, for every block, the matched values and their spans in the
+        block by entity index.
+        """
+        offsets = []
+        position = 0
+        for block in blocks:
+            offsets.append(position)
+            position += len(block) + len(BLOCK_SEPARATOR)
+        text = BLOCK_SEPARATOR.join(blocks)
+
+        results = [{} for _ in blocks]
+        for start, end, index in self.match(text):
+            block_index = bisect.bisect_right(offsets, start) - 1
+            offset = offsets[block_index]
+            block_matches = results[block_index].setdefault(index, {})
+            block_matches.setdefault(text[start:end], []).append(
+                (start - offset, end - offset)
+            )
+        return results
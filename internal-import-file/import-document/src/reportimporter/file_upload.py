@@ -0,0 +1,84 @@
+import json
+import os
+import uuid
+from typing import Iterator
+
+# Size of the chunks read from the disk while uploading
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+IMPORT_PUSH_MUTATION = """
+    mutation StixDomainObjectEdit($id: ID!, $file: Upload!) {
+        stixDomainObjectEdit(id: $id) {
+            importPush(file: $file) {
+                id
+                name
+            }
+        }
+    }
+"""
+
+
+class FileUploadBody:
+    """
+    GraphQL multipart request uploading a file, read from the disk while it
+    is sent. Its length is known, so it goes with a Content-Length header
+    rather than chunked.
+    """
+
+    def __init__(
+        self, query: str, variables: dict, name: str, path: str, mime_type: str
+    ):
+        self.path = path
+        self.boundary = uuid.uuid4().hex
+        operations = json.dumps({"query": query, "variables": variables})
+        self.head = (
+            self._field("operations", operations)
+            + self._field("map", json.dumps({"0": ["variables.file"]}))
+            + f"--{self.boundary}\r\n"
+            + f'Content-Disposition: form-data; name="0"; filename="{name}"\r\n'
+            + f"Content-Type: {mime_type}\r\n\r\n"
+        ).encode("utf-8")
+        self.tail = f"\r\n--{self.boundary}--\r\n".encode("utf-8")
+
+    def _field(self, name: str, value: str) -> str:
+        return (
+            f"--{self.boundary}\r\n"
+            f'Content-Disposition: form-data; name="{name}"\r\n\r\n'
+            f"{value}\r\n"
+        )
+
+    @property
+    def content_type(self) -> str:
+        return "multipart/form-data; boundary=" + self.boundary
+
+    def __len__(self) -> int:
+        return len(self.head) + os.path.getsize(self.path) + len(self.tail)
+
+    def __iter__(self) -> Iterator[bytes]:
+        yield self.head
+        with open(self.path, "rb") as f:
+            for chunk in iter(lambda: f.read(UPLOAD_CHUNK_SIZE), b""):
+                yield chunk
+        yield self.tail
+
+
+def push_import_file(api, entity_id: str, name: str, path: str, mime_type: str):
+    """Upload a file in the import files of an entity with a streamed request."""
+    body = FileUploadBody(
+        IMPORT_PUSH_MUTATION, {"id": entity_id, "file": None}, name, path, mime_type
+    )
+    headers = dict(api.request_headers, **{"Content-Type": body.content_type})
+    response = api.session.post(
+        api.api_url,
+        data=body,
+        headers=headers,
+        verify=api.ssl_verify,
+        cert=api.cert,
+        proxies=api.proxies,
+    )
+    if response.status_code != 200:
+        raise ValueError(response.text)
+    result = response.json()
+    if "errors" in result:
+        raise ValueError(result["errors"][0]["message"])
+    return result
@@ -103,7 +103,6 @@ class Entity(BaseModel):
     stix_class: str
     stix_id: str
     values: List[str]
-    regex: List[Pattern] = []
     omit_match_in: List[str] = []
 
 
@@ -144,7 +143,7 @@ class EntityConfig(BaseModel):
                     elif type(elem) == str:
                         item_values.add(elem)
 
-            indicators = []
+            values = []
             for value in item_values:
                 # Remove SDO names which are defined to be excluded in the entity config
                 if value.lower() in self.exclude_values:
@@ -152,26 +151,16 @@ class EntityConfig(BaseModel):
                         f"Entity: Discarding value '{value}' due to explicit exclusion as defined in {self.exclude_values}"
                     )
                     continue
+                values.append(value)
 
-                value = re.escape(value)
-                value = f"\\b{value}\\b"
-                try:
-                    compiled_re = re.compile(value, re.IGNORECASE)
-                    indicators.append(compiled_re)
-                except re.error as e:
-                    helper.log_error(
-                        f"Entity {self.name}: Unable to create regex from value '{value}' ({e})"
-                    )
-
-            if len(indicators) == 0:
+            if len(values) == 0:
                 continue
 
             entity = Entity(
                 name=self.name,
                 stix_class=self.stix_class,
                 stix_id=_id,
-                values=item_values,
-                regex=indicators,
+                values=values,
                 omit_match_in=self.omit_match_in,
             )
             entities.append(entity)
@@ -1,13 +1,18 @@
 import io
 import logging
 import os
-from typing import IO, Dict, List, Pattern, Tuple
+import time
+from concurrent.futures import Executor
+from typing import IO, Dict, List, Optional, Pattern, Tuple
 
 import chardet
 import ioc_finder
 from bs4 import BeautifulSoup
 from pdfminer.high_level import extract_pages
 from pdfminer.layout import LTTextContainer
+from pdfminer.pdfdocument import PDFDocument
+from pdfminer.pdfparser import PDFParser
+from pdfminer.pdftypes import resolve1
 from pycti import OpenCTIConnectorHelper
 from reportimporter.constants import (
     ENTITY_CLASS,
@@ -24,9 +29,69 @@ from reportimporter.constants import (
     RESULT_FORMAT_RANGE,
     RESULT_FORMAT_TYPE,
 )
+from reportimporter.entity_matcher import EntityMatcher
 from reportimporter.models import Entity, Observable
 from reportimporter.util import library_mapping
 
+# Number of pages extracted by a worker at once
+PDF_PAGES_PER_TASK = 10
+
+
+def count_pdf_pages(file_path: str) -> int:
+    with open(file_path, "rb") as file_data:
+        document = PDFDocument(PDFParser(file_data))
+        return resolve1(document.catalog["Pages"])["Count"]
+
+
+def extract_pdf_blocks(file_path: str, first_page: int, last_page: int) -> List[str]:
+    """Extract the text blocks of the [first_page, last_page) pages of a PDF."""
+    # Disable INFO logging by pdfminer in the worker processes
+    logging.getLogger("pdfminer").setLevel(logging.WARNING)
+
+    blocks = []
+    for page_layout in extract_pages(
+        file_path,
+        page_numbers=range(first_page, last_page),
+        maxpages=last_page,
+    ):
+        for element in page_layout:
+            if isinstance(element, LTTextContainer):
+                text = element.get_text()
+                # Parsing with newlines has been deprecated
+                no_newline_text = text.replace("\n", "")
+                blocks.append(no_newline_text)
+
+        # TODO also extract information from images/figures using OCR
+        # https://pdfminersix.readthedocs.io/en/latest/topic/converting_pdf_to_text.html#topic-pdf-to-text-layout
+
+    return blocks
+
+
+class WorkerHelper:
+    """Logging of the parsing done in the worker processes."""
+
+    @staticmethod
+    def log_debug(message: str) -> None:
+        logging.debug(message)
+
+    @staticmethod
+    def log_info(message: str) -> None:
+        logging.info(message)
+
+    @staticmethod
+    def log_error(message: str) -> None:
+        logging.error(message)
+
+
+def parse_pdf_pages(
+    file_path: str, first_page: int, last_page: int, observable_list: List[Observable]
+) -> List[Tuple[str, Dict]]:
+    """Extract the text blocks of PDF pages and their observables."""
+    parser = ReportParser(WorkerHelper(), None, observable_list)
+    return parser._extract_observables(
+        extract_pdf_blocks(file_path, first_page, last_page)
+    )
+
 
 class ReportParser(object):
     """
@@ -36,12 +101,20 @@ class ReportParser(object):
     def __init__(
         self,
         helper: OpenCTIConnectorHelper,
-        entity_list: List[Entity],
+        entity_matcher: EntityMatcher,
         observable_list: List[Observable],
+        pdf_executor: Optional[Executor] = None,
+        pdf_max_pending: int = 1,
     ):
         self.helper = helper
-        self.entity_list = entity_list
+        self.entity_matcher = entity_matcher
         self.observable_list = observable_list
+        self.pdf_executor = pdf_executor
+        self.pdf_max_pending = pdf_max_pending
+
+        # Statistics of the last parsed file
+        self.parse_time = None
+        self.pages = None
 
         # Disable INFO logging by pdfminer
         logging.getLogger("pdfminer").setLevel(logging.WARNING)
@@ -78,60 +151,114 @@ class ReportParser(object):
             OBSERVABLE_CLASS, observable.stix_target, ind_match, match_range
         )
 
-    def _parse(self, data: str) -> Dict[str, Dict]:
-        list_matches = {}
+    def _extract_observables(self, blocks: List[str]) -> List[Tuple[str, Dict]]:
+        results = []
+        for data in blocks:
+            # Defang text
+            data = ioc_finder.prepare_text(data)
+
+            list_matches = {}
+            for observable in self.observable_list:
+                list_matches.update(self._extract_observable(observable, data))
+            results.append((data, list_matches))
+        return results
 
-        # Defang text
-        data = ioc_finder.prepare_text(data)
+    def _extract_entities(self, results: List[Tuple[str, Dict]]) -> Dict[str, Dict]:
+        parse_info = {}
 
-        for observable in self.observable_list:
-            list_matches.update(self._extract_observable(observable, data))
+        # The entities of all the blocks are matched at once
+        entity_matches = self.entity_matcher.match_blocks([data for data, _ in results])
 
-        for entity in self.entity_list:
-            list_matches = self._extract_entity(entity, list_matches, data)
+        for (data, list_matches), block_entity_matches in zip(results, entity_matches):
+            for index in sorted(block_entity_matches):
+                list_matches = self._extract_entity(
+                    self.entity_matcher.entities[index],
+                    list_matches,
+                    block_entity_matches[index],
+                )
 
-        self.helper.log_debug(f"Text: '{data}' -> extracts {list_matches}")
-        return list_matches
+            self.helper.log_debug(f"Text: '{data}' -> extracts {list_matches}")
+            parse_info.update(list_matches)
+
+        return parse_info
+
+    def _parse(self, blocks: List[str]) -> Dict[str, Dict]:
+        return self._extract_entities(self._extract_observables(blocks))
 
     def _parse_pdf(self, file_data: IO) -> Dict[str, Dict]:
         parse_info = {}
+        file_path = file_data.name
         try:
-            for page_layout in extract_pages(file_data):
-                for element in page_layout:
-                    if isinstance(element, LTTextContainer):
-                        text = element.get_text()
-                        # Parsing with newlines has been deprecated
-                        no_newline_text = text.replace("\n", "")
-                        parse_info.update(self._parse(no_newline_text))
-
-                # TODO also extract information from images/figures using OCR
-                # https://pdfminersix.readthedocs.io/en/latest/topic/converting_pdf_to_text.html#topic-pdf-to-text-layout
-
+            self.pages = count_pdf_pages(file_path)
         except Exception as e:
             logging.exception(f"Pdf Parsing Error: {e}")
+            return parse_info
+
+        page_ranges = [
+            (first_page, min(first_page + PDF_PAGES_PER_TASK, self.pages))
+            for first_page in range(0, self.pages, PDF_PAGES_PER_TASK)
+        ]
+        if self.pdf_executor is None:
+            for first_page, last_page in page_ranges:
+                try:
+                    blocks = extract_pdf_blocks(file_path, first_page, last_page)
+                except Exception as e:
+                    logging.exception(f"Pdf Parsing Error: {e}")
+                    continue
+                parse_info.update(self._parse(blocks))
+            return parse_info
+
+        # The text and the observables of the page ranges are extracted by the
+        # worker processes, the entities are matched in order as soon as the
+        # ranges are available. Only a bounded number of ranges are pending,
+        # so a large document never fills up the memory.
+        pending = []
+        page_ranges = iter(page_ranges)
+        while True:
+            while len(pending) < self.pdf_max_pending:
+                page_range = next(page_ranges, None)
+                if page_range is None:
+                    break
+                pending.append(
+                    (
+                        page_range,
+                        self.pdf_executor.submit(
+                            parse_pdf_pages,
+                            file_path,
+                            *page_range,
+                            self.observable_list,
+                        ),
+                    )
+                )
+            if not pending:
+                break
+            (first_page, last_page), future = pending.pop(0)
+            try:
+                results = future.result()
+            except Exception as e:
+                logging.exception(
+                    f"Pdf Parsing Error (pages {first_page + 1}-{last_page}): {e}"
+                )
+                continue
+            parse_info.update(self._extract_entities(results))
 
         return parse_info
 
     def _parse_text(self, file_data: IO) -> Dict[str, Dict]:
-        parse_info = {}
         text = file_data.read()
         encoding = chardet.detect(text)["encoding"]
         if encoding == "UTF-16":
-            parse_info.update(self._parse(text.decode("utf-16")))
+            return self._parse([text.decode("utf-16")])
         else:
-            parse_info.update(self._parse(text.decode("utf-8")))
-        return parse_info
+            return self._parse([text.decode("utf-8")])
 
     def _parse_html(self, file_data: IO) -> Dict[str, Dict]:
-        parse_info = {}
         soup = BeautifulSoup(file_data, "html.parser")
         buf = io.StringIO(soup.get_text(separator=" "))
-        for text in buf.readlines():
-            parse_info.update(self._parse(text))
-        return parse_info
+        return self._parse(buf.readlines())
 
     def run_parser(self, file_path: str, file_type: str) -> List[Dict]:
-        parsing_results = []
+        parsing_results = {}
 
         file_parser = self.supported_file_types.get(file_type, None)
         if not file_parser:
@@ -142,11 +269,14 @@ class ReportParser(object):
 
         self.helper.log_info(f"Parsing report {file_path} {file_type}")
 
+        self.pages = None
+        start = time.perf_counter()
         try:
             with open(file_path, "rb") as file_data:
                 parsing_results = file_parser(file_data)
         except Exception as e:
             logging.exception(f"Parsing Error: {e}")
+        self.parse_time = time.perf_counter() - start
 
         parsing_results = list(parsing_results.values())
 
@@ -225,23 +355,16 @@ class ReportParser(object):
 
         return list_matches
 
-    def _extract_entity(self, entity: Entity, list_matches: Dict, data: str) -> Dict:
-        regex_list = entity.regex
-
+    def _extract_entity(
+        self,
+        entity: Entity,
+        list_matches: Dict,
+        match_dict: Dict[str, List[Tuple[int, int]]],
+    ) -> Dict:
         observable_keys = []
         end_index = set()
-        match_dict = {}
         match_key = ""
 
-        # Run all regexes for entity X
-        for regex in regex_list:
-            for match in regex.finditer(data):
-                match_key = match.group()
-                if match_key in match_dict:
-                    match_dict[match_key].append(match.span())
-                else:
-                    match_dict[match_key] = [match.span()]
-
         # No maches for this entity
         if len(match_dict) == 0:
             return list_matches
@@ -250,6 +373,7 @@ class ReportParser(object):
         # yes -> skip
         # no -> add index to end_index
         for match, match_indices in match_dict.items():
+            match_key = match
             for match_index in match_indices:
                 skip_val = self._sco_present(
                     list_matches, match_index, entity.omit_match_in
@@ -260,7 +384,7 @@ class ReportParser(object):
                     )
                 else:
                     self.helper.log_debug(
-                        f"Entity match: '{match}' of regex: '{regex_list}'"
+                        f"Entity match: '{match}' of values: '{entity.values}'"
                     )
                     end_index.add(match_index)
                     if match in list_matches.keys():
@@ -0,0 +1,155 @@
+"""
+Benchmark of the import-file-stix bundle processing.
+
+Compares the previous processing (the whole file loaded with json.loads, the
+container references rewritten, the bundle dumped again for a single send)
+with the streaming one (objects parsed one at a time and grouped in bounded
+bundles with the container references), on a synthetic bundle. Each method
+runs in its own process to measure its peak memory (maximum resident set
+size). Nothing is sent, the bundles are only serialized.
+
+Usage: python benchmarks/streaming_import.py [--objects 1000000] [--bundle-size 5000]
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from bundle_stream import iter_bundles, iter_objects  # noqa: E402
+
+CONTAINER = {
+    "type": "report",
+    "spec_version": "2.1",
+    "id": "report--" + str(uuid.uuid4()),
+    "name": "Benchmark report",
+    "published": "2024-01-01T00:00:00.000Z",
+    "created": "2024-01-01T00:00:00.000Z",
+    "modified": "2024-01-01T00:00:00.000Z",
+    "object_refs": [],
+}
+
+
+def write_sample_bundle(path, count):
+    """Write indicators and relationships to an intrusion set, in a bundle."""
+    intrusion_set_id = "intrusion-set--" + str(uuid.uuid4())
+    with open(path, "w") as f:
+        f.write('{"type": "bundle", "id": "bundle--%s", "objects": [' % uuid.uuid4())
+        f.write(
+            json.dumps(
+                {
+                    "type": "intrusion-set",
+                    "spec_version": "2.1",
+                    "id": intrusion_set_id,
+                    "name": "Benchmark intrusion set",
+                    "created": "2024-01-01T00:00:00.000Z",
+                    "modified": "2024-01-01T00:00:00.000Z",
+                }
+            )
+        )
+        for i in range(1, count):
+            if i % 2:
+                stix_object = {
+                    "type": "indicator",
+                    "spec_version": "2.1",
+                    "id": "indicator--" + str(uuid.uuid4()),
+                    "name": f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}",
+                    "pattern": f"[ipv4-addr:value = '10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}']",
+                    "pattern_type": "stix",
+                    "valid_from": "2024-01-01T00:00:00.000Z",
+                    "created": "2024-01-01T00:00:00.000Z",
+                    "modified": "2024-01-01T00:00:00.000Z",
+                    "x_opencti_score": 50,
+                }
+                indicator_id = stix_object["id"]
+            else:
+                stix_object = {
+                    "type": "relationship",
+                    "spec_version": "2.1",
+                    "id": "relationship--" + str(uuid.uuid4()),
+                    "relationship_type": "indicates",
+                    "source_ref": indicator_id,
+                    "target_ref": intrusion_set_id,
+                    "created": "2024-01-01T00:00:00.000Z",
+                    "modified": "2024-01-01T00:00:00.000Z",
+                    "confidence": 75.5,
+                }
+            f.write(", " + json.dumps(stix_object))
+        f.write("]}")
+
+
+def run_previous(path, bundle_size):
+    with open(path) as f:
+        file_content = f.read()
+    bundle = json.loads(file_content)["objects"]
+    container = dict(CONTAINER, object_refs=[object["id"] for object in bundle])
+    bundle.append(container)
+    bundle = {"type": "bundle", "id": "bundle--" + str(uuid.uuid4()), "objects": bundle}
+    return 1, len(json.dumps(bundle))
+
+
+def run_streaming(path, bundle_size):
+    bundles = 0
+    size = 0
+    with open(path, "rb") as f:
+        for bundle in iter_bundles(iter_objects(f), bundle_size, CONTAINER):
+            bundles += 1
+            size += len(json.dumps(bundle))
+    return bundles, size
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--objects", type=int, default=1000000)
+    parser.add_argument("--bundle-size", type=int, default=5000)
+    parser.add_argument("--method", choices=["previous", "streaming"])
+    parser.add_argument("--file")
+    args = parser.parse_args()
+
+    if args.method:
+        # Child process running a single method
+        start = time.perf_counter()
+        run = run_previous if args.method == "previous" else run_streaming
+        bundles, size = run(args.file, args.bundle_size)
+        elapsed = time.perf_counter() - start
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        print(
+            f"{args.method:10} {elapsed:8.1f}s  peak memory {peak:8.0f} MB"
+            f"  {bundles} bundle(s), {size / 1024 / 1024:.0f} MB serialized"
+        )
+        return
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "bundle.json")
+        start = time.perf_counter()
+        write_sample_bundle(path, args.objects)
+        print(
+            f"Synthetic bundle: {args.objects} objects,"
+            f" {os.path.getsize(path) / 1024 / 1024:.0f} MB"
+            f" written in {time.perf_counter() - start:.1f}s"
+        )
+        for method in ["previous", "streaming"]:
+            subprocess.run(
+                [
+                    sys.executable,
+                    __file__,
+                    "--method",
+                    method,
+                    "--file",
+                    path,
+                    "--bundle-size",
+                    str(args.bundle_size),
+                ],
+                check=True,
+            )
+
+
+if __name__ == "__main__":
+    main()
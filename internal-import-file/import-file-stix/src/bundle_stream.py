@@ -0,0 +1,83 @@
+import json
+import uuid
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Optional
+
+import ijson
+
+CONTAINER_TYPES = {
+    "report",
+    "grouping",
+    "observed-data",
+    "x-opencti-case-incident",
+    "x-opencti-case-rfi",
+    "x-opencti-case-rft",
+    "x-opencti-task",
+    "x-opencti-feedback",
+}
+
+
+def iter_objects(file: BinaryIO) -> Iterator[Dict]:
+    """Parse the objects of a STIX bundle file one at a time."""
+    return ijson.items(file, "objects.item", use_float=True)
+
+
+def contains_container(file: BinaryIO) -> bool:
+    """Scan the object types of a STIX bundle file for a container."""
+    for object_type in ijson.items(file, "objects.item.type"):
+        if object_type in CONTAINER_TYPES:
+            return True
+    return False
+
+
+def make_bundle(objects: List[Dict], container: Optional[Dict] = None) -> Dict:
+    if container is not None:
+        objects = objects + [
+            dict(container, object_refs=[stix_object["id"] for stix_object in objects])
+        ]
+    return {"type": "bundle", "id": "bundle--" + str(uuid.uuid4()), "objects": objects}
+
+
+def iter_bundles(
+    objects: Iterable[Dict], bundle_size: int, container: Optional[Dict] = None
+) -> Iterator[Dict]:
+    """
+    Group the objects in bundles of at most bundle_size objects.
+
+    The container, if any, is added to every bundle with the objects of the
+    bundle as references, the references are added to the container by each
+    import.
+    """
+    chunk = []
+    for stix_object in objects:
+        chunk.append(stix_object)
+        if len(chunk) >= bundle_size:
+            yield make_bundle(chunk, container)
+            chunk = []
+    if chunk:
+        yield make_bundle(chunk, container)
+
+
+def write_bundle(
+    objects: Iterable[Dict], output: BinaryIO, container: Optional[Dict] = None
+) -> int:
+    """
+    Write the objects as a single bundle, one object at a time.
+
+    The container, if any, is added at the end with all the objects as
+    references. Returns the number of objects written.
+    """
+    object_refs = []
+    output.write(
+        b'{"type": "bundle", "id": "bundle--%s", "objects": ['
+        % (str(uuid.uuid4()).encode())
+    )
+    for stix_object in objects:
+        if object_refs:
+            output.write(b", ")
+        output.write(json.dumps(stix_object).encode("utf-8"))
+        object_refs.append(stix_object["id"])
+    if container is not None and object_refs:
+        output.write(b", ")
+        output.write(json.dumps(dict(container, object_refs=object_refs)).encode())
+    output.write(b"]}")
+    return len(object_refs)
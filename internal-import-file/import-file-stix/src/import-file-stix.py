@@ -1,15 +1,22 @@
 import json
 import os
 import sys
+import tempfile
 import time
-import uuid
-from typing import Dict, List
+from typing import BinaryIO, Dict, Optional
 
 import yaml
-from pycti import OpenCTIConnectorHelper
+from bundle_stream import contains_container, iter_bundles, iter_objects, write_bundle
+from pycti import OpenCTIConnectorHelper, get_config_variable
 from stix2elevator import elevate
 from stix2elevator.options import initialize_options
 
+# Size of the chunks of the downloaded file
+FILE_CHUNK_SIZE = 1024 * 1024
+
+# Bundle kept in memory up to this size, then spilled to disk
+SPOOL_MAX_SIZE = 64 * 1024 * 1024
+
 
 class ImportFileStix:
     def __init__(self):
@@ -21,6 +28,22 @@ class ImportFileStix:
             else {}
         )
         self.helper = OpenCTIConnectorHelper(config)
+        self.bundle_size = get_config_variable(
+            "IMPORT_FILE_STIX_BUNDLE_SIZE",
+            ["import_file_stix", "bundle_size"],
+            config,
+            isNumber=True,
+            default=5000,
+        )
+
+    def _download(self, file_uri: str, output: BinaryIO) -> None:
+        # Streamed to a temporary file instead of being loaded in memory
+        response = self.helper.api.session.get(
+            file_uri, headers=self.helper.api.request_headers, stream=True
+        )
+        response.raise_for_status()
+        for chunk in response.iter_content(chunk_size=FILE_CHUNK_SIZE):
+            output.write(chunk)
 
     def _process_message(self, data: Dict) -> str:
         file_fetch = data["file_fetch"]
@@ -28,74 +51,75 @@ class ImportFileStix:
         file_uri = self.helper.opencti_url + file_fetch
         self.helper.log_info(f"Importing the file {file_uri}")
 
-        file_content = self.helper.api.fetch_opencti_file(file_uri)
-        if data["file_mime"] == "text/xml":
-            self.helper.log_debug("STIX 1.2 file. Attempting conversion")
-            initialize_options()
-            file_content = elevate(file_content)
-        entity_id = data.get("entity_id", None)
-        if entity_id:
-            self.helper.log_info("Contextual import.")
-            bundle = json.loads(file_content)["objects"]
-            if self._contains_container(bundle):
-                self.helper.log_info("Bundle contains container.")
+        with tempfile.TemporaryFile() as bundle_file:
+            if data["file_mime"] == "text/xml":
+                self.helper.log_debug("STIX 1.2 file. Attempting conversion")
+                file_content = self.helper.api.fetch_opencti_file(file_uri)
+                initialize_options()
+                bundle_file.write(elevate(file_content).encode("utf-8"))
             else:
-                self.helper.log_info(
-                    "No container in Stix file. Updating current container"
+                self._download(file_uri, bundle_file)
+
+            entity_id = data.get("entity_id", None)
+            container = None
+            if entity_id:
+                self.helper.log_info("Contextual import.")
+                bundle_file.seek(0)
+                if contains_container(bundle_file):
+                    self.helper.log_info("Bundle contains container.")
+                else:
+                    self.helper.log_info(
+                        "No container in Stix file. Updating current container"
+                    )
+                    container = self._get_container(entity_id)
+
+            bundle_file.seek(0)
+            objects = iter_objects(bundle_file)
+            if self.helper.get_validate_before_import() and not bypass_validation:
+                # The bundle is validated as a whole, it is sent in one piece
+                with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE) as output:
+                    write_bundle(objects, output, container)
+                    output.seek(0)
+                    self.helper.send_stix2_bundle(
+                        output.read().decode("utf-8"),
+                        bypass_validation=bypass_validation,
+                        file_name=data["file_id"],
+                        entity_id=entity_id,
+                    )
+                return "Generated bundle sent for validation"
+
+            # Sent in bounded bundles as the file is parsed
+            bundles_sent = 0
+            for bundle in iter_bundles(objects, self.bundle_size, container):
+                bundles_sent += len(
+                    self.helper.send_stix2_bundle(
+                        json.dumps(bundle),
+                        bypass_validation=bypass_validation,
+                        file_name=data["file_id"],
+                        entity_id=entity_id,
+                    )
                 )
-                bundle = self._update_container(bundle, entity_id)
-            bundle = {
-                "type": "bundle",
-                "id": "bundle--" + str(uuid.uuid4()),
-                "objects": bundle,
-            }
-            file_content = json.dumps(bundle)
-        bundles_sent = self.helper.send_stix2_bundle(
-            file_content,
-            bypass_validation=bypass_validation,
-            file_name=data["file_id"],
-            entity_id=entity_id,
-        )
-        if self.helper.get_validate_before_import() and not bypass_validation:
-            return "Generated bundle sent for validation"
-        else:
-            return str(len(bundles_sent)) + " generated bundle(s) for worker import"
+            if bundles_sent == 0:
+                raise ValueError("Nothing to import")
+            return str(bundles_sent) + " generated bundle(s) for worker import"
 
     # Start the main loop
     def start(self) -> None:
         self.helper.listen(self._process_message)
 
-    @staticmethod
-    def _contains_container(bundle: List) -> bool:
-        for elem in bundle:
-            if (
-                elem.get("type") == "report"
-                or elem.get("type") == "grouping"
-                or elem.get("type") == "observed-data"
-                or elem.get("type") == "x-opencti-case-incident"
-                or elem.get("type") == "x-opencti-case-rfi"
-                or elem.get("type") == "x-opencti-case-rft"
-                or elem.get("type") == "x-opencti-task"
-                or elem.get("type") == "x-opencti-feedback"
-            ):
-                return True
-        return False
-
-    def _update_container(self, bundle: List, entity_id: int) -> List:
+    def _get_container(self, entity_id: str) -> Optional[Dict]:
         container = self.helper.api.stix_domain_object.read(id=entity_id)
         container_stix_bundle = self.helper.api.stix2.export_entity(
             container["entity_type"], container["id"]
         )
         if len(container_stix_bundle["objects"]) > 0:
-            container_stix = [
+            return [
                 object
                 for object in container_stix_bundle["objects"]
                 if "x_opencti_id" in object
                 and object["x_opencti_id"] == container["id"]
             ][0]
-            container_stix["object_refs"] = [object["id"] for object in bundle]
-            bundle.append(container_stix)
-        return bundle
+        return None
 
 
 if __name__ == "__main__":